@@ -5,16 +5,12 @@ wateringTime = 2  # defining start value wateringTime
 humidity = 0  # define start value humidity
 
 # Import files
-import RPi.GPIO as GPIO
+import argparse
 import time
 from time import *
-from adafruit_servokit import ServoKit
 import sys
-from pyrf24 import RF24, RF24_PA_MIN
 import os
-import numpy as np
-
-GPIO.setmode(GPIO.BCM)
+import math
 
 # ==============================================================================
 
@@ -28,41 +24,74 @@ IN1_M2 = 27
 IN2_M2 = 18
 EN_M2 = 17
 
-# Setup pins
 motor_pins = [IN1_M1, IN2_M1, EN_M1, IN1_M2, IN2_M2, EN_M2]
-for p in motor_pins:
-    GPIO.setup(p, GPIO.OUT)
-
-# PWM setup
-pwm1 = GPIO.PWM(EN_M1, 1000)
-pwm2 = GPIO.PWM(EN_M2, 1000)
-
-# ServoKit
-kit = ServoKit(channels=16)
 
 # Track current servo angles
 current_extend_angle = 0
 current_rotate_angle = 90
 
-# Radio setup
-radio = RF24(25, 0)
+# Radio
+RADIO_CE_PIN, RADIO_CSN = 25, 0
 address = b"0001\x00"
 
 # HC-SR04 pins
 TRIG1, ECHO1 = 5, 6
 TRIG2, ECHO2 = 12, 13
-GPIO.setup(TRIG1, GPIO.OUT)
-GPIO.setup(ECHO1, GPIO.IN)
-GPIO.setup(TRIG2, GPIO.OUT)
-GPIO.setup(ECHO2, GPIO.IN)
 
 # Solenoid valve and buttons
 RELAY_PIN = 21
 START_BUTTON_PIN = 20
 STOP_BUTTON_PIN = 16
-GPIO.setup(RELAY_PIN, GPIO.OUT)
-GPIO.setup(START_BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.setup(STOP_BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+
+# Hardware handles. RPi.GPIO, ServoKit and pyrf24 are only imported (and the pins
+# claimed) by setup_hardware(), so importing this file, --help and --dry-run stay fast
+GPIO = None
+pwm1 = None
+pwm2 = None
+kit = None
+radio = None
+
+
+def setup_hardware():
+    global GPIO, pwm1, pwm2, kit, radio
+    if GPIO is not None:
+        return  # already set up
+    import RPi.GPIO as gpio
+    from adafruit_servokit import ServoKit
+    from pyrf24 import RF24
+
+    gpio.setmode(gpio.BCM)
+
+    # Setup pins
+    for p in motor_pins:
+        gpio.setup(p, gpio.OUT)
+
+    # PWM setup
+    pwm1 = gpio.PWM(EN_M1, 1000)
+    pwm2 = gpio.PWM(EN_M2, 1000)
+
+    # ServoKit
+    kit = ServoKit(channels=16)
+
+    # Radio setup
+    radio = RF24(RADIO_CE_PIN, RADIO_CSN)
+
+    gpio.setup(TRIG1, gpio.OUT)
+    gpio.setup(ECHO1, gpio.IN)
+    gpio.setup(TRIG2, gpio.OUT)
+    gpio.setup(ECHO2, gpio.IN)
+
+    gpio.setup(RELAY_PIN, gpio.OUT)
+    gpio.setup(START_BUTTON_PIN, gpio.IN, pull_up_down=gpio.PUD_UP)
+    gpio.setup(STOP_BUTTON_PIN, gpio.IN, pull_up_down=gpio.PUD_UP)
+
+    gpio.add_event_detect(
+        STOP_BUTTON_PIN,
+        gpio.FALLING,
+        callback=eStop,
+        bouncetime=200
+    )
+    GPIO = gpio
 
 # =================================
 # WATER FORMULA INTEGRATION
@@ -84,7 +113,7 @@ def valve_open_time_ml(V_ml):
     if disc < 0:
         return None
 
-    return (-b + np.sqrt(disc)) / (2 * a)
+    return (-b + math.sqrt(disc)) / (2 * a)
 
 
 def compute_watering_time():
@@ -103,6 +132,7 @@ def compute_watering_time():
 # =================================
 def initialize():
     global current_extend_angle, current_rotate_angle
+    setup_hardware()
     pwm1.start(0)
     pwm2.start(0)
     sleep(2)
@@ -130,14 +160,6 @@ def eStop(channel=None):
     os._exit(0)
 
 
-GPIO.add_event_detect(
-    STOP_BUTTON_PIN,
-    GPIO.FALLING,
-    callback=eStop,
-    bouncetime=200
-)
-
-
 # =================================
 # DISTANCE MEASURE FUNCTIONS
 # =================================
@@ -278,64 +300,78 @@ def wateringPlant():
 # =================================
 # MAIN LOOP
 # =================================
-while True:
-    match state:
-        case 0:
-            initialize()
-            sleep(1)
-            state = 10
+def main():
+    global state, wateringTime
+    parser = argparse.ArgumentParser(description="Leafy watering robot with the watering formula (no camera)")
+    parser.add_argument("--dry-run", action="store_true", help="print the settings and watering time without touching the hardware")
+    args = parser.parse_args()
+    if args.dry_run:
+        print(f"Relay {RELAY_PIN}, start button {START_BUTTON_PIN}, stop button {STOP_BUTTON_PIN}, speed {speed}")
+        compute_watering_time()
+        return
 
-        case 10:  # Standby, wait for start command
-            print("Waiting for initialization")
-            if GPIO.input(START_BUTTON_PIN) == GPIO.LOW:
-                print("Button was pressed!")
-                state = 20
-
-        case 20:  # Start driving until reached a plant
-            startDrivingF()
-            state = 30
-
-        case 30:  # Driving stops because plant is reached
-            plantFound()
-            sleep(3)
-            state = 40
-
-        case 40:  # Arm is rotated outward to Left
-            rotateArm(0)
-            sleep(3)
-            state = 50
-
-        case 50:
-            extendArm(160)
-            sleep(3)
-            state = 60
-
-        case 60:
-            # Compute watering time from formula
-            wateringTime = compute_watering_time()
-            state = 70
-
-        case 70:
-            wateringPlant()
-            state = 51
-
-        case 51:
-            extendArm(180)
-            sleep(3)
-            state = 71
-
-        case 71:
-            wateringTime = compute_watering_time()
-            wateringPlant()
-            state = 80
-
-        case 80:
-            extendArm(0)
-            state = 90
-
-        case 90:
-            rotateArm(90)
-            state = 30
-
-        case 999:
-            exit()
+    while True:
+        match state:
+            case 0:
+                initialize()
+                sleep(1)
+                state = 10
+
+            case 10:  # Standby, wait for start command
+                print("Waiting for initialization")
+                if GPIO.input(START_BUTTON_PIN) == GPIO.LOW:
+                    print("Button was pressed!")
+                    state = 20
+
+            case 20:  # Start driving until reached a plant
+                startDrivingF()
+                state = 30
+
+            case 30:  # Driving stops because plant is reached
+                plantFound()
+                sleep(3)
+                state = 40
+
+            case 40:  # Arm is rotated outward to Left
+                rotateArm(0)
+                sleep(3)
+                state = 50
+
+            case 50:
+                extendArm(160)
+                sleep(3)
+                state = 60
+
+            case 60:
+                # Compute watering time from formula
+                wateringTime = compute_watering_time()
+                state = 70
+
+            case 70:
+                wateringPlant()
+                state = 51
+
+            case 51:
+                extendArm(180)
+                sleep(3)
+                state = 71
+
+            case 71:
+                wateringTime = compute_watering_time()
+                wateringPlant()
+                state = 80
+
+            case 80:
+                extendArm(0)
+                state = 90
+
+            case 90:
+                rotateArm(90)
+                state = 30
+
+            case 999:
+                exit()
+
+
+if __name__ == "__main__":
+    main()
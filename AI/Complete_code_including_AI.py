@@ -6,16 +6,16 @@
 # =========================
 # IMPORTS
 # =========================
-from picamera2 import Picamera2
-import cv2
+# cv2, the camera and the Pi libraries (RPi.GPIO, ServoKit) are imported on first
+# use (setup_hardware() / analyze_plant()), so --help and --dry-run stay fast
+import argparse
 import numpy as np
-import RPi.GPIO as GPIO
 import time
 from time import sleep
-from adafruit_servokit import ServoKit
-from pyrf24 import RF24, RF24_PA_MIN
 import os
 
+from vision_params import load_vision_params
+
 # =========================
 # GLOBAL STATE (UNCHANGED)
 # =========================
@@ -29,8 +29,14 @@ SOIL_HUMIDITY = 75.0  # used in formula
 # =========================
 # HSV GREEN DETECTION
 # =========================
-GREEN_LOWER = np.array([46, 53, 53])
-GREEN_UPPER = np.array([70, 255, 255])
+VISION_PARAMS = load_vision_params("Complete_code_including_AI")  # tuned by param_search.py, {} without an entry
+GREEN_LOWER = np.array(VISION_PARAMS.get("green_lower", [46, 53, 53]))
+GREEN_UPPER = np.array(VISION_PARAMS.get("green_upper", [70, 255, 255]))
+
+# "main": analyze the full 640x480 frame, "lores": the ISP-scaled 320x240 YUV stream
+# (2.6x faster, but ~19 px mean extent error in lores_compare.py, see green_camera.py)
+ANALYSIS_STREAM = "main"
+LORES_SIZE = (320, 240)
 
 # =========================
 # WATER FORMULAS
@@ -52,21 +58,20 @@ def valve_open_time_ml(V_ml):
 # =========================
 # CAMERA FUNCTIONS
 # =========================
+camera = None   # Opened once in initialize()
+grabber = None  # Keeps the newest frames in a ring buffer
+
 def capture_frame():
-    picam2 = Picamera2()
-    picam2.configure(
-        picam2.create_preview_configuration(
-            main={"format": "RGB888", "size": (640, 480)}
-        )
-    )
-    picam2.start()
-    sleep(2)
-    frame = picam2.capture_array()
-    picam2.stop()
-    return frame
-
-def analyze_plant(image_rgb):
-    image_bgr = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
+    # Newest frame from the capture thread, no waiting for the camera
+    return grabber.latest()
+
+def analyze_plant(image):
+    import cv2
+
+    if ANALYSIS_STREAM == "lores":
+        image_bgr = cv2.cvtColor(image, cv2.COLOR_YUV2RGB_I420)  # same channel order as the main path
+    else:
+        image_bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
     hsv = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2HSV)
     green_mask = cv2.inRange(hsv, GREEN_LOWER, GREEN_UPPER)
 
@@ -78,27 +83,45 @@ def analyze_plant(image_rgb):
 # =========================
 # GPIO / HARDWARE SETUP
 # =========================
-GPIO.setmode(GPIO.BCM)
-
 IN1_M1, IN2_M1, EN_M1 = 23, 22, 24
 IN1_M2, IN2_M2, EN_M2 = 27, 18, 17
 
-for p in [IN1_M1, IN2_M1, EN_M1, IN1_M2, IN2_M2, EN_M2]:
-    GPIO.setup(p, GPIO.OUT)
-
-pwm1 = GPIO.PWM(EN_M1, 1000)
-pwm2 = GPIO.PWM(EN_M2, 1000)
-
-kit = ServoKit(channels=16)
 current_extend_angle = 0
 
 RELAY_PIN = 21
 START_BUTTON_PIN = 20
 STOP_BUTTON_PIN = 16
 
-GPIO.setup(RELAY_PIN, GPIO.OUT)
-GPIO.setup(START_BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.setup(STOP_BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+GPIO = None
+pwm1 = None
+pwm2 = None
+kit = None
+
+def setup_hardware():
+    global GPIO, pwm1, pwm2, kit, camera, grabber
+    if GPIO is not None:
+        return  # already set up
+    import RPi.GPIO as gpio
+    from adafruit_servokit import ServoKit
+    from camera_service import open_camera
+    from frame_grabber import FrameGrabber
+
+    gpio.setmode(gpio.BCM)
+    for p in [IN1_M1, IN2_M1, EN_M1, IN1_M2, IN2_M2, EN_M2]:
+        gpio.setup(p, gpio.OUT)
+
+    pwm1 = gpio.PWM(EN_M1, 1000)
+    pwm2 = gpio.PWM(EN_M2, 1000)
+
+    kit = ServoKit(channels=16)
+
+    gpio.setup(RELAY_PIN, gpio.OUT)
+    gpio.setup(START_BUTTON_PIN, gpio.IN, pull_up_down=gpio.PUD_UP)
+    gpio.setup(STOP_BUTTON_PIN, gpio.IN, pull_up_down=gpio.PUD_UP)
+
+    camera = open_camera(lores_size=LORES_SIZE if ANALYSIS_STREAM == "lores" else None)
+    grabber = FrameGrabber(camera, buffer_size=4, stream=ANALYSIS_STREAM)
+    GPIO = gpio
 
 # =========================
 # ARM / DRIVE FUNCTIONS
@@ -174,51 +197,76 @@ def wateringTiming():
     print(f"Green % used : {green_ratio:.2f}")
     print(f"Water (ml)  : {water_ml:.2f}")
     print(f"Valve time : {wateringTime:.2f} s")
+    print(f"Camera      : {grabber.metrics()}")
 
 # =========================
-# MAIN LOOP (STATE MACHINE)
+# INITIALIZE
 # =========================
-while True:
+def initialize():
+    print("Initializing system...")
+    setup_hardware()
+    pwm1.start(0)
+    pwm2.start(0)
+    kit.servo[0].angle = 90
+    kit.servo[1].angle = 0
 
-    match state:
+    print("📷 Starting camera...")
+    grabber.start()  # Opens the camera (warm-up once, not per plant) and starts capturing
 
-        case 0:
-            print("Initializing system...")
-            pwm1.start(0)
-            pwm2.start(0)
-            kit.servo[0].angle = 90
-            kit.servo[1].angle = 0
-            state = 10
-
-        case 10:  # Standby
-            print("Waiting for start button...")
-            if GPIO.input(START_BUTTON_PIN) == GPIO.LOW:
+# =========================
+# MAIN LOOP (STATE MACHINE)
+# =========================
+def main():
+    global state
+    parser = argparse.ArgumentParser(description="Leafy watering robot with camera-based watering")
+    parser.add_argument("--dry-run", action="store_true", help="print the settings without touching the hardware or camera")
+    args = parser.parse_args()
+    if args.dry_run:
+        print(f"Relay {RELAY_PIN}, start button {START_BUTTON_PIN}, stop button {STOP_BUTTON_PIN}, speed {speed}")
+        print(f"Analysis stream {ANALYSIS_STREAM}, green {GREEN_LOWER.tolist()} - {GREEN_UPPER.tolist()}")
+        return
+
+    while True:
+
+        match state:
+
+            case 0:
+                initialize()
+                state = 10
+
+            case 10:  # Standby
+                print("Waiting for start button...")
+                if GPIO.input(START_BUTTON_PIN) == GPIO.LOW:
+                    state = 20
+
+            case 20:  # Drive to plant
+                print("Driving forward...")
+                startDrivingF()
+                sleep(2)
+                stopDriving()
+                state = 40
+
+            case 40:  # Rotate arm
+                rotateArm(0)
+                state = 50
+
+            case 50:  # Extend arm
+                extendArm(160)
+                state = 60
+
+            case 60:  # TAKE PHOTO + CALCULATE WATER
+                wateringTiming()
+                state = 70
+
+            case 70:  # WATER
+                wateringPlant()
+                state = 80
+
+            case 80:  # Retract
+                extendArm(0)
+                rotateArm(90)
                 state = 20
 
-        case 20:  # Drive to plant
-            print("Driving forward...")
-            startDrivingF()
-            sleep(2)
-            stopDriving()
-            state = 40
-
-        case 40:  # Rotate arm
-            rotateArm(0)
-            state = 50
-
-        case 50:  # Extend arm
-            extendArm(160)
-            state = 60
-
-        case 60:  # TAKE PHOTO + CALCULATE WATER
-            wateringTiming()
-            state = 70
-
-        case 70:  # WATER
-            wateringPlant()
-            state = 80
-
-        case 80:  # Retract
-            extendArm(0)
-            rotateArm(90)
-            state = 20
+
+if __name__ == "__main__":
+    main()
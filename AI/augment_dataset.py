@@ -0,0 +1,129 @@
+# ============================================================
+# augment_dataset.py
+# On-the-fly augmentation dataset for train_model.py
+# ============================================================
+#
+# Instead of writing num_augments re-encoded JPEGs per photo to
+# augmented_dataset/ (save_augmented_images.py), AugmentedStream applies
+# the same augmentation pipeline lazily: sample i is augmentation
+# i % num_augments of source photo i // num_augments. Nothing is written
+# to disk and training can start right away.
+#
+# Every sample has its own seed, derived from the base seed, the epoch,
+# the file hash of the photo and the augmentation index, and the
+# pipeline runs under that seed in a forked torch RNG. A sample is
+# therefore the same whichever DataLoader worker produces it, and
+# with vary_per_epoch=True every epoch sees new augmentations that are
+# just as reproducible.
+#
+# cache_size keeps the most recently produced tensors per worker
+# (useful with vary_per_epoch=False and persistent workers, where the
+# epochs repeat the same samples).
+#
+# is_test_photo() is the train/test split of save_augmented_images.py:
+# train_model.py leaves the photos of test_set out of the stream.
+# ============================================================
+
+import hashlib
+import random
+from collections import OrderedDict
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import Dataset
+from torchvision import transforms
+
+from image_cache import load_manifest
+
+# ===============================
+# Augmentation pipeline
+# ===============================
+# Same operations as the original save_augmented_images.py
+augment = transforms.Compose([
+    transforms.RandomResizedCrop(224, scale=(0.8, 1.0)),       # Willekeurig uitsnijden en schalen
+    transforms.RandomHorizontalFlip(),                         # Spiegeling horizontaal
+    transforms.RandomVerticalFlip(),                           # Spiegeling verticaal
+    transforms.RandomRotation(40),                             # Willekeurige rotatie (tot 40 graden)
+    transforms.ColorJitter(brightness=0.3, contrast=0.3, saturation=0.3, hue=0.1),  # Kleurvariaties
+    transforms.GaussianBlur(kernel_size=(3, 3)),                # Beetje vervaging toevoegen
+])
+
+
+def item_seed(base_seed, file_hash, index, epoch=0):
+    """Seed of one augmented sample; independent of worker, process or order."""
+    key = f"{base_seed}:{epoch}:{file_hash}:{index}".encode()
+    return int.from_bytes(hashlib.sha256(key).digest()[:8], "little") & ((1 << 63) - 1)
+
+
+def augment_with_seed(image, seed):
+    """Apply the augmentation pipeline with its own RNG state, leaving the global one untouched."""
+    with torch.random.fork_rng(devices=[]):
+        torch.manual_seed(seed)
+        return augment(image)
+
+
+def is_test_photo(file_hash, seed=0, test_split=0.2):
+    """Train/test split per source photo (every copy of a photo in the same set), as in save_augmented_images.py."""
+    value = int.from_bytes(hashlib.sha256(f"{seed}:split:{file_hash}".encode()).digest()[:8], "little")
+    return value / 2**64 < test_split
+
+
+def source_images(source_dir, prefix="plant_"):
+    """Manifest entries of the original photos in the <prefix>* folders of source_dir."""
+    return load_manifest(source_dir, prefix=prefix)
+
+
+def seed_worker(worker_id):
+    # DataLoader worker_init_fn: numpy / random seeded from the worker's torch seed
+    seed = torch.initial_seed() % 2**32
+    np.random.seed(seed)
+    random.seed(seed)
+
+
+class AugmentedStream(Dataset):
+    """
+    entries: manifest entries of the source photos (source_images())
+    class_names: class order of the labels
+    num_augments: augmented samples per photo per epoch
+    vary_per_epoch: new augmentations every epoch (set_epoch), otherwise the same every epoch
+    cache_size: produced tensors kept per worker (0 = no cache)
+    """
+
+    def __init__(self, entries, class_names, num_augments=20, seed=0,
+                 vary_per_epoch=True, cache_size=0, transform=transforms.ToTensor()):
+        self.entries = entries
+        self.targets = [class_names.index(e["class_name"]) for e in entries]
+        self.num_augments = num_augments
+        self.seed = seed
+        self.vary_per_epoch = vary_per_epoch
+        self.cache_size = cache_size
+        self.transform = transform
+        self.epoch = 0
+        self.cache = OrderedDict()
+
+    def set_epoch(self, epoch):
+        # Workers get a copy of the dataset when they start: use this with
+        # persistent_workers=False so every epoch's workers see the new epoch
+        self.epoch = epoch
+
+    def __len__(self):
+        return len(self.entries) * self.num_augments
+
+    def __getitem__(self, i):
+        source, index = divmod(i, self.num_augments)
+        entry = self.entries[source]
+        seed = item_seed(self.seed, entry["hash"], index, self.epoch if self.vary_per_epoch else 0)
+
+        if seed in self.cache:
+            self.cache.move_to_end(seed)
+            return self.cache[seed], self.targets[source]
+
+        image = Image.open(entry["path"]).convert("RGB")
+        tensor = self.transform(augment_with_seed(image, seed))
+
+        if self.cache_size:
+            self.cache[seed] = tensor
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return tensor, self.targets[source]
@@ -0,0 +1,258 @@
+# ============================================================
+# camera_service.py
+# Long-lived camera session for the watering robot
+# ============================================================
+#
+# The camera is opened and warmed up once (at initialize()) and then
+# kept running, so every capture only waits for the next frame instead
+# of building, configuring and warming up a new Picamera2 per plant.
+#
+# All services return frames in the same layout as Picamera2 "RGB888"
+# (H x W x 3, uint8, [B, G, R] in memory), which analyze_plant() treats as RGB.
+#
+# Optionally a second, hardware-scaled "lores" stream is configured
+# (YUV420 / I420, (H * 3 / 2) x W uint8). The green analysis can run on
+# that directly; the main frame is then only needed for logging/display.
+#
+# Stand-ins with the same interface allow testing without a camera:
+#   FileCameraService      - cycles through images from a file or folder
+#   SyntheticCameraService - generates a plant-like test frame
+#
+# open_camera() picks the backend, by default from the LEAFY_CAMERA
+# environment variable: "pi" (default), "synthetic" or a file/folder path.
+# ============================================================
+
+import os
+import time
+from glob import glob
+
+import cv2
+import numpy as np
+
+DEFAULT_SIZE = (640, 480)  # (width, height) of the main stream
+LORES_SIZE = (320, 240)    # (width, height) of the ISP-scaled analysis stream
+
+
+def to_lores(frame, lores_size=LORES_SIZE):
+    """Software version of the ISP lores stream: scale down and convert to YUV420 (I420)."""
+    small = cv2.resize(frame, lores_size, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2YUV_I420)
+
+
+class CameraService:
+    """Common interface: open() once, capture_frame() many times, close() at the end."""
+
+    def __init__(self, size=DEFAULT_SIZE, fps=None, lores_size=None):
+        self.size = size
+        self.lores_size = lores_size or LORES_SIZE
+        self.fps = fps  # stand-ins only: deliver frames at this rate like a real sensor
+        self.is_open = False
+        self.frames_captured = 0
+        self.next_frame_time = 0.0
+
+    def open(self):
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def capture_frame(self):
+        if not self.is_open:
+            self.open()
+        if self.fps:
+            self._pace()
+        frame = self._grab()
+        self.frames_captured += 1
+        return frame
+
+    def capture_lores(self):
+        """Next frame of the lores stream (YUV420)."""
+        return self.capture_pair()[1]
+
+    def capture_pair(self):
+        """Main (RGB888) and lores (YUV420) frame of the same exposure."""
+        frame = self.capture_frame()
+        return frame, to_lores(frame, self.lores_size)
+
+    def _grab(self):
+        raise NotImplementedError
+
+    def _pace(self):
+        now = time.perf_counter()
+        if self.next_frame_time > now:
+            time.sleep(self.next_frame_time - now)
+        self.next_frame_time = max(self.next_frame_time, now) + 1.0 / self.fps
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# ------------------------------------------------------------
+# REAL CAMERA
+# ------------------------------------------------------------
+class PiCameraService(CameraService):
+    """
+    Picamera2 session that stays started between captures.
+    warmup: seconds the sensor gets after (re)starting
+    retries: reconnect attempts when a capture fails
+    lores_size: also configure the ISP-scaled YUV420 lores stream at this size
+    """
+
+    def __init__(self, size=DEFAULT_SIZE, warmup=1.5, retries=2, lores_size=None):
+        super().__init__(size, lores_size=lores_size)  # frame rate is set by the sensor itself
+        self.use_lores = lores_size is not None
+        self.warmup = warmup
+        self.retries = retries
+        self.reconnects = 0
+        self.picam2 = None
+
+    def open(self):
+        if self.is_open:
+            return
+        from picamera2 import Picamera2  # only available on the Pi
+
+        self.picam2 = Picamera2()
+        try:
+            streams = {"main": {"format": "RGB888", "size": self.size}}
+            if self.use_lores:
+                streams["lores"] = {"format": "YUV420", "size": self.lores_size}
+            self.picam2.configure(self.picam2.create_preview_configuration(**streams))
+            self.picam2.start()
+            time.sleep(self.warmup)  # Sensor warm-up, only once per session
+        except Exception:
+            self.close()
+            raise
+        self.is_open = True
+
+    def close(self):
+        # Releases the camera hardware, also after a failed open
+        if self.picam2 is not None:
+            try:
+                self.picam2.stop()
+            finally:
+                self.picam2.close()
+                self.picam2 = None
+        self.is_open = False
+
+    def reconnect(self):
+        self.close()
+        self.reconnects += 1
+        self.open()
+
+    def capture_lores(self):
+        if not self.use_lores:
+            return super().capture_lores()
+        if not self.is_open:
+            self.open()
+        lores = self._retry(lambda: self.picam2.capture_array("lores"))
+        self.frames_captured += 1
+        return lores
+
+    def capture_pair(self):
+        if not self.use_lores:
+            return super().capture_pair()
+        if not self.is_open:
+            self.open()
+        (main, lores), _ = self._retry(lambda: self.picam2.capture_arrays(["main", "lores"]))
+        self.frames_captured += 1
+        return main, lores
+
+    def _grab(self):
+        # Look up self.picam2 on every attempt: reconnect() replaces it
+        return self._retry(lambda: self.picam2.capture_array())
+
+    def _retry(self, capture):
+        for attempt in range(self.retries + 1):
+            try:
+                return capture()
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                print(f"Camera capture failed ({e}), reconnecting...")
+                self.reconnect()
+
+
+# ------------------------------------------------------------
+# STAND-INS (NO CAMERA NEEDED)
+# ------------------------------------------------------------
+class FileCameraService(CameraService):
+    """Returns the images of a file or folder (with class subfolders) in turn, resized to size."""
+
+    def __init__(self, path, size=DEFAULT_SIZE, fps=None, lores_size=None):
+        super().__init__(size, fps, lores_size)
+        if os.path.isdir(path):
+            self.paths = sorted(
+                p for p in glob(os.path.join(path, "**", "*"), recursive=True)
+                if p.lower().endswith((".jpg", ".jpeg", ".png"))
+            )
+        else:
+            self.paths = [path]
+        if not self.paths:
+            raise FileNotFoundError(f"No images found in {path}")
+        self.index = 0
+
+    def _grab(self):
+        path = self.paths[self.index % len(self.paths)]
+        self.index += 1
+        image_bgr = cv2.imread(path)
+        if image_bgr is None:
+            raise IOError(f"Cannot read image {path}")
+        return cv2.resize(image_bgr, self.size, interpolation=cv2.INTER_AREA)
+
+
+class SyntheticCameraService(CameraService):
+    """
+    Generates a soil-coloured frame with a green 'plant' in the middle and some sensor noise.
+    plant_height: fraction of the frame height covered by the plant
+    fps: frame rate to simulate (None = as fast as possible)
+    """
+
+    def __init__(self, size=DEFAULT_SIZE, plant_height=0.6, noise=8, seed=0, fps=None, lores_size=None):
+        super().__init__(size, fps, lores_size)
+        self.plant_height = plant_height
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+
+        w, h = size
+        base = np.empty((h, w, 3), dtype=np.uint8)
+        base[:] = (60, 90, 120)  # soil / background (BGR, like RGB888 in memory)
+        center = (w // 2, h // 2)
+        axes = (max(1, w // 5), max(1, int(h * plant_height) // 2))
+        cv2.ellipse(base, center, axes, 0, 0, 360, (40, 140, 40), -1)  # plant
+        self.base = base
+
+    def _grab(self):
+        if not self.noise:
+            return self.base.copy()
+        noise = self.rng.integers(-self.noise, self.noise + 1, size=self.base.shape, dtype=np.int16)
+        return np.clip(self.base.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+# ------------------------------------------------------------
+# FACTORY
+# ------------------------------------------------------------
+def open_camera(source=None, size=DEFAULT_SIZE, **kwargs):
+    """
+    Create the camera service for source ("pi", "synthetic" or a file/folder path).
+    Without source the LEAFY_CAMERA environment variable is used (default "pi").
+    The service is not opened yet; call open() or use it as a context manager.
+    """
+    source = source or os.environ.get("LEAFY_CAMERA", "pi")
+    if source == "pi":
+        return PiCameraService(size, **kwargs)
+    if source == "synthetic":
+        return SyntheticCameraService(size, **kwargs)
+    return FileCameraService(source, size, **kwargs)
+
+
+if __name__ == "__main__":
+    # Quick check: time the captures of the selected backend
+    with open_camera() as camera:
+        for i in range(10):
+            t0 = time.perf_counter()
+            frame = camera.capture_frame()
+            print(f"Frame {i}: {frame.shape} in {(time.perf_counter() - t0) * 1000:.1f} ms")
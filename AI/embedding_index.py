@@ -0,0 +1,340 @@
+# ============================================================
+# embedding_index.py
+# Nearest-neighbour plant classifier on ResNet18 embeddings
+# ============================================================
+#
+# The index works on the 512-d embeddings of the frozen ImageNet
+# ResNet18 (feature_cache.py). Those are the embeddings of the trained
+# model only when train_model.py ran in "features" mode; "full" and
+# "stream" train in train mode, so the BatchNorm statistics of
+# plant_model.pth follow the plant data and its backbone is a different
+# network. Instead of retraining fc for every new plant_N, this index
+# keeps per class:
+#
+#   - a prototype: the normalized mean of the class' embeddings
+#   - up to exemplars_per_class exemplars, picked by farthest-point
+#     sampling so they cover the spread of the class (angles, light)
+#
+# as L2-normalized float16 rows. A query is one matrix product with all
+# rows (cosine similarity); the top-k rows vote for their class,
+# weighted by similarity. Enrolling a species only embeds its photos
+# and appends rows; the other classes are untouched.
+#
+#     python embedding_index.py build [--data augmented_dataset]
+#     python embedding_index.py enroll plant_7 photo1.jpg photo2.jpg ...
+#     python embedding_index.py compare [--holdout plant_3 --shots 5]
+#
+# compare puts the index next to plant_model.pth on test_set. The model
+# runs as a whole, as in testing_model.py (eval mode, Resize 224 +
+# ToTensor), so the baseline is the network the robot would use and not
+# its fc head on the frozen embeddings. compare also measures the lookup
+# time and, with --holdout, builds the index without one class and
+# enrolls it from a few photos, as a new species would be.
+# ============================================================
+
+import json
+import os
+import time
+
+import numpy as np
+
+from image_cache import file_hash
+from plant_classifier import EXPORT_DIR, KNN_INDEX
+
+INDEX_PATH = os.path.join(EXPORT_DIR, KNN_INDEX)
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def select_exemplars(vectors, count):
+    """Farthest-point sample of count normalized rows, starting at the one closest to the class mean."""
+    if len(vectors) <= count:
+        return vectors
+    start = int(np.argmax(vectors @ normalize(vectors.mean(axis=0))))
+    chosen = [start]
+    closest = vectors @ vectors[start]  # similarity of every row to its nearest chosen row
+    for _ in range(count - 1):
+        i = int(np.argmin(closest))
+        chosen.append(i)
+        np.maximum(closest, vectors @ vectors[i], out=closest)
+    return vectors[chosen]
+
+
+class EmbeddingIndex:
+    """
+    class_names: class of every label index
+    exemplars_per_class: exemplar rows kept per class next to the prototype
+    """
+
+    def __init__(self, class_names=(), exemplars_per_class=32, dim=512):
+        self.class_names = list(class_names)
+        self.exemplars_per_class = exemplars_per_class
+        self.vectors = np.empty((0, dim), dtype=np.float16)   # normalized rows, stored compact
+        self.labels = np.empty(0, dtype=np.int32)             # class index per row
+        self.prototypes = np.empty(0, dtype=bool)             # row is the class prototype
+        self.matrix = None  # float32 copy for the search, made on first use
+
+    @classmethod
+    def build(cls, features, class_of_row, exemplars_per_class=32):
+        """Index of labelled embeddings (N x 512) with class_of_row[i] the class name of row i."""
+        index = cls(exemplars_per_class=exemplars_per_class, dim=features.shape[1])
+        class_of_row = np.asarray(class_of_row)
+        for name in sorted(set(class_of_row)):
+            index.enroll(name, features[class_of_row == name])
+        return index
+
+    def __len__(self):
+        return len(self.labels)
+
+    def enroll(self, class_name, features):
+        """Add (or replace) a class from its embeddings; returns the number of rows it got."""
+        vectors = normalize(features)
+        rows = np.vstack([normalize(vectors.mean(axis=0))[None], select_exemplars(vectors, self.exemplars_per_class)])
+
+        if class_name in self.class_names:
+            label = self.class_names.index(class_name)
+            keep = self.labels != label
+            self.vectors, self.labels, self.prototypes = self.vectors[keep], self.labels[keep], self.prototypes[keep]
+        else:
+            label = len(self.class_names)
+            self.class_names.append(class_name)
+
+        self.vectors = np.vstack([self.vectors, rows.astype(np.float16)])
+        self.labels = np.concatenate([self.labels, np.full(len(rows), label, dtype=np.int32)])
+        self.prototypes = np.concatenate([self.prototypes, np.arange(len(rows)) == 0])
+        self.matrix = None
+        return len(rows)
+
+    def votes(self, queries, k=5):
+        """
+        Similarity-weighted votes of the top-k rows per class (B x classes) for queries
+        (B x 512 or one 512-d vector), and the best cosine similarity per query.
+        """
+        if len(self.labels) == 0:
+            raise ValueError("the index is empty: build it or enroll a class first")
+        if self.matrix is None:
+            # numpy has no fast float16 matrix product; the float32 copy is small (rows x 512)
+            self.matrix = np.ascontiguousarray(self.vectors, dtype=np.float32)
+        queries = normalize(np.atleast_2d(queries))
+        similarities = queries @ self.matrix.T
+        k = min(k, len(self.labels))
+
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        top_similarities = np.take_along_axis(similarities, top, axis=1)
+        votes = np.zeros((len(queries), len(self.class_names)), dtype=np.float32)
+        np.add.at(votes, (np.arange(len(queries))[:, None], self.labels[top]), np.maximum(top_similarities, 0))
+        return votes, top_similarities.max(axis=1)
+
+    def search(self, queries, k=5):
+        """
+        Classes of queries (B x 512 or one 512-d vector) by a similarity-weighted vote of the top-k rows.
+        Returns (class indices, confidence = winner's share of the vote, best cosine similarity).
+        """
+        votes, best = self.votes(queries, k)
+        predicted = votes.argmax(axis=1)
+        confidence = votes[np.arange(len(votes)), predicted] / np.maximum(votes.sum(axis=1), 1e-12)
+        return predicted, confidence, best
+
+    def save(self, path=INDEX_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez(path, vectors=self.vectors, labels=self.labels, prototypes=self.prototypes,
+                 class_names=json.dumps(self.class_names), exemplars_per_class=self.exemplars_per_class)
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        with np.load(path) as data:
+            index = cls(json.loads(str(data["class_names"])), int(data["exemplars_per_class"]), data["vectors"].shape[1])
+            index.vectors = data["vectors"]
+            index.labels = data["labels"]
+            index.prototypes = data["prototypes"]
+        return index
+
+
+def source_photo(path):
+    """Original photo of an augmented file (save_augmented_images.py names them <photo>_aug_<n>.jpg)."""
+    return os.path.basename(path).rsplit("_aug_", 1)[0]
+
+
+def path_entries(paths, class_name=None):
+    """Manifest-style entries (path, class_name, hash) for loose photos, so FeatureCache can embed them."""
+    return [{"path": path, "class_name": class_name, "hash": file_hash(path)} for path in paths]
+
+
+class KnnClassifier:
+    """
+    Frozen backbone + index: classify photos without an fc head.
+    Same preprocessing and backbone as feature_cache.py (torch needed).
+    """
+
+    def __init__(self, index_path=INDEX_PATH, device="cpu", k=5):
+        from feature_cache import load_backbone, preprocess
+
+        self.index = EmbeddingIndex.load(index_path)
+        self.backbone = load_backbone(device)
+        self.preprocess = preprocess
+        self.device = device
+        self.k = k
+
+    @property
+    def class_names(self):
+        return self.index.class_names
+
+    def embed(self, images):
+        import torch
+
+        batch = torch.stack([self.preprocess(image.convert("RGB")) for image in images]).to(self.device)
+        with torch.inference_mode():
+            return self.backbone(batch).cpu().numpy()
+
+    def scores(self, batch):
+        """Vote share per class (N x classes) for a preprocessed float32 batch (N, 3, 224, 224)."""
+        import torch
+
+        with torch.inference_mode():
+            features = self.backbone(torch.as_tensor(batch).to(self.device)).cpu().numpy()
+        votes, _ = self.index.votes(features, self.k)
+        return votes / np.maximum(votes.sum(axis=1, keepdims=True), 1e-12)
+
+    def predict(self, image):
+        """(label, index, confidence) of one PIL image."""
+        predicted, confidence, _ = self.index.search(self.embed([image]), self.k)
+        index = int(predicted[0])
+        return self.class_names[index], index, float(confidence[0])
+
+    def enroll(self, class_name, images):
+        """Add a species from a few PIL images; the index is not saved."""
+        return self.index.enroll(class_name, self.embed(images))
+
+
+def model_predictions(model_path, entries, class_names, batch_size=16):
+    """
+    Class names predicted by the trained model (full ResNet18 state_dict) for manifest entries,
+    loaded and run as testing_model.py does; "" for images that could not be opened.
+    """
+    import torch
+    from torch.utils.data import DataLoader
+    from torchvision import models
+
+    from testing_model import TestImages, collate_skip_missing
+
+    model = models.resnet18(weights=None)
+    model.fc = torch.nn.Linear(model.fc.in_features, len(class_names))
+    model.load_state_dict(torch.load(model_path, map_location="cpu"))
+    model.eval()
+
+    predicted = np.full(len(entries), "", dtype=object)
+    loader = DataLoader(TestImages(entries), batch_size=batch_size, collate_fn=collate_skip_missing)
+    with torch.inference_mode():
+        for batch in loader:
+            if batch is None:
+                continue
+            images, indices = batch
+            predicted[indices.numpy()] = np.array(class_names)[model(images).argmax(1).numpy()]
+    return predicted
+
+
+# ------------------------------------------------------------
+# COMMAND LINE: BUILD / ENROLL / COMPARE WITH THE TRAINED MODEL
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    import argparse
+
+    from feature_cache import FeatureCache
+    from image_cache import load_manifest
+
+    parser = argparse.ArgumentParser(description="k-NN plant classifier on cached ResNet18 embeddings")
+    parser.add_argument("--index", default=INDEX_PATH)
+    parser.add_argument("--exemplars", type=int, default=32, help="exemplar rows per class")
+    parser.add_argument("-k", type=int, default=5, help="neighbours that vote")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="index of every class in the training data")
+    build_parser.add_argument("--data", default="augmented_dataset")
+    enroll_parser = commands.add_parser("enroll", help="add or replace one class from a few photos")
+    enroll_parser.add_argument("class_name")
+    enroll_parser.add_argument("photos", nargs="+")
+    compare_parser = commands.add_parser("compare", help="accuracy and speed next to the trained model on the test set")
+    compare_parser.add_argument("--data", default="augmented_dataset")
+    compare_parser.add_argument("--test", default="test_set")
+    compare_parser.add_argument("--model", default="plant_model.pth")
+    compare_parser.add_argument("--holdout", default=None, help="class left out of the index and enrolled from --shots photos")
+    compare_parser.add_argument("--shots", type=int, default=5)
+    args = parser.parse_args()
+
+    cache = FeatureCache()
+
+    if args.command == "build":
+        entries = load_manifest(args.data)
+        start = time.perf_counter()
+        index = EmbeddingIndex.build(cache.embed(entries), [e["class_name"] for e in entries], args.exemplars)
+        index.save(args.index)
+        print(f"{len(index.class_names)} classes, {len(index)} rows ({index.vectors.nbytes / 1024:.0f} KB float16) "
+              f"in {time.perf_counter() - start:.1f} s -> {args.index}")
+
+    elif args.command == "enroll":
+        index = EmbeddingIndex.load(args.index) if os.path.exists(args.index) else EmbeddingIndex(exemplars_per_class=args.exemplars)
+        start = time.perf_counter()
+        rows = index.enroll(args.class_name, cache.embed(path_entries(args.photos, args.class_name)))
+        index.save(args.index)
+        print(f"Enrolled {args.class_name}: {len(args.photos)} photos -> {rows} rows "
+              f"in {time.perf_counter() - start:.2f} s (embedding included)")
+
+    else:
+        train_entries = load_manifest(args.data)
+        test_entries = load_manifest(args.test)
+        train_features = cache.embed(train_entries)
+        test_features = cache.embed(test_entries)
+        train_classes = np.array([e["class_name"] for e in train_entries])
+        test_classes = np.array([e["class_name"] for e in test_entries])
+
+        # Baseline: the trained model itself on the test photos
+        model_classes = sorted(set(train_classes))  # ImageFolder order, as in train_model.py
+        start = time.perf_counter()
+        model_predicted = model_predictions(args.model, test_entries, model_classes)
+        model_ms = (time.perf_counter() - start) * 1000 / len(test_entries)
+        print(f"Test set: {len(test_entries)} images, {len(model_classes)} classes")
+        print(f"{os.path.basename(args.model):<24}: {np.mean(model_predicted == test_classes) * 100:6.2f}% "
+              f"({model_ms:.1f} ms per image incl. decoding)")
+
+        start = time.perf_counter()
+        index = EmbeddingIndex.build(train_features, train_classes, args.exemplars)
+        build_time = time.perf_counter() - start
+        predicted, _, _ = index.search(test_features, args.k)
+        knn_predicted = np.array(index.class_names)[predicted]
+        print(f"k-NN index (k={args.k})      : {np.mean(knn_predicted == test_classes) * 100:6.2f}% "
+              f"({len(index)} rows, {index.vectors.nbytes / 1024:.0f} KB, built in {build_time * 1000:.0f} ms)")
+        print(f"Agreement with the model: {np.mean(knn_predicted == model_predicted) * 100:6.2f}%")
+
+        # One query at a time, as on the robot
+        index.search(test_features[0], args.k)
+        times = []
+        for query in test_features[:200]:
+            t0 = time.perf_counter()
+            index.search(query, args.k)
+            times.append(time.perf_counter() - t0)
+        print(f"Lookup, one query       : p50 {np.median(times) * 1e6:.0f} us, p99 {np.percentile(times, 99) * 1e6:.0f} us")
+
+        if args.holdout:
+            # New species: index without it, then enroll it from a few training photos
+            known = train_classes != args.holdout
+            index = EmbeddingIndex.build(train_features[known], train_classes[known], args.exemplars)
+            # One augmented copy each of the first --shots different photos (name_aug_N.jpg),
+            # not --shots augmentations of the same photo
+            shots, photos = [], set()
+            for i in np.flatnonzero(~known):
+                photo = source_photo(train_entries[i]["path"])
+                if photo not in photos and len(shots) < args.shots:
+                    photos.add(photo)
+                    shots.append(i)
+            start = time.perf_counter()
+            index.enroll(args.holdout, train_features[shots])
+            enroll_ms = (time.perf_counter() - start) * 1000
+            predicted, _, _ = index.search(test_features, args.k)
+            predicted = np.array(index.class_names)[predicted]
+            held = test_classes == args.holdout
+            print(f"\nHoldout {args.holdout}: enrolled from {len(shots)} different photos in {enroll_ms:.1f} ms (cached embeddings)")
+            print(f"  accuracy on {args.holdout}   : {np.mean(predicted[held] == args.holdout) * 100:6.2f}% ({held.sum()} images)")
+            print(f"  accuracy on the others: {np.mean(predicted[~held] == test_classes[~held]) * 100:6.2f}%")
@@ -0,0 +1,201 @@
+# ============================================================
+# export_model.py
+# Export plant_model.pth to TorchScript / ONNX (fp32 + int8)
+# ============================================================
+#
+# Run after train_model.py:
+#
+#     python export_model.py
+#
+# Writes to exported_model/ (see plant_classifier.py):
+#   - classes.json              class names in training order
+#   - model.ts                  traced + frozen TorchScript (fp32)
+#   - model_fp32.onnx           ONNX graph, dynamic batch size
+#   - model_int8_static.onnx    onnxruntime static quantization (QDQ, per-channel
+#                               int8 weights, uint8 activations), calibrated on
+#                               calibration_images images of augmented_dataset
+#   - model_int8_dynamic.onnx   onnxruntime dynamic quantization (int8 weights)
+#   - report.json               accuracy, agreement with fp32 and latency per artifact
+#
+# The report runs every artifact on test_set with batch size 1 (one
+# frame at a time, as on the robot) and prints accuracy, top-1 agreement
+# with the fp32 PyTorch model and median latency. The ONNX steps need the
+# onnx and onnxruntime packages and are skipped without them.
+# ============================================================
+
+import json
+import os
+import random
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import models
+
+from image_cache import load_manifest
+from plant_classifier import ARTIFACTS, EXPORT_DIR, FALLBACK, PlantClassifier, preprocess
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+model_path = "plant_model.pth"          # trained model (train_model.py)
+data_dir = "augmented_dataset"          # training data: class names + calibration images
+test_dir = "test_set"                   # images for the report
+export_dir = EXPORT_DIR
+calibration_images = 200                # images used for the int8 calibration
+opset = 17
+num_threads = None                      # inference threads in the report (None = runtime default)
+
+
+def load_fp32_model(class_names):
+    model = models.resnet18(weights=None)
+    model.fc = torch.nn.Linear(model.fc.in_features, len(class_names))
+    model.load_state_dict(torch.load(model_path, map_location="cpu"))
+    return model.eval()
+
+
+def export_torchscript(model, example):
+    # Saved frozen only: optimize_for_inference folds the weights into prepacked MKLDNN
+    # constants that are not serialized (the file cannot be loaded again), so
+    # plant_classifier.py applies it after loading
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+        frozen = torch.jit.freeze(traced)
+    path = os.path.join(export_dir, ARTIFACTS["torchscript"])
+    frozen.save(path)
+    return path
+
+
+def export_onnx(model, example):
+    path = os.path.join(export_dir, ARTIFACTS["onnx_fp32"])
+    torch.onnx.export(
+        model,
+        example,
+        path,
+        input_names=["image"],
+        output_names=["logits"],
+        dynamic_axes={"image": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=opset,
+    )
+    return path
+
+
+def calibration_batches(entries, count):
+    """Preprocessed images (1, 3, 224, 224) from a fixed random sample of the training data."""
+    sample = random.Random(0).sample(entries, min(count, len(entries)))
+    for entry in sample:
+        yield preprocess(Image.open(entry["path"]))[None]
+
+
+def quantize_onnx(fp32_path, entries):
+    """Static (calibrated) and dynamic int8 versions of the ONNX graph."""
+    from onnxruntime.quantization import (
+        CalibrationDataReader,
+        QuantFormat,
+        QuantType,
+        quantize_dynamic,
+        quantize_static,
+    )
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self.batches = calibration_batches(entries, calibration_images)
+
+        def get_next(self):
+            batch = next(self.batches, None)
+            return None if batch is None else {"image": batch}
+
+    # Shape inference + graph cleanup first, as onnxruntime recommends for quantization
+    prepared_path = os.path.join(export_dir, "model_fp32_prepared.onnx")
+    quant_pre_process(fp32_path, prepared_path)
+
+    static_path = os.path.join(export_dir, ARTIFACTS["onnx_int8_static"])
+    quantize_static(
+        prepared_path,
+        static_path,
+        Reader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+
+    dynamic_path = os.path.join(export_dir, ARTIFACTS["onnx_int8_dynamic"])
+    quantize_dynamic(prepared_path, dynamic_path, weight_type=QuantType.QInt8)
+    os.remove(prepared_path)
+    return static_path, dynamic_path
+
+
+def evaluate(classifier, images, labels, reference=None):
+    """Accuracy, agreement with the reference predictions and latency (batch size 1)."""
+    predictions, times = [], []
+    for _ in range(3):  # warm-up
+        classifier.logits(images[0])
+    for image in images:
+        start = time.perf_counter()
+        logits = classifier.logits(image)
+        times.append(time.perf_counter() - start)
+        predictions.append(int(logits.argmax()))
+
+    predictions = np.array(predictions)
+    result = {
+        "accuracy": float((predictions == labels).mean() * 100),
+        "latency_ms": float(np.median(times) * 1000),
+        "latency_p90_ms": float(np.percentile(times, 90) * 1000),
+    }
+    if reference is not None:
+        result["agreement_with_fp32"] = float((predictions == reference).mean() * 100)
+    return result, predictions
+
+
+if __name__ == "__main__":
+    os.makedirs(export_dir, exist_ok=True)
+    class_names = sorted(d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d)))
+    with open(os.path.join(export_dir, "classes.json"), "w", encoding="utf-8") as f:
+        json.dump(class_names, f)
+
+    model = load_fp32_model(class_names)
+    example = torch.rand(1, 3, 224, 224)
+
+    print("TorchScript:", export_torchscript(model, example))
+    try:
+        fp32_path = export_onnx(model, example)
+        print("ONNX fp32:", fp32_path)
+        static_path, dynamic_path = quantize_onnx(fp32_path, load_manifest(data_dir))
+        print("ONNX int8 static:", static_path)
+        print("ONNX int8 dynamic:", dynamic_path)
+    except ImportError as e:
+        print(f"ONNX export / quantization skipped ({e})")
+
+    # --------------------------------------------------------
+    # REPORT ON THE TEST SET
+    # --------------------------------------------------------
+    entries = [e for e in load_manifest(test_dir) if e["class_name"] in class_names]
+    images = [preprocess(Image.open(e["path"]))[None] for e in entries]
+    labels = np.array([class_names.index(e["class_name"]) for e in entries])
+    print(f"\nReport on {test_dir}: {len(images)} images, batch size 1")
+
+    report = {}
+    fp32 = PlantClassifier(export_dir, model_path, backend=FALLBACK, num_threads=num_threads, class_names=class_names)
+    report[FALLBACK], reference = evaluate(fp32, images, labels)
+
+    for name in fp32.available():
+        try:
+            classifier = PlantClassifier(export_dir, model_path, backend=name, num_threads=num_threads)
+        except ImportError as e:
+            print(f"{name}: skipped ({e})")
+            continue
+        report[name], _ = evaluate(classifier, images, labels, reference)
+
+    with open(os.path.join(export_dir, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    base = report[FALLBACK]
+    for name, result in report.items():
+        agreement = result.get("agreement_with_fp32", 100.0)
+        print(f"{name:18s} acc {result['accuracy']:6.2f}% ({result['accuracy'] - base['accuracy']:+.2f}) | "
+              f"same as fp32 {agreement:6.2f}% | {result['latency_ms']:7.2f} ms "
+              f"(p90 {result['latency_p90_ms']:.2f}) | {base['latency_ms'] / result['latency_ms']:.1f}x")
+    print(f"\nPlantClassifier picks: {PlantClassifier(export_dir, model_path).backend_name}")
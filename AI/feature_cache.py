@@ -0,0 +1,106 @@
+# ============================================================
+# feature_cache.py
+# Cached ResNet18 embeddings for training the fc head
+# ============================================================
+#
+# train_model.py freezes the weights of every ResNet18 layer except fc.
+# In its "features" mode the backbone also keeps the ImageNet BatchNorm
+# statistics (eval mode), so the 512-d vector before fc never changes
+# for an image. ("full" and "stream" train in train mode, where the
+# BatchNorm running statistics follow the plant data: a different model.)
+# FeatureCache runs the frozen backbone once per image and keeps
+# the embeddings in a memory map keyed by the file hash of the dataset
+# manifest (memmap_store.py, image_cache.py). Adding photos to the
+# dataset only embeds the new files.
+#
+# The backbone runs in eval mode (ImageNet BatchNorm statistics), the
+# same way testing_model.py runs the trained model, with the training
+# preprocessing (Resize 224x224 + ToTensor).
+# ============================================================
+
+import os
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+from torch import nn
+from torch.utils.data import DataLoader, Dataset
+from torchvision import models, transforms
+
+from image_cache import CACHE_DIR
+from memmap_store import MemmapStore
+
+FEATURE_DIM = 512
+# Change the key when the backbone, its weights or the preprocessing change
+FEATURE_KEY = "resnet18_imagenet1k_v1_resize224"
+
+preprocess = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+])
+
+
+def load_backbone(device):
+    """Pretrained ResNet18 without its fc layer, frozen and in eval mode."""
+    backbone = models.resnet18(weights="IMAGENET1K_V1")
+    backbone.fc = nn.Identity()
+    for param in backbone.parameters():
+        param.requires_grad = False
+    return backbone.eval().to(device)
+
+
+class ManifestImages(Dataset):
+    """Preprocessed images of manifest entries (PIL decoding, as in training)."""
+
+    def __init__(self, entries, transform=preprocess):
+        self.entries = entries
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, i):
+        image = Image.open(self.entries[i]["path"]).convert("RGB")
+        return self.transform(image)
+
+
+class FeatureCache:
+    """
+    cache_dir: folder of the memory map (features_<key>.npy + .json index)
+    device: device the backbone runs on when new images have to be embedded
+    """
+
+    def __init__(self, cache_dir=os.path.join(CACHE_DIR, "features"), key=FEATURE_KEY,
+                 device="cpu", batch_size=32, num_workers=0):
+        self.store = MemmapStore(os.path.join(cache_dir, f"features_{key}.npy"), (FEATURE_DIM,), np.float32)
+        self.device = device
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.backbone = None  # loaded only when something has to be embedded
+
+    def embed(self, entries):
+        """
+        Embeddings (len(entries) x 512, float32) of manifest entries.
+        Only images whose hash is not cached yet go through the backbone.
+        """
+        by_hash = {entry["hash"]: entry for entry in entries}
+        missing = self.store.missing(by_hash)
+        if missing:
+            if self.backbone is None:
+                self.backbone = load_backbone(self.device)
+            loader = DataLoader(
+                ManifestImages([by_hash[h] for h in missing]),
+                batch_size=self.batch_size,
+                num_workers=self.num_workers,
+            )
+            start = time.perf_counter()
+            done = 0
+            with torch.inference_mode():
+                for images in loader:
+                    features = self.backbone(images.to(self.device)).cpu().numpy()
+                    self.store.put(missing[done:done + len(features)], features)
+                    done += len(features)
+            print(f"Embedded {done} new images in {time.perf_counter() - start:.1f} s")
+
+        return self.store.get([entry["hash"] for entry in entries])
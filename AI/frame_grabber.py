@@ -0,0 +1,180 @@
+# ============================================================
+# frame_grabber.py
+# Background capture thread with a latest-frame ring buffer
+# ============================================================
+#
+# A thread keeps pulling frames from a camera service (camera_service.py)
+# into a small ring of preallocated buffers. latest() then returns the
+# newest frame without waiting for the camera, and last(n) the newest n
+# frames for temporal analysis. The ring buffers are allocated once at
+# start() and reused for every frame.
+#
+# Metrics: frames captured, frames dropped (overwritten before anyone read
+# them), capture errors and the achieved frame rate.
+#
+# Try it without a camera:
+#     LEAFY_CAMERA=synthetic python frame_grabber.py
+# ============================================================
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class FrameGrabber:
+    """
+    camera: camera service with open() / capture_frame() / close()
+    buffer_size: number of frames in the ring
+    fps_window: number of recent frames used for the frame rate
+    stream: "main" (RGB frames) or "lores" (YUV420 frames for the analysis)
+    """
+
+    def __init__(self, camera, buffer_size=4, fps_window=30, stream="main"):
+        self.camera = camera
+        self.capture = camera.capture_lores if stream == "lores" else camera.capture_frame
+        self.buffer_size = buffer_size
+        self.ring = None
+        self.seq = np.full(buffer_size, -1, dtype=np.int64)   # frame number per slot
+        self.unread = np.zeros(buffer_size, dtype=bool)       # slot written but never read
+
+        self.lock = threading.Lock()
+        self.new_frame = threading.Condition(self.lock)
+        self.thread = None
+        self.running = False
+
+        self.frames = 0     # frames written into the ring
+        self.dropped = 0    # frames overwritten without being read
+        self.errors = 0     # failed captures
+        self.timestamps = deque(maxlen=fps_window)
+
+    # --------------------------------------------------------
+    # START / STOP
+    # --------------------------------------------------------
+    def start(self):
+        if self.running:
+            return
+        self.camera.open()
+        first = self.capture()
+        # Allocate the ring once, in the camera's frame layout
+        self.ring = np.empty((self.buffer_size,) + first.shape, dtype=first.dtype)
+        self._store(first)
+
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="FrameGrabber", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+        self.camera.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    # --------------------------------------------------------
+    # CAPTURE THREAD
+    # --------------------------------------------------------
+    def _run(self):
+        while self.running:
+            try:
+                frame = self.capture()
+            except Exception as e:
+                self.errors += 1
+                print(f"FrameGrabber: capture failed ({e})")
+                time.sleep(0.1)
+                continue
+            self._store(frame)
+
+    def _store(self, frame):
+        with self.lock:
+            slot = self.frames % self.buffer_size
+            if self.unread[slot]:
+                self.dropped += 1
+            np.copyto(self.ring[slot], frame)  # reuse the slot, no new allocation
+            self.seq[slot] = self.frames
+            self.unread[slot] = True
+            self.frames += 1
+            self.timestamps.append(time.perf_counter())
+            self.new_frame.notify_all()
+
+    # --------------------------------------------------------
+    # READING
+    # --------------------------------------------------------
+    def _check_started(self):
+        # The ring is allocated by start(), in the layout of the first frame
+        if self.ring is None:
+            raise RuntimeError("FrameGrabber not started")
+
+    def latest(self, out=None):
+        """
+        Copy of the newest frame (into out when given, to avoid an allocation).
+        Does not wait for the camera.
+        """
+        self._check_started()
+        with self.lock:
+            slot = (self.frames - 1) % self.buffer_size
+            self.unread[slot] = False
+            if out is None:
+                return self.ring[slot].copy()
+            np.copyto(out, self.ring[slot])
+            return out
+
+    def last(self, n, out=None):
+        """Copies of the newest n frames (oldest first), n is at most buffer_size."""
+        self._check_started()
+        with self.lock:
+            n = min(n, self.frames, self.buffer_size)
+            slots = [(self.frames - n + i) % self.buffer_size for i in range(n)]
+            self.unread[slots] = False
+            if out is None:
+                return self.ring[slots]  # fancy indexing returns a copy
+            np.take(self.ring, slots, axis=0, out=out[:n])
+            return out[:n]
+
+    def wait_for_frame(self, after_seq, timeout=1.0):
+        """Block until a frame newer than after_seq is available; returns the newest frame number."""
+        with self.new_frame:
+            self.new_frame.wait_for(lambda: self.frames - 1 > after_seq, timeout=timeout)
+            return self.frames - 1
+
+    @property
+    def latest_seq(self):
+        return self.frames - 1
+
+    def fps(self):
+        with self.lock:
+            if len(self.timestamps) < 2:
+                return 0.0
+            return (len(self.timestamps) - 1) / (self.timestamps[-1] - self.timestamps[0])
+
+    def metrics(self):
+        return {
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "fps": self.fps(),
+        }
+
+
+if __name__ == "__main__":
+    import os
+
+    from camera_service import open_camera
+
+    kwargs = {} if os.environ.get("LEAFY_CAMERA", "pi") == "pi" else {"fps": 30}
+    with FrameGrabber(open_camera(**kwargs), buffer_size=4) as grabber:
+        buffer = None
+        for _ in range(10):
+            time.sleep(0.2)
+            t0 = time.perf_counter()
+            buffer = grabber.latest(out=buffer)
+            print(f"latest() {buffer.shape} in {(time.perf_counter() - t0) * 1000:.2f} ms | {grabber.metrics()}")
+        print(f"last(3): {grabber.last(3).shape}")
@@ -3,18 +3,51 @@
 # Optimized for Darker Greens, High Precision & Fullscreen
 # ============================================================
 
-from picamera2 import Picamera2
 import cv2
 import numpy as np
 import time
 import random
 import sys
 
+from camera_service import open_camera
+from green_lut import GreenLUT
+from plant_extent import find_plant_extent, center_strip
+from plant_segmentation import segment_plant
+from vision_params import load_vision_params
+
 # ------------------------------------------------------------
 # HSV WAARDES - Strict enough for blue, sensitive to dark green
 # ------------------------------------------------------------
-GREEN_LOWER = np.array([39, 61, 21])  
-GREEN_UPPER = np.array([90, 255, 255])
+# Tuned values from param_search.py (vision_params.json) replace the defaults when present
+VISION_PARAMS = load_vision_params("green_camera")
+GREEN_LOWER = np.array(VISION_PARAMS.get("green_lower", [39, 61, 21]))
+GREEN_UPPER = np.array(VISION_PARAMS.get("green_upper", [90, 255, 255]))
+
+# Extent search in the center strip, pixel lengths for the 640x480 main stream
+EXTENT_RADIUS = VISION_PARAMS.get("radius", 3)
+EXTENT_THRESHOLD = VISION_PARAMS.get("threshold", 0.75)
+VERTICAL_CHECK_LEN = VISION_PARAMS.get("vertical_check_len", 10)
+VERTICAL_MIN_RATIO = VISION_PARAMS.get("vertical_min_ratio", 0.6)
+
+# "hsv": cvtColor + inRange per frame
+# "lut": colour table compiled from the thresholds at startup (green_lut.py), same mask
+GREEN_CLASSIFIER = "hsv"
+
+# "strip":      top/bottom search in the center strip of the frame (plant_extent.py)
+# "components": biggest green blob(s) of the whole frame (plant_segmentation.py),
+#               also finds plants that are not centred
+SEGMENTATION_MODE = "strip"
+
+# ------------------------------------------------------------
+# ANALYSIS STREAM
+# "main":  analyze the full 640x480 frame
+# "lores": analyze the ISP-scaled 320x240 YUV stream, main frame only for display.
+#          2.6x faster analysis, but lores_compare.py measures a mean top/bottom
+#          error of ~19 px (p95 ~70 px) and 10/160 images where only one of both
+#          finds the plant, so it stays opt-in until that is within tolerance.
+# ------------------------------------------------------------
+ANALYSIS_STREAM = "main"
+LORES_SIZE = (320, 240)
 
 # ------------------------------------------------------------
 # MATH FORMULAS
@@ -28,71 +61,80 @@ def valve_open_time_ml(V_ml):
     if disc < 0: return 0.0
     return (-b + np.sqrt(disc)) / (2*a)
 
-# ------------------------------------------------------------
-# PIXEL VALIDATION LOGIC
-# ------------------------------------------------------------
-def is_valid_pixel(y, x, mask, radius=3, threshold=0.75):
-    h, w = mask.shape
-    y0, y1 = max(0, y - radius), min(h, y + radius + 1)
-    x0, x1 = max(0, x - radius), min(w, x + radius + 1)
-    patch = mask[y0:y1, x0:x1]
-    return (np.count_nonzero(patch) / patch.size) >= threshold
-
-def connected_vertically(y, x, mask, direction="up", length=10, min_ratio=0.6):
-    h, w = mask.shape
-    connected_rows = 0
-    if direction == "up":
-        for dy in range(1, length + 1):
-            if y - dy < 0: break
-            if mask[y - dy, x] > 0: connected_rows += 1
-    else:
-        for dy in range(1, length + 1):
-            if y + dy >= h: break
-            if mask[y + dy, x] > 0: connected_rows += 1
-    return (connected_rows / length) >= min_ratio
-
 # ------------------------------------------------------------
 # ANALYSIS & CAPTURE (Safe Sequence)
 # ------------------------------------------------------------
+camera = None  # Long-lived camera session, opened on first use
+
+def get_camera():
+    global camera
+    if camera is None:
+        camera = open_camera(lores_size=LORES_SIZE if ANALYSIS_STREAM == "lores" else None)
+        camera.open()  # Sensor warm-up happens only here
+    return camera
+
 def capture_frame():
-    picam2 = Picamera2()
-    try:
-        picam2.configure(picam2.create_preview_configuration(main={"format": "RGB888", "size": (640, 480)}))
-        picam2.start()
-        time.sleep(1.5) # Sensor warm-up
-        frame = picam2.capture_array()
-    finally:
-        # Crucial: Releases camera hardware even if capture fails
-        picam2.stop()
-        picam2.close()
-    return frame
-
-def analyze_plant(image_rgb):
-    image_bgr = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
-    hsv = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2HSV)
-    green_mask = cv2.inRange(hsv, GREEN_LOWER, GREEN_UPPER)
+    return get_camera().capture_frame()
+
+def capture_pair():
+    # Main frame (display/logging) + lores frame (analysis) of the same exposure
+    return get_camera().capture_pair()
+
+def close_camera():
+    # Crucial: Releases camera hardware
+    global camera
+    if camera is not None:
+        camera.close()
+        camera = None
+
+green_luts = {}  # compiled colour tables per channel order
+
+def green_lut(channel_order):
+    if channel_order not in green_luts:
+        # No dark-green class in this script, V <= 0 never passes the S/V thresholds anyway
+        green_luts[channel_order] = GreenLUT(GREEN_LOWER, GREEN_UPPER, 0, channel_order=channel_order)
+    return green_luts[channel_order]
+
+def analyze_plant(image_rgb, mode=None):
+    # mode: "strip" / "components", None = SEGMENTATION_MODE
+    if GREEN_CLASSIFIER == "lut":
+        # Table is compiled for frames treated as RGB, so no colour conversion is needed
+        labels = green_lut("RGB").classify(image_rgb)
+        return analyze_green_mask(cv2.compare(labels, 0, cv2.CMP_GT), mode=mode)
+    return analyze_plant_bgr(cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR), mode=mode)
+
+def analyze_plant_yuv(image_yuv, scale=LORES_SIZE[0] / 640, mode=None):
+    # Lores stream: YUV420 (I420) straight from the ISP. Converted to the same
+    # channel order analyze_plant() passes on for the main stream, so the HSV values match.
+    return analyze_plant_bgr(cv2.cvtColor(image_yuv, cv2.COLOR_YUV2RGB_I420), scale, mode)
+
+def analyze_plant_bgr(image_bgr, scale=1.0, mode=None):
+    if GREEN_CLASSIFIER == "lut":
+        green_mask = cv2.compare(green_lut("BGR").classify(image_bgr), 0, cv2.CMP_GT)
+    else:
+        hsv = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2HSV)
+        green_mask = cv2.inRange(hsv, GREEN_LOWER, GREEN_UPPER)
+    return analyze_green_mask(green_mask, scale, mode)
+
+def analyze_green_mask(green_mask, scale=1.0, mode=None):
+    # scale: frame size relative to the 640x480 main stream; the patch radius and
+    # vertical check length of the extent search are in pixels, so they scale with it
     h, w = green_mask.shape
-    center_strip = green_mask[:, w // 2 - w // 20 : w // 2 + w // 20]
-
-    top_pixel, bottom_pixel = None, None
-
-    # Detect Bottom
-    for y in reversed(range(center_strip.shape[0])):
-        xs = np.where(center_strip[y] > 0)[0]
-        if len(xs) > 0:
-            if is_valid_pixel(y, xs[0], center_strip) and connected_vertically(y, xs[0], center_strip, "up"):
-                bottom_pixel = y
-                break
-        if bottom_pixel is not None: break
-
-    # Detect Top
-    for y in range(center_strip.shape[0]):
-        xs = np.where(center_strip[y] > 0)[0]
-        if len(xs) > 0:
-            if is_valid_pixel(y, xs[0], center_strip) and connected_vertically(y, xs[0], center_strip, "down"):
-                top_pixel = y
-                break
-        if top_pixel is not None: break
+
+    if (mode or SEGMENTATION_MODE) == "components":
+        # Plant blob(s) of the whole frame; the mask holds only the selected blobs
+        plant = segment_plant(green_mask)
+        return plant["green_ratio"], plant["plant_mask"], plant["top"], plant["bottom"], plant["plant_height"]
+
+    # Detect Top + Bottom (only the first green pixel per row is checked)
+    top_pixel, bottom_pixel = find_plant_extent(
+        center_strip(green_mask),
+        radius=max(1, round(EXTENT_RADIUS * scale)),
+        threshold=EXTENT_THRESHOLD,
+        vertical_check_len=max(1, round(VERTICAL_CHECK_LEN * scale)),
+        vertical_min_ratio=VERTICAL_MIN_RATIO,
+        first_pixel_only=True,
+    )
 
     plant_height = (bottom_pixel - top_pixel if top_pixel is not None and bottom_pixel is not None else None)
     
@@ -112,13 +154,23 @@ if __name__ == "__main__":
     
     print("Capturing...")
     try:
-        img_rgb = capture_frame()
+        img_rgb, img_lores = capture_pair()
     except Exception as e:
         print(f"Error: {e}")
         print("Camera busy. Run 'sudo pkill python' and try again.")
         sys.exit()
-
-    green_ratio, mask, top, bot, height = analyze_plant(img_rgb)
+    finally:
+        close_camera()
+
+    if ANALYSIS_STREAM == "lores":
+        green_ratio, mask, top, bot, height = analyze_plant_yuv(img_lores)
+        # Scale mask and lines back to the main frame for display
+        scale = img_rgb.shape[0] / mask.shape[0]
+        mask = cv2.resize(mask, (img_rgb.shape[1], img_rgb.shape[0]), interpolation=cv2.INTER_NEAREST)
+        top = int(top * scale) if top is not None else None
+        bot = int(bot * scale) if bot is not None else None
+    else:
+        green_ratio, mask, top, bot, height = analyze_plant(img_rgb)
     water_ml = predict_water(SOIL_HUMIDITY, green_ratio)
     v_time = valve_open_time_ml(water_ml)
 
@@ -0,0 +1,186 @@
+# ============================================================
+# green_lut.py
+# Colour lookup table for the green / dark-green classification
+# ============================================================
+#
+# The HSV thresholds (GREEN_LOWER, GREEN_UPPER, DARK_GREEN_MAX_V) are
+# compiled once into a table indexed by the quantized pixel colour.
+# A frame is then mapped straight to a label image in one indexed pass:
+#
+#     0 = background, 1 = green, 2 = dark green
+#
+# bits=8 (default) has one entry per colour and gives exactly the labels
+# of the original cvtColor + inRange masks (16 MB table). With fewer bits
+# an entry covers a cube of colours and gets the label most of them have;
+# the table gets smaller but pixels near the thresholds can flip.
+# Tolerance measured on AI/test_set at 640 px (python green_lut.py),
+# share of pixels whose label differs from the HSV masks:
+#
+#     bits=8: 0%   bits=7: 1.2%   bits=6: 2.5%   bits=5: 5.1%
+#
+# Tables are cached on disk in lut_cache/, keyed by the threshold values.
+# ============================================================
+
+import hashlib
+import json
+import os
+import sys
+
+import cv2
+import numpy as np
+
+BACKGROUND, GREEN, DARK_GREEN = 0, 1, 2
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lut_cache")
+LUT_VERSION = 2  # bump when the table layout changes
+
+
+def hsv_labels(image_bgr, lower, upper, dark_max_v):
+    """Reference labels with the original cvtColor + inRange masks."""
+    hsv = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2HSV)
+    green = cv2.inRange(hsv, lower, upper) > 0
+    dark = green & (hsv[:, :, 2] <= dark_max_v)
+    return green.astype(np.uint8) + dark
+
+
+class GreenLUT:
+    """
+    lower / upper: HSV thresholds for green (as for cv2.inRange)
+    dark_max_v: maximum V (brightness) for dark green
+    bits: bits per colour channel in the table index (5..8, 8 = exact)
+    channel_order: "BGR" when frames are passed to BGR2HSV as they are,
+                   "RGB" when the analysis treats them as RGB (Picamera2 path)
+    """
+
+    def __init__(self, lower, upper, dark_max_v, bits=8, channel_order="BGR", cache_dir=CACHE_DIR):
+        if not 5 <= bits <= 8:
+            raise ValueError("bits must be between 5 and 8")
+        if sys.byteorder != "little":
+            raise RuntimeError("GreenLUT expects a little-endian CPU (x86 / ARM)")
+        self.lower = np.asarray(lower)
+        self.upper = np.asarray(upper)
+        self.dark_max_v = int(dark_max_v)
+        self.bits = bits
+        self.shift = 8 - bits
+        self.channel_order = channel_order
+        self.cache_dir = cache_dir
+        self.table = self._load_or_build()
+
+        # Buffers for classify(), allocated on first use per frame size
+        self._pixels = None
+        self._quantized = None
+        self._index = None
+
+    # --------------------------------------------------------
+    # TABLE
+    # --------------------------------------------------------
+    def cache_key(self):
+        params = {
+            "lower": self.lower.tolist(),
+            "upper": self.upper.tolist(),
+            "dark_max_v": self.dark_max_v,
+            "bits": self.bits,
+            "channel_order": self.channel_order,
+            "version": LUT_VERSION,
+        }
+        return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+    def _load_or_build(self):
+        path = os.path.join(self.cache_dir, f"green_lut_{self.cache_key()}.npy")
+        if os.path.exists(path):
+            return np.load(path)
+
+        table = self.build()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        np.save(path, table)
+        return table
+
+    def build(self):
+        """Label of every quantized colour: majority label over the colours in its cube."""
+        # All 2^24 colours as one image; index = c2 << 16 | c1 << 8 | c0 (frame channel order),
+        # the same value as the first three bytes of a pixel read as little-endian uint32
+        colours = np.arange(1 << 24, dtype=np.uint32).reshape(4096, 4096)
+        image = np.empty((4096, 4096, 3), dtype=np.uint8)
+        image[:, :, 0] = colours & 0xFF
+        image[:, :, 1] = (colours >> 8) & 0xFF
+        image[:, :, 2] = colours >> 16
+        if self.channel_order == "RGB":
+            image = image[:, :, ::-1]
+        labels = hsv_labels(np.ascontiguousarray(image), self.lower, self.upper, self.dark_max_v).reshape(-1)
+
+        if self.bits == 8:
+            return labels
+
+        # Count the labels per cube of (2^shift)^3 colours and take the most common one
+        n, q = 1 << self.bits, 1 << self.shift
+        cubes = labels.reshape(n, q, n, q, n, q)
+        counts = np.stack([(cubes == label).sum(axis=(1, 3, 5), dtype=np.int32) for label in (0, 1, 2)])
+        return np.argmax(counts, axis=0).astype(np.uint8).reshape(-1)
+
+    # --------------------------------------------------------
+    # CLASSIFY
+    # --------------------------------------------------------
+    def classify(self, frame, out=None):
+        """Label image (uint8, same height/width as frame) in one table lookup per pixel."""
+        h, w = frame.shape[:2]
+        if self._index is None or self._index.shape != (h, w):
+            self._pixels = np.empty((h, w, 4), dtype=np.uint8)
+            self._quantized = np.empty((h, w, 3), dtype=np.uint8)
+            self._index = np.empty((h, w), dtype=np.uint32)
+        if out is None:
+            out = np.empty((h, w), dtype=np.uint8)
+
+        index = self._index
+        if self.bits == 8:
+            # Pad every pixel to 4 bytes and read it as one uint32: the colour index
+            cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA, dst=self._pixels)
+            np.bitwise_and(self._pixels.view(np.uint32)[:, :, 0], 0xFFFFFF, out=index)
+        else:
+            q, b = self._quantized, self.bits
+            np.right_shift(frame, self.shift, out=q)
+            np.left_shift(q[:, :, 2], 2 * b, out=index, dtype=np.uint32)
+            index |= q[:, :, 1].astype(np.uint32) << b
+            index |= q[:, :, 0]
+        return np.take(self.table, index, out=out)
+
+
+if __name__ == "__main__":
+    import time
+    from glob import glob
+
+    # Agreement with the HSV masks of Green_plant_test.py on the test set
+    GREEN_LOWER = np.array([21, 26, 26])
+    GREEN_UPPER = np.array([95, 255, 255])
+    DARK_GREEN_MAX_V = 100
+
+    frames = []
+    for img_path in sorted(glob(os.path.join("test_set", "*/*"))):
+        image_bgr = cv2.imread(img_path)
+        if image_bgr is not None:
+            h, w = image_bgr.shape[:2]
+            frames.append(cv2.resize(image_bgr, (w * 640 // max(h, w), h * 640 // max(h, w)),
+                                     interpolation=cv2.INTER_AREA))
+
+    t0 = time.perf_counter()
+    references = [hsv_labels(f, GREEN_LOWER, GREEN_UPPER, DARK_GREEN_MAX_V) for f in frames]
+    t_hsv = (time.perf_counter() - t0) / len(frames)
+    total = sum(r.size for r in references)
+    print(f"Frames: {len(frames)} | HSV masks: {t_hsv * 1000:.2f} ms/frame")
+
+    for bits in (5, 6, 7, 8):
+        t0 = time.perf_counter()
+        lut = GreenLUT(GREEN_LOWER, GREEN_UPPER, DARK_GREEN_MAX_V, bits=bits)
+        t_build = time.perf_counter() - t0
+
+        labels = np.empty_like(references[0])
+        differing = 0
+        t_lut = 0.0
+        for frame, reference in zip(frames, references):
+            if labels.shape != reference.shape:
+                labels = np.empty_like(reference)
+            t0 = time.perf_counter()
+            lut.classify(frame, out=labels)
+            t_lut += (time.perf_counter() - t0) / len(frames)
+            differing += np.count_nonzero(labels != reference)
+
+        print(f"bits={bits}: table {lut.table.nbytes / 1024:.0f} kB (load/build {t_build:.2f} s) | "
+              f"{t_lut * 1000:.2f} ms/frame | pixels differing: {100 * differing / total:.3f}%")
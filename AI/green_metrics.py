@@ -0,0 +1,175 @@
+# ============================================================
+# green_metrics.py
+# Plant health metrics without intermediate mask copies
+# ============================================================
+#
+# Computes green_ratio, dark_green_ratio and the mean green saturation of
+# Green_plant_test.py, restricted to the [top, bottom] row band of the
+# plant, without the green_mask / dark_green_mask / restricted_*_mask
+# copies and boolean-index temporaries of the original. All full-frame
+# results are written into MetricsBuffers that the caller allocates once,
+# so a continuous capture loop does not allocate per frame (only the small
+# center-strip temporaries of the extent search remain).
+#
+# Dark green (green and V <= DARK_GREEN_MAX_V) is one inRange with the V
+# upper bound lowered, written only for the rows of the band.
+#
+# Compare time and peak memory with the original code on the test set:
+#     python green_metrics.py
+# ============================================================
+
+import cv2
+import numpy as np
+
+from plant_extent import find_plant_extent, center_strip
+
+
+class MetricsBuffers:
+    """Preallocated full-frame buffers for one frame size (height, width)."""
+
+    def __init__(self, shape):
+        h, w = shape[:2]
+        self.shape = (h, w)
+        self.hsv = np.empty((h, w, 3), dtype=np.uint8)
+        self.green = np.empty((h, w), dtype=np.uint8)
+        self.dark_green = np.empty((h, w), dtype=np.uint8)
+
+    def fits(self, image):
+        return image.shape[:2] == self.shape
+
+
+def band_metrics(hsv, green_mask, top_pixel, bottom_pixel, lower, upper, dark_max_v, dark_out):
+    """
+    Metrics of the green pixels in rows [top_pixel, bottom_pixel] (all rows when the extent is unknown).
+    Percentages are relative to the whole frame, as in Green_plant_test.py.
+    dark_out: (h, w) uint8 buffer, only the band rows are written
+    Returns (green_ratio, dark_green_ratio, mean_green_saturation).
+    """
+    h, w = green_mask.shape
+    if top_pixel is not None and bottom_pixel is not None:
+        band = slice(top_pixel, bottom_pixel + 1)
+    else:
+        band = slice(0, h)
+
+    # Full-width row slices are contiguous views, no copies
+    green_band = green_mask[band]
+    hsv_band = hsv[band]
+    green_pixels = cv2.countNonZero(green_band)
+    if green_pixels == 0:
+        return 0.0, 0.0, 0
+
+    dark_upper = np.array([upper[0], upper[1], min(upper[2], dark_max_v)])
+    dark_band = cv2.inRange(hsv_band, lower, dark_upper, dst=dark_out[band])
+    dark_green_pixels = cv2.countNonZero(dark_band)
+
+    # cv2.mean works in one pass without a boolean-index copy; the sum of S is an integer,
+    # so rounding recovers it exactly and the division gives the same value as np.mean
+    saturation_sum = round(cv2.mean(hsv_band, mask=green_band)[1] * green_pixels)
+    mean_green_saturation = saturation_sum / green_pixels
+
+    total_pixels = h * w
+    return (
+        green_pixels / total_pixels * 100,
+        dark_green_pixels / total_pixels * 100,
+        mean_green_saturation,
+    )
+
+
+def compute_plant_metrics(image_bgr, buffers, lower, upper, dark_max_v,
+                          radius=3, threshold=0.75, vertical_check_len=10, vertical_min_ratio=0.6, hsv=None):
+    """
+    HSV conversion, green mask, plant extent and band metrics for one BGR frame,
+    using only the preallocated buffers (MetricsBuffers of the frame size).
+    hsv: precomputed HSV planes of the frame (e.g. from image_cache.py), skips the conversion
+    Returns (green_ratio, dark_green_ratio, mean_green_saturation, top_pixel, bottom_pixel, plant_height).
+    """
+    if hsv is None:
+        hsv = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2HSV, dst=buffers.hsv)
+    cv2.inRange(hsv, lower, upper, dst=buffers.green)
+
+    top_pixel, bottom_pixel = find_plant_extent(
+        center_strip(buffers.green),
+        radius=radius,
+        threshold=threshold,
+        vertical_check_len=vertical_check_len,
+        vertical_min_ratio=vertical_min_ratio,
+    )
+    plant_height = (bottom_pixel - top_pixel) if top_pixel is not None and bottom_pixel is not None else None
+
+    green_ratio, dark_green_ratio, mean_green_saturation = band_metrics(
+        hsv, buffers.green, top_pixel, bottom_pixel, lower, upper, dark_max_v, buffers.dark_green
+    )
+    return green_ratio, dark_green_ratio, mean_green_saturation, top_pixel, bottom_pixel, plant_height
+
+
+# ------------------------------------------------------------
+# BEFORE / AFTER MEASUREMENT
+# ------------------------------------------------------------
+def original_metrics(image_bgr, lower, upper, dark_max_v):
+    """The mask-copy version from Green_plant_test.py, for comparison."""
+    hsv = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2HSV)
+    green_mask = cv2.inRange(hsv, lower, upper)
+    dark_green_mask = green_mask.copy()
+    dark_green_mask[hsv[:, :, 2] > dark_max_v] = 0
+
+    top_pixel, bottom_pixel = find_plant_extent(center_strip(green_mask))
+    plant_height = (bottom_pixel - top_pixel) if top_pixel is not None and bottom_pixel is not None else None
+
+    restricted_green_mask = green_mask.copy()
+    if top_pixel is not None and bottom_pixel is not None:
+        restricted_green_mask[:top_pixel, :] = 0
+        restricted_green_mask[bottom_pixel + 1:, :] = 0
+    restricted_dark_green_mask = dark_green_mask.copy()
+    restricted_dark_green_mask[restricted_green_mask == 0] = 0
+
+    total_pixels = image_bgr.shape[0] * image_bgr.shape[1]
+    green_pixels = np.count_nonzero(restricted_green_mask)
+    dark_green_pixels = np.count_nonzero(restricted_dark_green_mask)
+    green_ratio = (green_pixels / total_pixels) * 100
+    dark_green_ratio = (dark_green_pixels / total_pixels) * 100
+    mean_green_saturation = np.mean(hsv[:, :, 1][restricted_green_mask > 0]) if green_pixels > 0 else 0
+    return green_ratio, dark_green_ratio, mean_green_saturation, top_pixel, bottom_pixel, plant_height
+
+
+if __name__ == "__main__":
+    import os
+    import time
+    import tracemalloc
+    from glob import glob
+
+    GREEN_LOWER = np.array([21, 26, 26])
+    GREEN_UPPER = np.array([95, 255, 255])
+    DARK_GREEN_MAX_V = 100
+
+    frames = [f for f in (cv2.imread(p) for p in sorted(glob(os.path.join("test_set", "*/*")))) if f is not None]
+    buffers = None
+    stats = {"original": [0.0, 0], "kernel": [0.0, 0]}
+    mismatches = 0
+
+    for frame in frames:
+        if buffers is None or not buffers.fits(frame):
+            buffers = MetricsBuffers(frame.shape)
+
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        before = original_metrics(frame, GREEN_LOWER, GREEN_UPPER, DARK_GREEN_MAX_V)
+        stats["original"][0] += time.perf_counter() - t0
+        stats["original"][1] = max(stats["original"][1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        after = compute_plant_metrics(frame, buffers, GREEN_LOWER, GREEN_UPPER, DARK_GREEN_MAX_V)
+        stats["kernel"][0] += time.perf_counter() - t0
+        stats["kernel"][1] = max(stats["kernel"][1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+        if tuple(before) != tuple(after):
+            mismatches += 1
+            print(f"MISMATCH: {before} vs {after}")
+
+    h, w = frames[0].shape[:2]
+    print(f"Frames: {len(frames)} ({w}x{h}) | results differing: {mismatches}")
+    for name, (seconds, peak) in stats.items():
+        print(f"{name:8s}: {seconds / len(frames) * 1000:6.2f} ms/frame | "
+              f"peak allocated per frame: {peak / 1e6:6.2f} MB")
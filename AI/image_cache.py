@@ -0,0 +1,239 @@
+# ============================================================
+# image_cache.py
+# Dataset manifest + memory-mapped cache of decoded frames
+# ============================================================
+#
+# The manifest lists every image of a dataset folder (class subfolders,
+# as test_set/): path, class, file size, mtime and a SHA-1 of the file
+# content. A file is only re-hashed when its size or mtime changed.
+#
+# ImageCache stores the decoded BGR frame (cv2.imread, so with the same
+# EXIF rotation as Green_plant_test.py) and its HSV planes as .npy files
+# named after the content hash. They are opened with np.load(mmap_mode="r"):
+# a sweep reads the pixels straight from the page cache instead of
+# decoding every JPEG again. A changed image gets a new hash and so new
+# cache files; prune() removes the files of hashes that are in none of
+# the manifests (all datasets share one frame folder).
+#
+# Full-resolution test_set (160 x 2048x1536) takes about 3 GB of cache,
+# long_side=640 about 300 MB.
+#
+# Sweep time with and without cache (green metrics over the whole set):
+#     python image_cache.py
+# ============================================================
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# cv2 is imported where frames are decoded: the manifest functions are also used by the
+# training scripts, which should not pay for importing OpenCV
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "image_cache")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def file_hash(path, chunk_size=1 << 20):
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def build_manifest(folder, previous=None, prefix=""):
+    """
+    Manifest entries (dicts with path, class_name, size, mtime, hash) for all
+    images in the class subfolders of folder, sorted by class and file name.
+    previous: older manifest entries; their hash is reused when size and mtime are unchanged.
+    prefix: only class subfolders whose name starts with it (e.g. "plant_")
+    """
+    known = {entry["path"]: entry for entry in previous or []}
+    entries = []
+    class_names = [d for d in os.listdir(folder) if d.startswith(prefix) and os.path.isdir(os.path.join(folder, d))]
+    for class_name in sorted(class_names):
+        class_dir = os.path.join(folder, class_name)
+        for file_name in sorted(os.listdir(class_dir)):
+            if not file_name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(class_dir, file_name)
+            stat = os.stat(path)
+            old = known.get(path)
+            if old is not None and old["size"] == stat.st_size and old["mtime"] == stat.st_mtime:
+                digest = old["hash"]
+            else:
+                digest = file_hash(path)
+            entries.append({
+                "path": path,
+                "class_name": class_name,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "hash": digest,
+            })
+    return entries
+
+
+def manifest_path(folder, cache_dir=CACHE_DIR, prefix=""):
+    key = os.path.abspath(folder) + (f"::{prefix}" if prefix else "")
+    return os.path.join(cache_dir, f"manifest_{hashlib.sha1(key.encode()).hexdigest()[:12]}.json")
+
+
+def load_manifest(folder, cache_dir=CACHE_DIR, prefix=""):
+    """Up-to-date manifest of folder; the saved one is reused for unchanged files and rewritten when needed."""
+    path = manifest_path(folder, cache_dir, prefix)
+    previous = None
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            previous = json.load(f)
+    entries = build_manifest(folder, previous, prefix)
+    if entries != previous:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, indent=1)
+    return entries
+
+
+class ImageCache:
+    """
+    folder: dataset folder with one subfolder per class
+    long_side: resize frames so the long side has this many pixels (INTER_AREA), None = as decoded
+    hsv: also cache the HSV planes (cv2.COLOR_BGR2HSV of the cached frame)
+    """
+
+    def __init__(self, folder, long_side=None, hsv=True, cache_dir=CACHE_DIR):
+        if not os.path.isdir(folder):
+            raise FileNotFoundError(f"Dataset folder not found: {os.path.abspath(folder)}")
+        self.folder = folder
+        self.long_side = long_side
+        self.hsv = hsv
+        self.cache_dir = cache_dir
+        self.frame_dir = os.path.join(cache_dir, "frames")
+        os.makedirs(self.frame_dir, exist_ok=True)
+        self.refresh()
+
+    # --------------------------------------------------------
+    # MANIFEST
+    # --------------------------------------------------------
+    def refresh(self):
+        """Re-read the folder (re-hashing only changed files)."""
+        self.entries = load_manifest(self.folder, self.cache_dir)
+        self.by_path = {entry["path"]: entry for entry in self.entries}
+        return self.entries
+
+    def paths(self):
+        return [entry["path"] for entry in self.entries]
+
+    # --------------------------------------------------------
+    # FRAMES
+    # --------------------------------------------------------
+    def _file(self, entry, plane):
+        size = f"{self.long_side}px" if self.long_side else "full"
+        return os.path.join(self.frame_dir, f"{entry['hash'][:20]}_{size}_{plane}.npy")
+
+    def _decode(self, entry):
+        import cv2
+
+        image_bgr = cv2.imread(entry["path"])
+        if image_bgr is None:
+            return None
+        if self.long_side:
+            h, w = image_bgr.shape[:2]
+            scale = self.long_side / max(h, w)
+            image_bgr = cv2.resize(image_bgr, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+        return image_bgr
+
+    def _store(self, path, array):
+        # Write to a temporary file first, so an interrupted build never leaves a truncated .npy
+        tmp_path = path + ".tmp.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """
+        (image_bgr, hsv) of an image as read-only memory maps, decoded and cached on first use.
+        hsv is None when the cache was made with hsv=False. Returns None for unreadable images.
+        """
+        entry = self.by_path.get(path)
+        if entry is None:
+            raise KeyError(f"{path} is not in the manifest of {self.folder}")
+
+        bgr_file, hsv_file = self._file(entry, "bgr"), self._file(entry, "hsv")
+        if not os.path.exists(bgr_file) or (self.hsv and not os.path.exists(hsv_file)):
+            image_bgr = self._decode(entry)
+            if image_bgr is None:
+                return None
+            self._store(bgr_file, image_bgr)
+            if self.hsv:
+                import cv2
+
+                self._store(hsv_file, cv2.cvtColor(image_bgr, cv2.COLOR_BGR2HSV))
+
+        image_bgr = np.load(bgr_file, mmap_mode="r")
+        hsv = np.load(hsv_file, mmap_mode="r") if self.hsv else None
+        return image_bgr, hsv
+
+    def build(self):
+        """Decode every image that is not cached yet; returns the number of cached images."""
+        return sum(self.load(path) is not None for path in self.paths())
+
+    def prune(self):
+        """Remove cache files of hashes that are in none of the saved manifests."""
+        # frame_dir is shared by every dataset in cache_dir (test_set, augmented_dataset, ...),
+        # so the frames to keep come from all their manifests, not only this folder's
+        keep = {entry["hash"][:20] for entry in self.entries}
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.startswith("manifest_") and file_name.endswith(".json"):
+                with open(os.path.join(self.cache_dir, file_name), encoding="utf-8") as f:
+                    keep.update(entry["hash"][:20] for entry in json.load(f))
+        removed = 0
+        for file_name in os.listdir(self.frame_dir):
+            if file_name.split("_", 1)[0] not in keep:
+                os.remove(os.path.join(self.frame_dir, file_name))
+                removed += 1
+        return removed
+
+
+# ------------------------------------------------------------
+# SWEEP TIME: DECODE VS CACHE
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    import time
+
+    import cv2
+
+    from green_metrics import MetricsBuffers, compute_plant_metrics
+
+    GREEN_LOWER = np.array([21, 26, 26])
+    GREEN_UPPER = np.array([95, 255, 255])
+    DARK_GREEN_MAX_V = 100
+
+    t0 = time.perf_counter()
+    cache = ImageCache("test_set")
+    print(f"Manifest: {len(cache.entries)} images ({time.perf_counter() - t0:.2f} s)")
+
+    t0 = time.perf_counter()
+    cache.build()
+    print(f"Cache build (only missing frames): {time.perf_counter() - t0:.2f} s")
+
+    def sweep(use_cache):
+        buffers = None
+        results = []
+        t0 = time.perf_counter()
+        for path in cache.paths():
+            if use_cache:
+                image_bgr, hsv = cache.load(path)
+            else:
+                image_bgr, hsv = cv2.imread(path), None
+            if buffers is None or not buffers.fits(image_bgr):
+                buffers = MetricsBuffers(image_bgr.shape)
+            results.append(compute_plant_metrics(image_bgr, buffers, GREEN_LOWER, GREEN_UPPER, DARK_GREEN_MAX_V, hsv=hsv))
+        return results, time.perf_counter() - t0
+
+    decoded, t_decode = sweep(use_cache=False)
+    cached, t_cache = sweep(use_cache=True)
+    n = len(decoded)
+    print(f"Sweep with decoding: {t_decode:.2f} s ({t_decode / n * 1000:.1f} ms/image)")
+    print(f"Sweep from cache   : {t_cache:.2f} s ({t_cache / n * 1000:.1f} ms/image)")
+    print(f"Results identical: {decoded == cached}")
@@ -0,0 +1,231 @@
+# ============================================================
+# inference_client.py
+# Client for the resident inference daemon (inference_daemon.py)
+# ============================================================
+#
+# The daemon keeps the plant classifier and the HSV analyzer loaded, so
+# a robot script only pays the round trip per frame instead of importing
+# torch and loading the model at startup. This module is all a client
+# needs: it imports only numpy and the standard library.
+#
+#     with InferenceClient() as client:
+#         result = client.analyze(frame)             # RGB888 main frame
+#         result = client.analyze(lores, "yuv420")   # I420 lores frame
+#         result["label"], result["confidence"], result["green_ratio"]
+#
+# Frames go over a Unix domain socket, or with shared_memory=True through
+# a shared memory block that the client creates once (only a small header
+# goes over the socket then).
+#
+# Wire format, both directions: two big-endian uint32 (header length,
+# payload length), a JSON header and the raw payload bytes (the frame).
+#
+# Latency benchmark, starts its own daemon without a camera:
+#     python inference_client.py --start [--no-model] [--source synthetic|<folder>]
+# ============================================================
+
+import json
+import os
+import socket
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+DEFAULT_SOCKET = os.environ.get("LEAFY_INFERENCE_SOCKET", "/tmp/leafy_inference.sock")
+FORMATS = ("rgb888", "yuv420")
+PREFIX = struct.Struct("!II")
+
+
+class InferenceError(RuntimeError):
+    """The daemon could not handle a request."""
+
+
+# ------------------------------------------------------------
+# PROTOCOL
+# ------------------------------------------------------------
+def send_message(sock, header, payload=None):
+    data = json.dumps(header).encode()
+    sock.sendall(PREFIX.pack(len(data), 0 if payload is None else payload.nbytes) + data)
+    if payload is not None:
+        sock.sendall(payload)  # memoryview of the frame, no copy
+
+
+def recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if not n:
+            raise ConnectionError("connection closed")
+        received += n
+    return buffer
+
+
+def recv_message(sock):
+    """(header dict, payload bytearray or None); ConnectionError when the peer hung up."""
+    header_length, payload_length = PREFIX.unpack(recv_exact(sock, PREFIX.size))
+    header = json.loads(recv_exact(sock, header_length))
+    payload = recv_exact(sock, payload_length) if payload_length else None
+    return header, payload
+
+
+def attach_shared_memory(name):
+    """Open a block created by another process without taking over its cleanup."""
+    block = shared_memory.SharedMemory(name=name)
+    # Python < 3.13 registers attached blocks too and would unlink them when this process exits
+    resource_tracker.unregister(block._name, "shared_memory")
+    return block
+
+
+# ------------------------------------------------------------
+# CLIENT
+# ------------------------------------------------------------
+class InferenceClient:
+    """
+    socket_path: Unix socket of the daemon (LEAFY_INFERENCE_SOCKET, default /tmp/leafy_inference.sock)
+    shared_memory: pass frames through a shared memory block instead of the socket
+    timeout: seconds to wait for a reply
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, shared_memory=False, timeout=5.0):
+        self.socket_path = socket_path
+        self.use_shared_memory = shared_memory
+        self.block = None
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(socket_path)
+
+    def request(self, header, payload=None):
+        send_message(self.sock, header, payload)
+        reply, _ = recv_message(self.sock)
+        if not reply.get("ok"):
+            raise InferenceError(reply.get("error", "unknown error"))
+        return reply
+
+    def ping(self):
+        """Daemon info: model backend, class names, uptime."""
+        return self.request({"op": "ping"})
+
+    def stats(self):
+        """Requests handled and mean time per request inside the daemon."""
+        return self.request({"op": "stats"})
+
+    def analyze(self, frame, fmt="rgb888", classify=True):
+        """
+        frame: uint8 array as delivered by camera_service.py
+               "rgb888": main frame (H x W x 3), "yuv420": lores frame (H * 3 / 2 x W)
+        classify: also run the plant classifier (needs a daemon with a model)
+        Returns dict with label, index, confidence, green_ratio, top, bottom, plant_height,
+        scale (frame width / 640) and the daemon's timings in ms.
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"fmt must be one of {FORMATS}")
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        header = {"op": "analyze", "format": fmt, "shape": frame.shape, "classify": classify}
+
+        if not self.use_shared_memory:
+            return self.request(header, memoryview(frame).cast("B"))
+
+        if self.block is None or self.block.size < frame.nbytes:
+            self._release_block()
+            self.block = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+        self.block.buf[:frame.nbytes] = memoryview(frame).cast("B")
+        header["shm"] = self.block.name
+        return self.request(header)
+
+    def _release_block(self):
+        if self.block is not None:
+            self.block.close()
+            self.block.unlink()
+            self.block = None
+
+    def close(self):
+        self.sock.close()
+        self._release_block()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def wait_for_daemon(socket_path=DEFAULT_SOCKET, timeout=60.0, process=None):
+    """Connect as soon as the daemon answers a ping; returns (client, seconds waited)."""
+    start = time.perf_counter()
+    while True:
+        try:
+            client = InferenceClient(socket_path)
+            client.ping()
+            return client, time.perf_counter() - start
+        except (FileNotFoundError, ConnectionRefusedError):
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"daemon exited with code {process.returncode}")
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(f"no daemon on {socket_path} after {timeout:.0f} s")
+            time.sleep(0.05)
+
+
+# ------------------------------------------------------------
+# LATENCY BENCHMARK
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    import argparse
+    import subprocess
+    import sys
+
+    parser = argparse.ArgumentParser(description="Round-trip latency of the inference daemon")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    parser.add_argument("--start", action="store_true", help="start a daemon for the benchmark and stop it after")
+    parser.add_argument("--no-model", action="store_true", help="started daemon runs only the HSV analysis")
+    parser.add_argument("--source", default="synthetic", help="camera_service source: synthetic or an image folder")
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+
+    process = None
+    if args.start:
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "inference_daemon.py"),
+                   "--socket", args.socket] + (["--no-model"] if args.no_model else [])
+        process = subprocess.Popen(command)
+    try:
+        client, startup = wait_for_daemon(args.socket, process=process)
+        info = client.ping()
+        client.close()
+        if process is not None:
+            print(f"Daemon start-up (process start until first reply): {startup * 1000:.0f} ms")
+        print(f"Daemon model: {info['backend'] or 'none'}")
+
+        from camera_service import open_camera
+
+        camera = open_camera(args.source)
+        pairs = [camera.capture_pair() for _ in range(min(args.frames, 20))]
+        classify = info["backend"] is not None
+
+        def round_trips(client, fmt):
+            times, inside = [], []
+            for i in range(args.frames):
+                frame = pairs[i % len(pairs)][0 if fmt == "rgb888" else 1]
+                start = time.perf_counter()
+                result = client.analyze(frame, fmt, classify=classify)
+                times.append(time.perf_counter() - start)
+                inside.append(result["timings"]["total_ms"])
+            return np.array(times) * 1000, np.median(inside), result
+
+        print(f"\n{args.frames} frames per row, times in ms")
+        print(f"{'transport':14s} {'stream':8s} {'p50':>7s} {'p90':>7s} {'p99':>7s} {'in daemon':>10s} {'overhead':>9s}  (p50)")
+        for transport in ("socket", "shared_memory"):
+            for fmt in FORMATS:
+                with InferenceClient(args.socket, shared_memory=transport == "shared_memory") as client:
+                    round_trips(client, fmt)  # warm-up
+                    times, inside, result = round_trips(client, fmt)
+                p50, p90, p99 = np.percentile(times, [50, 90, 99])
+                print(f"{transport:14s} {fmt:8s} {p50:7.2f} {p90:7.2f} {p99:7.2f} {inside:10.2f} {p50 - inside:9.2f}")
+
+        print(f"\nLast result: {json.dumps({k: v for k, v in result.items() if k != 'timings'})}")
+    finally:
+        if process is not None:
+            process.terminate()  # SIGTERM: the daemon stops serving and removes its socket
+            process.wait(timeout=10)
@@ -0,0 +1,256 @@
+# ============================================================
+# inference_daemon.py
+# Resident inference service: classifier + HSV analyzer kept warm
+# ============================================================
+#
+# Loads the plant classifier (plant_classifier.py, fastest exported
+# model) and the green analysis of green_camera.py once, runs a warm-up
+# frame through both and then answers requests on a Unix domain socket.
+# Client side and wire format: inference_client.py.
+#
+#     python inference_daemon.py                 # classifier + greenery
+#     python inference_daemon.py --no-model      # greenery only (no torch / onnxruntime)
+#     python inference_daemon.py --backend knn   # k-NN embedding index, knows enrolled species
+#
+# Without an exported model or plant_model.pth the daemon also starts
+# without a model and says so in the ping reply (backend None).
+#
+# Per "analyze" request the frame is converted to RGB once; the
+# classifier and the green analysis both use that conversion. Requests
+# from several clients are handled one at a time (one model instance).
+#
+# The daemon refuses to start when another daemon still answers on the
+# socket (a stale socket file of a crashed daemon is removed). Clients
+# cannot stop it: it stops on SIGTERM (systemd, kill) or Ctrl+C.
+# ============================================================
+
+import argparse
+import os
+import signal
+import socket
+import socketserver
+import stat
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import green_camera
+from camera_service import SyntheticCameraService, to_lores
+from inference_client import DEFAULT_SOCKET, attach_shared_memory, recv_message, send_message
+
+
+class InferenceEngine:
+    """
+    use_model: load the plant classifier; without it only the greenery metrics are returned
+    backend / num_threads / export_dir / model_path: passed to PlantClassifier
+    """
+
+    def __init__(self, use_model=True, backend=None, num_threads=None, export_dir=None, model_path=None):
+        self.classifier = None
+        self.model_error = None
+        if use_model:
+            from plant_classifier import EXPORT_DIR, MODEL_PATH, PlantClassifier
+
+            try:
+                self.classifier = PlantClassifier(export_dir or EXPORT_DIR, model_path or MODEL_PATH,
+                                                  backend=backend, num_threads=num_threads)
+            except (OSError, ImportError) as e:
+                self.model_error = f"{type(e).__name__}: {e}"
+                print(f"No classifier, greenery only ({self.model_error})")
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def backend(self):
+        return self.classifier.backend_name if self.classifier is not None else None
+
+    def warm_up(self):
+        # First call of every path allocates buffers / builds kernels; do it before the first client
+        frame = SyntheticCameraService(noise=0)._grab()
+        self.analyze(frame, "rgb888")
+        self.analyze(to_lores(frame), "yuv420")
+        self.requests = 0
+        self.busy_seconds = 0.0
+
+    def analyze(self, frame, fmt, classify=True):
+        start = time.perf_counter()
+        # One conversion to real RGB for both consumers. green_camera treats this the same as
+        # analyze_plant() treats an RGB888 main frame and analyze_plant_yuv() a lores frame.
+        if fmt == "yuv420":
+            image_rgb = cv2.cvtColor(frame, cv2.COLOR_YUV2RGB_I420)
+        elif fmt == "rgb888":
+            image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)  # RGB888 is [B, G, R] in memory
+        else:
+            raise ValueError(f"unknown format {fmt!r}")
+        converted = time.perf_counter()
+
+        scale = image_rgb.shape[1] / 640
+        green_ratio, _, top, bottom, plant_height = green_camera.analyze_plant_bgr(image_rgb, scale)
+        analyzed = time.perf_counter()
+
+        result = {
+            "ok": True,
+            "label": None,
+            "index": None,
+            "confidence": None,
+            "green_ratio": green_ratio,
+            "top": top,
+            "bottom": bottom,
+            "plant_height": plant_height,
+            "scale": scale,
+        }
+        if classify and self.classifier is not None:
+            from plant_classifier import preprocess
+
+            logits = self.classifier.logits(preprocess(image_rgb)[None])[0].astype(np.float64)
+            probabilities = np.exp(logits - logits.max())
+            probabilities /= probabilities.sum()
+            index = int(probabilities.argmax())
+            result.update(label=self.classifier.class_names[index], index=index,
+                          confidence=float(probabilities[index]))
+        done = time.perf_counter()
+
+        result["timings"] = {
+            "convert_ms": (converted - start) * 1000,
+            "green_ms": (analyzed - converted) * 1000,
+            "classify_ms": (done - analyzed) * 1000,
+            "total_ms": (done - start) * 1000,
+        }
+        return result
+
+    def handle(self, header, payload, attached):
+        """Reply dict for one request. attached: shared memory blocks of this connection, by name."""
+        op = header.get("op")
+        if op == "ping":
+            return {
+                "ok": True,
+                "backend": self.backend,
+                "classes": self.classifier.class_names if self.classifier is not None else [],
+                "model_error": self.model_error,
+                "uptime_s": time.time() - self.started,
+                "pid": os.getpid(),
+            }
+        if op == "stats":
+            return {
+                "ok": True,
+                "requests": self.requests,
+                "mean_ms": self.busy_seconds / self.requests * 1000 if self.requests else None,
+            }
+        if op != "analyze":
+            return {"ok": False, "error": f"unknown op {op!r}"}
+
+        shape = tuple(header["shape"])
+        size = int(np.prod(shape))
+        if "shm" in header:
+            name = header["shm"]
+            if name not in attached:
+                attached[name] = attach_shared_memory(name)
+            buffer = attached[name].buf
+        else:
+            buffer = payload
+        if buffer is None or len(buffer) < size:
+            return {"ok": False, "error": f"frame data smaller than shape {shape}"}
+
+        frame = np.frombuffer(buffer, dtype=np.uint8, count=size).reshape(shape)
+        with self.lock:
+            start = time.perf_counter()
+            result = self.analyze(frame, header.get("format", "rgb888"), header.get("classify", True))
+            self.busy_seconds += time.perf_counter() - start
+            self.requests += 1
+        return result
+
+
+class InferenceHandler(socketserver.BaseRequestHandler):
+    """One client connection: requests until the client hangs up."""
+
+    def handle(self):
+        attached = {}
+        try:
+            while True:
+                try:
+                    header, payload = recv_message(self.request)
+                except (ConnectionError, OSError):
+                    break
+                try:
+                    reply = self.server.engine.handle(header, payload, attached)
+                except Exception as e:
+                    reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                send_message(self.request, reply)
+        finally:
+            for block in attached.values():
+                block.close()
+
+
+def claim_socket(socket_path):
+    """
+    Make socket_path free to bind: a stale socket file is removed. Raises RuntimeError
+    when a daemon still answers on it, or when the path is not a socket at all.
+    """
+    if not os.path.exists(socket_path):
+        return
+    if not stat.S_ISSOCK(os.stat(socket_path).st_mode):
+        raise RuntimeError(f"{socket_path} exists and is not a socket")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except ConnectionRefusedError:
+        os.remove(socket_path)  # left behind by a daemon that did not shut down cleanly
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"another inference daemon is already running on {socket_path}")
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, engine):
+        claim_socket(socket_path)
+        self.engine = engine
+        self.socket_path = socket_path
+        super().__init__(socket_path, InferenceHandler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resident plant inference service on a Unix socket")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    parser.add_argument("--no-model", action="store_true", help="greenery metrics only, no classifier")
+    parser.add_argument("--backend", default=None, help="plant_classifier backend, knn = embedding index (default: fastest acceptable)")
+    parser.add_argument("--threads", type=int, default=None, help="inference threads of the classifier")
+    parser.add_argument("--export-dir", default=None)
+    parser.add_argument("--model-path", default=None)
+    args = parser.parse_args()
+
+    try:
+        claim_socket(args.socket)  # before loading the model: fail fast when a daemon is running
+    except RuntimeError as e:
+        sys.exit(f"Not starting: {e}")
+
+    start = time.perf_counter()
+    engine = InferenceEngine(not args.no_model, args.backend, args.threads, args.export_dir, args.model_path)
+    engine.warm_up()
+    server = InferenceServer(args.socket, engine)
+    # systemd / kill send SIGTERM: stop serving and remove the socket file
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    print(f"Inference daemon ready on {args.socket} (model: {engine.backend or 'none'}, "
+          f"start-up {time.perf_counter() - start:.2f} s)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
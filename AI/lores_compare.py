@@ -0,0 +1,84 @@
+# ============================================================
+# lores_compare.py
+# Accuracy / latency of the lores analysis vs the full-resolution path
+# ============================================================
+#
+# For every test_set image a 640x480 "main" frame (RGB888 layout) is made,
+# plus the 320x240 YUV420 "lores" frame the ISP would deliver (emulated
+# here with an area resize, the ISP scaler is close but not identical).
+# Both go through green_camera's analysis (the lores extent search uses
+# the pixel lengths scaled by 0.5) and the differences in green
+# ratio and plant extent (in main-frame pixels) are reported, together
+# with the analysis time per frame.
+#
+#     python lores_compare.py
+# ============================================================
+
+import os
+import time
+from glob import glob
+
+import cv2
+import numpy as np
+
+from camera_service import to_lores
+from green_camera import analyze_plant, analyze_plant_yuv
+
+image_folder = "test_set"
+main_long_side = 640  # long side of the main frame (portrait photos stay portrait)
+repeats = 5           # timing repeats per image
+
+
+def timed(function, frame):
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = function(frame)
+        times.append(time.perf_counter() - t0)
+    return result, min(times)
+
+
+if __name__ == "__main__":
+    image_paths = sorted(glob(os.path.join(image_folder, "*/*")))
+    ratio_diff, top_diff, bottom_diff = [], [], []
+    t_main, t_lores = [], []
+    missing = 0
+
+    for img_path in image_paths:
+        image_bgr = cv2.imread(img_path)
+        if image_bgr is None:
+            continue
+        h, w = image_bgr.shape[:2]
+        scale = main_long_side / max(h, w)
+        main = cv2.resize(image_bgr, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+        lores = to_lores(main, (main.shape[1] // 2, main.shape[0] // 2))
+
+        (ratio_m, _, top_m, bot_m, _), tm = timed(analyze_plant, main)
+        (ratio_l, _, top_l, bot_l, _), tl = timed(analyze_plant_yuv, lores)
+        t_main.append(tm)
+        t_lores.append(tl)
+
+        ratio_diff.append(abs(ratio_m - ratio_l))
+        if None in (top_m, bot_m, top_l, bot_l):
+            if (top_m, bot_m) != (top_l, bot_l):
+                missing += 1
+            continue
+        top_diff.append(abs(top_m - 2 * top_l))
+        bottom_diff.append(abs(bot_m - 2 * bot_l))
+
+    n = len(t_main)
+    print(f"Images: {n}")
+    print("\n--- ACCURACY (lores vs main) ---")
+    print(f"Green ratio |diff| (percentage points) - mean: {np.mean(ratio_diff):.3f}, "
+          f"p95: {np.percentile(ratio_diff, 95):.3f}, max: {np.max(ratio_diff):.3f}")
+    if top_diff:
+        print(f"Top pixel |diff| (main px)    - mean: {np.mean(top_diff):.1f}, "
+              f"p95: {np.percentile(top_diff, 95):.1f}, max: {np.max(top_diff)}")
+        print(f"Bottom pixel |diff| (main px) - mean: {np.mean(bottom_diff):.1f}, "
+              f"p95: {np.percentile(bottom_diff, 95):.1f}, max: {np.max(bottom_diff)}")
+    print(f"Extent found in only one of both: {missing}")
+
+    print("\n--- LATENCY (analysis only, best of repeats) ---")
+    print(f"main : median {np.median(t_main) * 1000:.2f} ms")
+    print(f"lores: median {np.median(t_lores) * 1000:.2f} ms")
+    print(f"Speedup: {np.median(t_main) / np.median(t_lores):.1f}x")
@@ -0,0 +1,91 @@
+# ============================================================
+# memmap_store.py
+# Fixed-shape rows in a growable .npy memory map, keyed by file hash
+# ============================================================
+#
+# Used for the per-image caches of the classifier pipeline (ResNet18
+# embeddings, decoded 224x224 images). Rows are looked up by the content
+# hash from the dataset manifest (image_cache.py), so renamed or moved
+# files hit the cache and changed files are computed again.
+#
+# <name>.npy holds the rows, <name>.json the hash -> row index. The
+# index is written after the rows, so an interrupted run at worst
+# recomputes the last batch.
+# ============================================================
+
+import json
+import os
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+
+class MemmapStore:
+    """
+    path: .npy file of the rows
+    row_shape / dtype: shape and type of one row
+    """
+
+    def __init__(self, path, row_shape, dtype=np.float32):
+        self.path = path
+        self.index_path = os.path.splitext(path)[0] + ".json"
+        self.row_shape = tuple(row_shape)
+        self.dtype = np.dtype(dtype)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.index = {}
+        self.array = None
+        if os.path.exists(path) and os.path.exists(self.index_path):
+            array = open_memmap(path, mode="r+")
+            if array.shape[1:] == self.row_shape and array.dtype == self.dtype:
+                self.array = array
+                with open(self.index_path, encoding="utf-8") as f:
+                    self.index = json.load(f)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def missing(self, keys):
+        """Keys without a row, in order and without duplicates."""
+        return list(dict.fromkeys(k for k in keys if k not in self.index))
+
+    def _grow(self, capacity):
+        # A memory map cannot be resized: copy into a bigger file and swap it in
+        tmp_path = self.path + ".tmp.npy"
+        array = open_memmap(tmp_path, mode="w+", dtype=self.dtype, shape=(capacity,) + self.row_shape)
+        if self.array is not None:
+            array[:len(self.index)] = self.array[:len(self.index)]
+        array.flush()
+        del array
+        self.array = None
+        os.replace(tmp_path, self.path)
+        self.array = open_memmap(self.path, mode="r+")
+
+    def put(self, keys, rows):
+        """Store rows (len(keys) x row_shape) under keys (keys must be new)."""
+        count = len(self.index)
+        needed = count + len(keys)
+        if self.array is None or needed > len(self.array):
+            self._grow(max(needed, 2 * count, 64))
+
+        self.array[count:needed] = rows
+        self.array.flush()
+        for i, key in enumerate(keys):
+            self.index[key] = count + i
+        with open(self.index_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f)
+
+    def get(self, keys):
+        """Rows of keys as one array (a copy, in the order of keys)."""
+        if not keys:
+            return np.empty((0,) + self.row_shape, dtype=self.dtype)
+        return self.array[[self.index[k] for k in keys]]
+
+    def row(self, key):
+        """Row of one key as a read-only view into the memory map."""
+        view = self.array[self.index[key]]
+        view.flags.writeable = False
+        return view
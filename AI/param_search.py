@@ -0,0 +1,327 @@
+# ============================================================
+# param_search.py
+# HSV threshold + extent heuristic parameter search
+# ============================================================
+#
+# Step 1, thresholds: the 3-D HSV histogram of every image (90 x 32 x 32
+# bins: H per 2, S and V per 8) is computed once and turned into a 3-D
+# cumulative sum. The number of pixels inside any threshold box is then
+# 8 lookups (inclusion-exclusion), so all threshold combinations of the
+# grid are scored for all images without touching a pixel again. On the
+# grid (H lower even, H upper odd, S/V lower a multiple of 8) the counts
+# are exactly those of cv2.inRange.
+#
+# Step 2, extent heuristic: for the best thresholds, every combination
+# of radius / threshold / vertical_check_len / vertical_min_ratio is run
+# on every image (green_camera's first-pixel extent search at 640 px).
+# Images are spread over a process pool.
+#
+# Scoring. There are no ground-truth masks, so without a reference the
+# score is the Fisher ratio over the plant classes (subfolders): photos
+# of the same plant should give the same green ratio / plant height,
+# different plants may differ. Thresholds whose median green ratio is
+# implausible (almost nothing or almost everything green) are discarded.
+# With reference_csv (columns file_name, green_ratio in % and/or
+# height_fraction = plant height / image height, e.g. checked by hand)
+# the score is minus the mean absolute error against it instead.
+#
+# Colour pipeline. The frames are scored in the HSV the runtime computes
+# (runtime_hsv): the robot's Picamera2 RGB888 frames have the memory
+# layout of cv2.imread, and green_camera.py / Complete_code_including_AI.py
+# convert them with RGB2BGR (lores: YUV2RGB_I420) before BGR2HSV. That
+# swaps R and B, so thresholds tuned on true-BGR HSV would land on other
+# colours on the robot.
+#
+# Output: results_csv (ranked threshold + heuristic combinations),
+# thresholds_csv (ranking of all thresholds) and the entries of
+# params_scripts in params_file (vision_params.py), which those scripts load.
+#
+#     python param_search.py
+# ============================================================
+
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from image_cache import ImageCache
+from plant_extent import find_plant_extent, center_strip
+from vision_params import VISION_PARAMS_FILE, save_vision_params
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+image_folder = "test_set"
+long_side = 640              # frame size of the runtime main stream
+reference_csv = None         # optional: file_name, green_ratio and/or height_fraction
+num_workers = None           # processes for step 2 (None = all CPU cores)
+top_thresholds = 5           # best thresholds of step 1 that go into step 2
+min_difference = 0.5         # ... and their green ratios differ by at least this much (% points) on some image
+plausible_ratio = (1.0, 80.0)  # median green ratio (%) a threshold must give
+
+results_csv = "param_search_results.csv"
+thresholds_csv = "param_search_thresholds.csv"
+params_file = VISION_PARAMS_FILE
+params_scripts = ["green_camera"]  # runtime scripts whose entry is replaced (also: "Complete_code_including_AI")
+
+# Threshold grid (HSV values as for cv2.inRange; S and V upper stay 255)
+H_LOWER = range(16, 52, 2)
+H_UPPER = range(59, 103, 4)
+S_LOWER = range(16, 88, 8)
+V_LOWER = range(16, 88, 8)
+
+# Extent heuristic grid (pixel lengths for a 640 px frame)
+HEURISTIC_GRID = {
+    "radius": [2, 3, 4],
+    "threshold": [0.6, 0.75, 0.9],
+    "vertical_check_len": [6, 10, 14],
+    "vertical_min_ratio": [0.5, 0.6, 0.7],
+}
+
+# Histogram bins
+H_BIN, SV_BIN = 2, 8
+HIST_SIZE = [180 // H_BIN, 256 // SV_BIN, 256 // SV_BIN]
+
+
+# ------------------------------------------------------------
+# STEP 1: THRESHOLDS FROM HISTOGRAMS
+# ------------------------------------------------------------
+def runtime_hsv(image_bgr):
+    """
+    HSV of a decoded image as the runtime computes it from the same pixels on the robot:
+    RGB888 frames are treated as RGB (RGB2BGR, then BGR2HSV), i.e. COLOR_RGB2HSV.
+    """
+    return cv2.cvtColor(image_bgr, cv2.COLOR_RGB2HSV)
+
+
+def hsv_histogram(hsv):
+    """3-D histogram (90, 32, 32) of an HSV frame."""
+    return cv2.calcHist([hsv], [0, 1, 2], None, HIST_SIZE, [0, 180, 0, 256, 0, 256])
+
+
+def cumulative_histogram(hist):
+    """Cumulative sum over H, S and V with a leading zero plane per axis (shape (91, 33, 33))."""
+    cum = np.zeros([n + 1 for n in hist.shape], dtype=np.int64)
+    cum[1:, 1:, 1:] = hist.astype(np.int64).cumsum(0).cumsum(1).cumsum(2)
+    return cum
+
+
+def threshold_grid():
+    """All (lower, upper) combinations of the grid as two (T, 3) arrays."""
+    combos = list(itertools.product(H_LOWER, H_UPPER, S_LOWER, V_LOWER))
+    lower = np.array([(h_lo, s_lo, v_lo) for h_lo, _, s_lo, v_lo in combos])
+    upper = np.array([(h_hi, 255, 255) for _, h_hi, _, _ in combos])
+    return lower, upper
+
+
+def box_counts(cums, lower, upper):
+    """
+    Pixels inside every threshold box for every image.
+    cums: (N, 91, 33, 33) cumulative histograms, lower / upper: (T, 3) HSV thresholds
+    Returns an (N, T) array.
+    """
+    bins = np.array([H_BIN, SV_BIN, SV_BIN])
+    lo = lower // bins              # first bin inside the box
+    hi = upper // bins + 1          # first bin after the box
+    counts = np.zeros((cums.shape[0], len(lower)), dtype=np.int64)
+    for corner in itertools.product((0, 1), repeat=3):
+        index = [hi[:, axis] if take_hi else lo[:, axis] for axis, take_hi in enumerate(corner)]
+        sign = (-1) ** (3 - sum(corner))
+        counts += sign * cums[:, index[0], index[1], index[2]]
+    return counts
+
+
+def fisher_score(values, classes):
+    """
+    Between-class / within-class variance per column.
+    values: (N, T), classes: (N,) integer class indices
+    """
+    n, n_classes = len(classes), classes.max() + 1
+    onehot = np.zeros((n_classes, n))
+    onehot[classes, np.arange(n)] = 1
+    sizes = onehot.sum(axis=1, keepdims=True)
+    class_means = onehot @ values / np.maximum(sizes, 1)
+    overall = values.mean(axis=0)
+
+    between = (sizes * (class_means - overall) ** 2).sum(axis=0) / max(n_classes - 1, 1)
+    within = ((values - class_means[classes]) ** 2).sum(axis=0) / max(n - n_classes, 1)
+    return between / np.maximum(within, 1e-9)
+
+
+def distinct_best(order, ratios, count, min_diff):
+    """The first count thresholds of order whose ratios differ from the ones already picked."""
+    picked = []
+    for t in order:
+        if all(np.abs(ratios[:, t] - ratios[:, p]).max() >= min_diff for p in picked):
+            picked.append(t)
+            if len(picked) == count:
+                break
+    return np.array(picked)
+
+
+def reference_score(values, reference):
+    """Minus the mean absolute error against the reference values (NaN = no reference)."""
+    known = ~np.isnan(reference)
+    return -np.abs(values[known] - reference[known, None]).mean(axis=0)
+
+
+def load_reference(paths, column):
+    """Reference values per image from reference_csv, NaN where missing; None without a reference."""
+    if not reference_csv:
+        return None
+    with open(reference_csv, newline="", encoding="utf-8") as f:
+        rows = {row["file_name"]: row.get(column) for row in csv.DictReader(f)}
+    reference = np.array([float(rows.get(os.path.basename(p)) or "nan") for p in paths])
+    return reference if not np.isnan(reference).all() else None
+
+
+# ------------------------------------------------------------
+# STEP 2: EXTENT HEURISTIC (PROCESS POOL)
+# ------------------------------------------------------------
+worker_cache = None  # ImageCache per worker process
+
+
+def init_worker(folder, size):
+    global worker_cache
+    worker_cache = ImageCache(folder, long_side=size, hsv=False)
+
+
+def extent_heights(task):
+    """
+    Plant height / frame height of one image for every threshold and heuristic
+    combination, NaN where no extent was found. Returns an (thresholds, heuristics) array.
+    """
+    path, thresholds, heuristics = task
+    hsv = runtime_hsv(worker_cache.load(path)[0])
+    heights = np.full((len(thresholds), len(heuristics)), np.nan)
+    mask = np.empty(hsv.shape[:2], dtype=np.uint8)
+
+    for i, (lower, upper) in enumerate(thresholds):
+        cv2.inRange(hsv, np.array(lower), np.array(upper), dst=mask)
+        strip = center_strip(mask)
+        for j, heuristic in enumerate(heuristics):
+            top, bottom = find_plant_extent(strip, first_pixel_only=True, **heuristic)
+            if top is not None and bottom is not None:
+                heights[i, j] = (bottom - top) / mask.shape[0]
+    return heights
+
+
+# ------------------------------------------------------------
+# SEARCH
+# ------------------------------------------------------------
+def write_csv(path, header, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    cache = ImageCache(image_folder, long_side=long_side, hsv=False)
+    paths = [p for p in cache.paths() if cache.load(p) is not None]
+    class_names = sorted({cache.by_path[p]["class_name"] for p in paths})
+    classes = np.array([class_names.index(cache.by_path[p]["class_name"]) for p in paths])
+    print(f"Images: {len(paths)} in {len(class_names)} classes ({long_side} px)")
+
+    # --------------------------------------------------------
+    # STEP 1
+    # --------------------------------------------------------
+    t0 = time.perf_counter()
+    hsv_frames = [runtime_hsv(cache.load(p)[0]) for p in paths]
+    cums = np.stack([cumulative_histogram(hsv_histogram(hsv)) for hsv in hsv_frames])
+    t_hist = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    lower, upper = threshold_grid()
+    pixels = np.array([hsv.shape[0] * hsv.shape[1] for hsv in hsv_frames])
+    ratios = box_counts(cums, lower, upper) / pixels[:, None] * 100
+
+    reference = load_reference(paths, "green_ratio")
+    if reference is not None:
+        threshold_scores = reference_score(ratios, reference)
+    else:
+        threshold_scores = fisher_score(ratios, classes)
+        median_ratio = np.median(ratios, axis=0)
+        implausible = (median_ratio < plausible_ratio[0]) | (median_ratio > plausible_ratio[1])
+        threshold_scores[implausible] = -np.inf
+    order = np.argsort(-threshold_scores, kind="stable")
+    order = order[np.isfinite(threshold_scores[order])]
+    best = distinct_best(order, ratios, top_thresholds, min_difference)
+    t_score = time.perf_counter() - t0
+    print(f"\nStep 1: {len(lower)} thresholds | histograms {t_hist:.2f} s, scoring {t_score:.2f} s")
+
+    # Check the histogram counts against cv2.inRange for a few thresholds
+    check = order[:3].tolist() + [0, len(lower) - 1]
+    exact = all(
+        cv2.countNonZero(cv2.inRange(hsv_frames[i], lower[t], upper[t])) == round(ratios[i, t] * pixels[i] / 100)
+        for i in range(0, len(paths), 20) for t in check
+    )
+    print(f"Histogram counts equal to cv2.inRange: {exact}")
+
+    write_csv(
+        thresholds_csv,
+        ["rank", "green_lower", "green_upper", "score", "median_green_ratio"],
+        [[rank + 1, lower[t].tolist(), upper[t].tolist(), float(threshold_scores[t]), float(np.median(ratios[:, t]))]
+         for rank, t in enumerate(order)],
+    )
+    for rank, t in enumerate(best):
+        print(f"  {rank + 1}. lower {lower[t].tolist()} upper {upper[t].tolist()} "
+              f"score {threshold_scores[t]:.3f} median ratio {np.median(ratios[:, t]):.1f}%")
+
+    # --------------------------------------------------------
+    # STEP 2
+    # --------------------------------------------------------
+    thresholds = [(lower[t].tolist(), upper[t].tolist()) for t in best]
+    heuristics = [dict(zip(HEURISTIC_GRID, values)) for values in itertools.product(*HEURISTIC_GRID.values())]
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=init_worker,
+                             initargs=(image_folder, long_side)) as executor:
+        tasks = [(p, thresholds, heuristics) for p in paths]
+        heights = np.stack(list(executor.map(extent_heights, tasks, chunksize=4)))  # (N, thresholds, heuristics)
+    t_extent = time.perf_counter() - t0
+    print(f"\nStep 2: {len(thresholds)} x {len(heuristics)} combinations | {t_extent:.2f} s "
+          f"({num_workers or os.cpu_count()} workers)")
+
+    flat = heights.reshape(len(paths), -1)
+    found = ~np.isnan(flat)
+    reference = load_reference(paths, "height_fraction")
+    if reference is not None:
+        extent_scores = reference_score(np.nan_to_num(flat), reference)
+    else:
+        # Missing extents count as height 0, which also lowers the consistency
+        extent_scores = fisher_score(np.nan_to_num(flat), classes) * found.mean(axis=0)
+
+    rows = []
+    for k in np.argsort(-extent_scores, kind="stable"):
+        i, j = divmod(k, len(heuristics))
+        t = best[i]
+        rows.append([
+            lower[t].tolist(), upper[t].tolist(), *heuristics[j].values(),
+            float(threshold_scores[t]), float(extent_scores[k]),
+            float(found[:, k].mean() * 100), float(np.median(ratios[:, t])), float(np.nanmedian(flat[:, k])),
+        ])
+    write_csv(
+        results_csv,
+        ["rank", "green_lower", "green_upper", *HEURISTIC_GRID, "threshold_score", "extent_score",
+         "found_pct", "median_green_ratio", "median_height_fraction"],
+        [[rank + 1] + row for rank, row in enumerate(rows)],
+    )
+    print(f"Ranked table: {results_csv} (thresholds: {thresholds_csv})")
+
+    chosen = dict(zip(["green_lower", "green_upper", *HEURISTIC_GRID], rows[0][:6]))
+    chosen.update(
+        score=rows[0][7],
+        scoring="reference" if reference_csv else "fisher",
+        image_folder=image_folder,
+        long_side=long_side,
+        colour_pipeline="runtime RGB888 (RGB2HSV of the decoded image)",
+    )
+    for script in params_scripts:
+        save_vision_params(chosen, script, params_file)
+    print(f"Chosen: {chosen}")
+    print(f"Saved to: {params_file} ({', '.join(params_scripts)})")
@@ -0,0 +1,208 @@
+# ============================================================
+# plant_classifier.py
+# Plant classifier runtime: loads the fastest exported model
+# ============================================================
+#
+# export_model.py turns plant_model.pth into several artifacts in
+# exported_model/ and measures them on the test set (report.json):
+#
+#     model_int8_static.onnx   int8, calibrated on augmented_dataset (onnxruntime)
+#     model_int8_dynamic.onnx  int8 weights, dynamic activations (onnxruntime)
+#     model_fp32.onnx          fp32 graph (onnxruntime)
+#     model.ts                 TorchScript, frozen fp32
+#
+# PlantClassifier picks the artifact with the lowest measured latency
+# whose accuracy is within max_accuracy_drop of the fp32 model; the
+# fp32 model itself (plant_model.pth in eager PyTorch) is one of the
+# candidates. Without a report it takes the first one that exists in the
+# order above, and falls back to plant_model.pth.
+#
+# backend="knn" classifies with the k-NN embedding index of
+# embedding_index.py (exported_model/knn_index.npz) instead of an fc
+# head, so it also knows species enrolled after training. Its class
+# names come from the index. It is only used when asked for: its
+# classes differ from the trained model's, so it is not in the report.
+#
+# The ONNX backends do not import torch at all: the preprocessing
+# (PIL bilinear resize to 224x224, scale to [0, 1], CHW) is done in
+# numpy and gives the same values as Resize((224, 224)) + ToTensor().
+# ============================================================
+
+import json
+import os
+import time
+
+import numpy as np
+
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exported_model")
+MODEL_PATH = "plant_model.pth"
+IMAGE_SIZE = 224
+
+ARTIFACTS = {
+    "onnx_int8_static": "model_int8_static.onnx",
+    "onnx_int8_dynamic": "model_int8_dynamic.onnx",
+    "onnx_fp32": "model_fp32.onnx",
+    "torchscript": "model.ts",
+}
+FALLBACK = "pytorch"
+KNN = "knn"
+KNN_INDEX = "knn_index.npz"  # embedding_index.py
+
+
+def preprocess(image):
+    """PIL image or RGB uint8 array -> float32 array (3, 224, 224) in [0, 1]."""
+    from PIL import Image
+
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    image = image.convert("RGB").resize((IMAGE_SIZE, IMAGE_SIZE), Image.BILINEAR)
+    return np.asarray(image, dtype=np.float32).transpose(2, 0, 1) / 255
+
+
+def load_class_names(export_dir=EXPORT_DIR):
+    with open(os.path.join(export_dir, "classes.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ------------------------------------------------------------
+# BACKENDS
+# ------------------------------------------------------------
+class OnnxBackend:
+    def __init__(self, path, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class TorchBackend:
+    """TorchScript file, or the eager ResNet18 from a state_dict (.pth)."""
+
+    def __init__(self, path, num_classes=None, num_threads=None):
+        import torch
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        if path.endswith(".pth"):
+            from torchvision import models
+
+            model = models.resnet18(weights=None)
+            model.fc = torch.nn.Linear(model.fc.in_features, num_classes)
+            model.load_state_dict(torch.load(path, map_location="cpu"))
+            self.model = model.eval()
+        else:
+            # Frozen on export; the inference passes (conv-bn folding, MKLDNN) only work after loading
+            self.model = torch.jit.optimize_for_inference(torch.jit.load(path, map_location="cpu"))
+        self.torch = torch
+
+    def __call__(self, batch):
+        with self.torch.inference_mode():
+            return self.model(self.torch.from_numpy(batch)).numpy()
+
+
+class KnnBackend:
+    """Frozen ImageNet backbone + k-NN embedding index (embedding_index.py); torch needed."""
+
+    def __init__(self, path, k=5, num_threads=None):
+        import torch
+
+        from embedding_index import KnnClassifier
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.knn = KnnClassifier(path, k=k)
+        self.class_names = self.knn.class_names
+
+    def __call__(self, batch):
+        # Log of the vote shares, so a softmax over the scores (inference_daemon.py) gives the shares back
+        return np.log(np.maximum(self.knn.scores(batch), 1e-12))
+
+
+# ------------------------------------------------------------
+# CLASSIFIER
+# ------------------------------------------------------------
+class PlantClassifier:
+    """
+    backend: artifact name from ARTIFACTS, "pytorch" or "knn"; None = fastest acceptable one
+    max_accuracy_drop: accuracy loss (percentage points vs fp32) allowed when choosing from the report
+    """
+
+    def __init__(self, export_dir=EXPORT_DIR, model_path=MODEL_PATH, backend=None,
+                 max_accuracy_drop=1.0, num_threads=None, class_names=None):
+        self.export_dir = export_dir
+        self.model_path = model_path
+        if backend == KNN:
+            self.backend_name = KNN
+            self.model = KnnBackend(os.path.join(export_dir, KNN_INDEX), num_threads=num_threads)
+            self.class_names = self.model.class_names  # enrolled species included
+            return
+
+        self.class_names = class_names or load_class_names(export_dir)
+        self.backend_name = backend or self.choose_backend(max_accuracy_drop)
+
+        if self.backend_name == FALLBACK:
+            self.model = TorchBackend(model_path, len(self.class_names), num_threads)
+        else:
+            path = os.path.join(export_dir, ARTIFACTS[self.backend_name])
+            if path.endswith(".onnx"):
+                self.model = OnnxBackend(path, num_threads)
+            else:
+                self.model = TorchBackend(path, num_threads=num_threads)
+
+    def available(self):
+        return [name for name, file in ARTIFACTS.items() if os.path.exists(os.path.join(self.export_dir, file))]
+
+    def choose_backend(self, max_accuracy_drop):
+        available = self.available()
+        if os.path.exists(self.model_path):
+            available.append(FALLBACK)  # the report measures it too; on some CPUs it is the fastest
+        report_path = os.path.join(self.export_dir, "report.json")
+        if os.path.exists(report_path):
+            with open(report_path, encoding="utf-8") as f:
+                report = json.load(f)
+            reference = report.get(FALLBACK, {}).get("accuracy")
+            candidates = [
+                (result["latency_ms"], name) for name, result in report.items()
+                if name in available
+                and (reference is None or result["accuracy"] >= reference - max_accuracy_drop)
+            ]
+            if candidates:
+                return min(candidates)[1]
+        return available[0] if available else FALLBACK
+
+    def logits(self, batch):
+        """Raw scores (N, classes) for a float32 batch (N, 3, 224, 224)."""
+        return self.model(np.ascontiguousarray(batch, dtype=np.float32))
+
+    def predict_batch(self, images):
+        """Class indices for a list of PIL images / RGB arrays."""
+        batch = np.stack([preprocess(image) for image in images])
+        return self.logits(batch).argmax(axis=1)
+
+    def predict(self, image):
+        """(label, index) of one PIL image / RGB array."""
+        index = int(self.predict_batch([image])[0])
+        return self.class_names[index], index
+
+
+if __name__ == "__main__":
+    import sys
+
+    from PIL import Image
+
+    # Classify one image: python plant_classifier.py photo.jpg [backend, e.g. knn]
+    start = time.perf_counter()
+    classifier = PlantClassifier(backend=sys.argv[2] if len(sys.argv) > 2 else None)
+    load_time = time.perf_counter() - start
+    image = Image.open(sys.argv[1])
+    start = time.perf_counter()
+    label, _ = classifier.predict(image)
+    print(f"{classifier.backend_name}: {label} "
+          f"(load {load_time * 1000:.0f} ms, predict {(time.perf_counter() - start) * 1000:.1f} ms)")
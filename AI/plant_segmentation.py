@@ -0,0 +1,165 @@
+# ============================================================
+# plant_segmentation.py
+# Connected-component plant segmentation
+# ============================================================
+#
+# Alternative to the center-strip extent search (plant_extent.py). The
+# whole green mask is labelled with cv2.connectedComponentsWithStats,
+# which gives area, bounding box and centroid of every blob in one
+# linear pass. The plant is the biggest blob (blobs touching the frame
+# border count for less, they are usually background), plus the other
+# large blobs next to it (leaves split off by a stem or shadow). Plant
+# height, width and green ratio come from the selected blobs, so plants
+# that are not centred in the frame are found as well.
+#
+# Benchmark against the strip heuristic on the test set:
+#     python plant_segmentation.py
+# ============================================================
+
+import cv2
+import numpy as np
+
+
+def segment_plant(green_mask, min_area_ratio=0.002, keep_ratio=0.15, border_penalty=0.5, margin_ratio=0.05):
+    """
+    Select the plant blob(s) of a green mask.
+
+    min_area_ratio: blobs smaller than this fraction of the frame are noise
+    keep_ratio: other blobs are part of the plant when at least this fraction of the main blob
+    border_penalty: score factor for blobs touching the frame border
+    margin_ratio: how far (fraction of the frame width/height) an extra blob may lie from the main blob
+
+    Returns a dict with top, bottom, left, right, plant_height, plant_width,
+    green_ratio (% of the frame), plant_mask (uint8, 255 = plant) and blobs
+    (area, bbox (x, y, w, h) and centroid of every blob above min_area_ratio).
+    Extent values are None when there is no plant.
+    """
+    h, w = green_mask.shape
+    count, labels, stats, centroids = cv2.connectedComponentsWithStats(
+        (green_mask > 0).view(np.uint8), connectivity=8
+    )
+
+    # Label 0 is the background
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    keep = np.flatnonzero(areas >= min_area_ratio * h * w) + 1
+    blobs = [
+        {
+            "label": int(i),
+            "area": int(stats[i, cv2.CC_STAT_AREA]),
+            "bbox": tuple(int(v) for v in stats[i, :4]),
+            "centroid": (float(centroids[i, 0]), float(centroids[i, 1])),
+        }
+        for i in keep
+    ]
+
+    result = {
+        "top": None, "bottom": None, "left": None, "right": None,
+        "plant_height": None, "plant_width": None,
+        "green_ratio": 0.0, "plant_mask": np.zeros((h, w), dtype=np.uint8), "blobs": blobs,
+    }
+    if not blobs:
+        return result
+
+    # Main blob: biggest area, border blobs (background, table edge) count for less
+    def score(blob):
+        x, y, bw, bh = blob["bbox"]
+        touches_border = x == 0 or y == 0 or x + bw == w or y + bh == h
+        return blob["area"] * (border_penalty if touches_border else 1.0)
+
+    main = max(blobs, key=score)
+    mx, my, mw, mh = main["bbox"]
+    margin_x, margin_y = margin_ratio * w, margin_ratio * h
+
+    def near_main(blob):
+        x, y, bw, bh = blob["bbox"]
+        return (x <= mx + mw + margin_x and x + bw >= mx - margin_x
+                and y <= my + mh + margin_y and y + bh >= my - margin_y)
+
+    selected = [main] + [
+        b for b in blobs
+        if b is not main and b["area"] >= keep_ratio * main["area"] and near_main(b)
+    ]
+
+    left = min(b["bbox"][0] for b in selected)
+    top = min(b["bbox"][1] for b in selected)
+    right = max(b["bbox"][0] + b["bbox"][2] for b in selected) - 1
+    bottom = max(b["bbox"][1] + b["bbox"][3] for b in selected) - 1
+
+    # Plant mask: lookup table from label to 0/255, one pass over the label image
+    to_mask = np.zeros(count, dtype=np.uint8)
+    to_mask[[b["label"] for b in selected]] = 255
+    plant_mask = to_mask[labels]
+
+    result.update(
+        top=top, bottom=bottom, left=left, right=right,
+        plant_height=bottom - top, plant_width=right - left,
+        green_ratio=sum(b["area"] for b in selected) / (h * w) * 100,
+        plant_mask=plant_mask,
+    )
+    return result
+
+
+# ------------------------------------------------------------
+# BENCHMARK AGAINST THE STRIP HEURISTIC
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    import os
+    import time
+    from glob import glob
+
+    from plant_extent import find_plant_extent_reference, find_plant_extent, center_strip
+
+    GREEN_LOWER = np.array([21, 26, 26])
+    GREEN_UPPER = np.array([95, 255, 255])
+    repeats = 3
+
+    def best_time(function, *args, **kwargs):
+        times = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            result = function(*args, **kwargs)
+            times.append(time.perf_counter() - t0)
+        return result, min(times)
+
+    for long_side in (640, None):
+        t_reference, t_strip, t_components, height_diff = [], [], [], []
+        found_strip = found_components = 0
+
+        for img_path in sorted(glob(os.path.join("test_set", "*/*"))):
+            image_bgr = cv2.imread(img_path)
+            if image_bgr is None:
+                continue
+            if long_side:
+                h, w = image_bgr.shape[:2]
+                scale = long_side / max(h, w)
+                image_bgr = cv2.resize(image_bgr, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+            green_mask = cv2.inRange(cv2.cvtColor(image_bgr, cv2.COLOR_BGR2HSV), GREEN_LOWER, GREEN_UPPER)
+
+            _, tr = best_time(find_plant_extent_reference, center_strip(green_mask), first_pixel_only=True)
+            (top, bottom), ts = best_time(find_plant_extent, center_strip(green_mask), first_pixel_only=True)
+            plant, tc = best_time(segment_plant, green_mask)
+            t_reference.append(tr)
+            t_strip.append(ts)
+            t_components.append(tc)
+
+            found_strip += top is not None and bottom is not None
+            found_components += plant["plant_height"] is not None
+            if top is not None and bottom is not None and plant["plant_height"] is not None:
+                height_diff.append(abs((bottom - top) - plant["plant_height"]) / green_mask.shape[0] * 100)
+
+        size = f"long side {long_side}px" if long_side else "full resolution"
+        print(f"\n--- {size}: {len(t_strip)} images ---")
+        print(f"strip, per-pixel loop : median {np.median(t_reference) * 1000:7.2f} ms, max {np.max(t_reference) * 1000:7.2f} ms")
+        print(f"strip, vectorized     : median {np.median(t_strip) * 1000:7.2f} ms, max {np.max(t_strip) * 1000:7.2f} ms")
+        print(f"connected components  : median {np.median(t_components) * 1000:7.2f} ms, max {np.max(t_components) * 1000:7.2f} ms")
+        print(f"plant found: strip {found_strip}, components {found_components}")
+        print(f"height |diff| strip vs components (% of frame height): "
+              f"median {np.median(height_diff):.1f}, p90 {np.percentile(height_diff, 90):.1f}")
+
+    # A plant at the side of the frame: nothing in the center strip
+    mask = np.zeros((480, 640), dtype=np.uint8)
+    cv2.ellipse(mask, (120, 260), (60, 150), 0, 0, 360, 255, -1)
+    plant = segment_plant(mask)
+    print(f"\nOff-center plant: strip {find_plant_extent(center_strip(mask))}, "
+          f"components top/bottom {plant['top']}/{plant['bottom']}, "
+          f"left/right {plant['left']}/{plant['right']}")
@@ -1,8 +1,10 @@
-import os, random
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from PIL import Image
-from torchvision import transforms
 from tqdm import tqdm
 
+from augment_dataset import augment_with_seed, is_test_photo, item_seed, source_images
+
 # ===============================
 # 1. Configuratie
 # ===============================
@@ -12,56 +14,85 @@ test_dir = "test_set"      # Map voor test data (klein deel van de dataset)
 num_augments = 20          # Hoeveel nieuwe (aangepaste) foto's per originele foto
 test_split = 0.2           # Percentage dat naar de test set gaat (20%)
 
+seed = 0                   # Basis-seed: zelfde seed = exact dezelfde augmentaties en dezelfde train/test-verdeling
+parallel = True            # Werk verdelen over meerdere processen
+num_workers = None         # Aantal processen (None = alle CPU-cores)
+augments_per_task = 5      # Augmentaties per taak (de originele foto wordt één keer per taak ingelezen)
+
 # ===============================
 # 2. Augmentation pipeline
 # ===============================
-# Hier definiëren we welke bewerkingen (filters) op de foto's worden toegepast.
-augment = transforms.Compose([
-    transforms.RandomResizedCrop(224, scale=(0.8, 1.0)),       # Willekeurig uitsnijden en schalen
-    transforms.RandomHorizontalFlip(),                         # Spiegeling horizontaal
-    transforms.RandomVerticalFlip(),                           # Spiegeling verticaal
-    transforms.RandomRotation(40),                             # Willekeurige rotatie (tot 40 graden)
-    transforms.ColorJitter(brightness=0.3, contrast=0.3, saturation=0.3, hue=0.1),  # Kleurvariaties
-    transforms.GaussianBlur(kernel_size=(3, 3)),                # Beetje vervaging toevoegen
-])
+# De bewerkingen (crop, flips, rotatie, kleur, blur) staan in augment_dataset.py,
+# zodat training met on-the-fly augmentatie (train_model.py, "stream") dezelfde pipeline gebruikt.
+# Elke augmentatie krijgt een eigen seed (basis-seed, hash van de foto, index), dus het resultaat
+# hangt niet af van de volgorde of van welk proces het werk doet.
 
 # ===============================
-# 3. Maak output mappen aan
+# 3. Functies
 # ===============================
-# Zorgt dat de output folders bestaan (maakt ze aan als ze niet bestaan)
-for d in [augmented_dir, test_dir]:
-    os.makedirs(d, exist_ok=True)
+def goes_to_test(file_hash):
+    """Train/test-verdeling per originele foto (alle augmentaties van een foto in dezelfde set)."""
+    # Zelfde verdeling als train_model.py in "stream" mode gebruikt om test_set-foto's over te slaan
+    return is_test_photo(file_hash, seed, test_split)
 
-# ===============================
-# 4. Loop door alle planten
-# ===============================
-for plant_folder in os.listdir(source_dir):
-    path = os.path.join(source_dir, plant_folder)
-    if not os.path.isdir(path) or not plant_folder.startswith("plant_"):
-        continue  # sla over als het geen plant_x map is
 
-    # Mappen voor deze specifieke plant aanmaken
-    aug_save = os.path.join(augmented_dir, plant_folder)
-    test_save = os.path.join(test_dir, plant_folder)
-    os.makedirs(aug_save, exist_ok=True)
-    os.makedirs(test_save, exist_ok=True)
+def work_items(entries):
+    """Taken (pad van de originele foto, [(seed, uitvoerpad), ...]) voor alle nog niet bestaande bestanden."""
+    tasks, skipped = [], 0
+    for entry in entries:
+        plant_folder = entry["class_name"]
+        save_folder = os.path.join(test_dir if goes_to_test(entry["hash"]) else augmented_dir, plant_folder)
+        os.makedirs(save_folder, exist_ok=True)
 
-    # Doorloop alle afbeeldingen in de map
-    for img_name in tqdm(os.listdir(path), desc=f"Processing {plant_folder}"):
-        if not img_name.lower().endswith((".jpg", ".jpeg", ".png")):
-            continue  # sla niet-afbeeldingen over
+        pending = []
+        for i in range(num_augments):
+            # Bestandsnaam aanpassen met "_aug_x"
+            out_name = f"{os.path.splitext(os.path.basename(entry['path']))[0]}_aug_{i+1}.jpg"
+            out_path = os.path.join(save_folder, out_name)
+            if os.path.exists(out_path):
+                skipped += 1  # al gemaakt bij een vorige (onderbroken) run
+                continue
+            pending.append((item_seed(seed, entry["hash"], i), out_path))
 
-        image = Image.open(os.path.join(path, img_name)).convert("RGB")
+        for start in range(0, len(pending), augments_per_task):
+            tasks.append((entry["path"], pending[start:start + augments_per_task]))
+    return tasks, skipped
 
-        # Maak meerdere versies (augmentations) van elke originele afbeelding
-        for i in range(num_augments):
-            aug_img = augment(image)
 
-            # Willekeurig deel (20%) naar test set, rest naar training set
-            save_folder = test_save if random.random() < test_split else aug_save
+def augment_task(task):
+    """Maak de augmentaties van één taak; geeft het aantal geschreven bestanden terug."""
+    src_path, items = task
+    image = Image.open(src_path).convert("RGB")
+    for item_seed_value, out_path in items:
+        aug_img = augment_with_seed(image, item_seed_value)
+        # Eerst naar een tijdelijk bestand: een onderbroken run laat geen half geschreven JPEG achter
+        tmp_path = out_path + ".tmp"
+        aug_img.save(tmp_path, format="JPEG")
+        os.replace(tmp_path, out_path)
+    return len(items)
 
-            # Bestandsnaam aanpassen met "_aug_x"
-            out_name = f"{os.path.splitext(img_name)[0]}_aug_{i+1}.jpg"
-            aug_img.save(os.path.join(save_folder, out_name))
 
-print("✅ Augmentation klaar! Nieuwe data opgeslagen in 'augmented_dataset/' en 'test_set/'")
+# ===============================
+# 4. Loop door alle planten
+# ===============================
+if __name__ == "__main__":
+    # Zorgt dat de output folders bestaan (maakt ze aan als ze niet bestaan)
+    for d in [augmented_dir, test_dir]:
+        os.makedirs(d, exist_ok=True)
+
+    entries = source_images(source_dir)  # alle foto's in de plant_x mappen (met hash)
+    tasks, skipped = work_items(entries)
+    total = sum(len(items) for _, items in tasks)
+    print(f"{len(entries)} foto's, {total} augmentaties te maken, {skipped} bestonden al")
+
+    with tqdm(total=total, desc="Augmenting") as progress:
+        if parallel:
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                futures = [executor.submit(augment_task, task) for task in tasks]
+                for future in as_completed(futures):
+                    progress.update(future.result())
+        else:
+            for task in tasks:
+                progress.update(augment_task(task))
+
+    print("✅ Augmentation klaar! Nieuwe data opgeslagen in 'augmented_dataset/' en 'test_set/'")
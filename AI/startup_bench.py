@@ -0,0 +1,121 @@
+# ============================================================
+# startup_bench.py
+# Startup-time budget for the entry points (python -X importtime)
+# ============================================================
+#
+# Every entry point is started in a fresh interpreter with
+# "python -X importtime": the robot scripts with --help, the modules
+# that other code imports with "import <module>". From the importtime
+# report we take the total import time (sum of the top-level
+# cumulative times) and check two things:
+#
+#   - the total stays within the entry point's budget (ms)
+#   - none of HEAVY_MODULES (torch, matplotlib, the Pi hardware
+#     libraries, ...) is imported at startup, unless the entry point
+#     allows it; these belong behind a lazy import
+#
+# The budgets are for a desktop-class machine; on the Pi pass a
+# slower-machine factor, e.g. --budget-scale 5.
+#
+#     python startup_bench.py [--repeats 5] [--budget-scale 1.0] [--entries FinalBEAST42 ...]
+#
+# Exit code 1 when an entry point fails to start, is over budget or
+# imports a heavy module.
+# ============================================================
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+AI_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(AI_DIR)
+
+# Not allowed at startup: only where they are really used
+HEAVY_MODULES = (
+    "torch", "torchvision", "matplotlib", "sklearn", "onnxruntime", "cv2",
+    "RPi", "adafruit_servokit", "pyrf24", "picamera2", "gpiozero",
+)
+
+# name: (working directory, command after "python -X importtime", budget ms, allowed heavy modules)
+ENTRY_POINTS = {
+    "FinalBEAST42": (REPO_DIR, ["FinalBEAST42.py", "--help"], 60, ()),
+    "Complete_code_excluding_AI": (AI_DIR, ["Complete_code_excluding_AI.py", "--help"], 80, ()),
+    "Complete_code_including_AI": (AI_DIR, ["Complete_code_including_AI.py", "--help"], 200, ()),
+    "testing_model": (AI_DIR, ["-c", "import testing_model"], 200, ()),
+    "plant_classifier": (AI_DIR, ["-c", "import plant_classifier"], 250, ()),
+    "inference_client": (AI_DIR, ["-c", "import inference_client"], 200, ()),
+    "inference_daemon": (AI_DIR, ["inference_daemon.py", "--help"], 400, ("cv2",)),
+}
+
+
+def parse_importtime(stderr):
+    """(total ms, {top-level module: cumulative ms}, set of all imported top-level package names)."""
+    top_level = {}
+    packages = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        packages.add(name.strip().split(".")[0])
+        if not name.startswith("  "):  # one space after "|"; nested imports are indented further
+            top_level[name.strip()] = int(cumulative) / 1000
+    return sum(top_level.values()), top_level, packages
+
+
+def measure(cwd, command, repeats):
+    """Median total import time and wall time of repeats fresh interpreters, plus the last report."""
+    totals, walls = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-X", "importtime", *command],
+                                cwd=cwd, capture_output=True, text=True)
+        walls.append((time.perf_counter() - start) * 1000)
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"exit {result.returncode}"
+            return {"error": error}
+        total, top_level, packages = parse_importtime(result.stderr)
+        totals.append(total)
+    return {
+        "import_ms": float(np.median(totals)),
+        "wall_ms": float(np.median(walls)),
+        "top_level": top_level,
+        "packages": packages,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Startup-time budget per entry point")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="multiply all budgets (slower machine)")
+    parser.add_argument("--entries", nargs="*", default=list(ENTRY_POINTS), choices=list(ENTRY_POINTS))
+    args = parser.parse_args()
+
+    failures = 0
+    print(f"{'entry point':28s} {'import':>8s} {'wall':>8s} {'budget':>8s}  status")
+    for name in args.entries:
+        cwd, command, budget, allowed = ENTRY_POINTS[name]
+        budget *= args.budget_scale
+        result = measure(cwd, command, args.repeats)
+        if "error" in result:
+            failures += 1
+            print(f"{name:28s} {'-':>8s} {'-':>8s} {budget:8.0f}  FAIL: {result['error']}")
+            continue
+
+        heavy = sorted(m for m in HEAVY_MODULES if m in result["packages"] and m not in allowed)
+        problems = []
+        if result["import_ms"] > budget:
+            problems.append("over budget")
+        if heavy:
+            problems.append("imports " + ", ".join(heavy))
+        failures += bool(problems)
+
+        slowest = sorted(result["top_level"].items(), key=lambda item: -item[1])[:3]
+        print(f"{name:28s} {result['import_ms']:6.1f}ms {result['wall_ms']:6.0f}ms {budget:6.0f}ms  "
+              f"{'FAIL: ' + '; '.join(problems) if problems else 'ok'}")
+        print(f"{'':28s} slowest: " + ", ".join(f"{module} {ms:.1f}" for module, ms in slowest))
+
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,178 @@
+# ============================================================
+# tensor_cache.py
+# Decode-once uint8 image cache + multi-worker DataLoader for training
+# ============================================================
+#
+# ImageFolder + Resize((224, 224)) + ToTensor() opens, decodes and
+# resizes every JPEG again in every epoch, on the main process. Here
+# every image is decoded once with the same PIL Resize and stored as a
+# 3x224x224 uint8 row in one contiguous memory map (memmap_store.py,
+# keyed by the file hash of the manifest). The dataset only copies rows
+# out of the memory map; the conversion to float happens per batch
+# (to_float), which gives exactly the values of ToTensor().
+#
+# Images/second of the old and the new loader (one epoch each) and a
+# check that both give the same tensors:
+#     python tensor_cache.py [data_dir]
+# ============================================================
+
+import os
+import time
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset
+from torchvision import transforms
+
+from feature_cache import ManifestImages
+from image_cache import CACHE_DIR, load_manifest
+from memmap_store import MemmapStore
+
+IMAGE_SIZE = 224
+
+# Same resize as train_model.py; PILToTensor keeps uint8 (ToTensor = PILToTensor / 255)
+to_uint8 = transforms.Compose([
+    transforms.Resize((IMAGE_SIZE, IMAGE_SIZE)),
+    transforms.PILToTensor(),
+])
+
+
+def to_float(images):
+    """uint8 batch (N, 3, H, W) -> float batch in [0, 1], as ToTensor() would give."""
+    return images.float().div_(255)
+
+
+class TensorCache:
+    """
+    Resized uint8 images of manifest entries in one memory map.
+    cache_dir: folder of images_<size>.npy + .json index
+    """
+
+    def __init__(self, cache_dir=os.path.join(CACHE_DIR, "tensors"), size=IMAGE_SIZE):
+        self.store = MemmapStore(os.path.join(cache_dir, f"images_{size}.npy"), (3, size, size), np.uint8)
+
+    def build(self, entries, batch_size=64, num_workers=0):
+        """Decode and resize the images that are not cached yet; returns how many were added."""
+        by_hash = {entry["hash"]: entry for entry in entries}
+        missing = self.store.missing(by_hash)
+        if not missing:
+            return 0
+        loader = DataLoader(
+            ManifestImages([by_hash[h] for h in missing], transform=to_uint8),
+            batch_size=batch_size,
+            num_workers=num_workers,
+        )
+        done = 0
+        for images in loader:
+            self.store.put(missing[done:done + len(images)], images.numpy())
+            done += len(images)
+        return done
+
+    def dataset(self, entries, class_names):
+        """Dataset of (uint8 image, label) for entries; build() them first."""
+        rows = [self.store.index[entry["hash"]] for entry in entries]
+        targets = [class_names.index(entry["class_name"]) for entry in entries]
+        return CachedImages(self.store.path, rows, targets)
+
+
+class CachedImages(Dataset):
+    """
+    Rows of the memory map as uint8 tensors. The map is opened per process on first
+    use, so DataLoader workers do not get a pickled copy of it.
+    """
+
+    def __init__(self, path, rows, targets):
+        self.path = path
+        self.rows = rows
+        self.targets = targets
+        self.array = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        if self.array is None:
+            self.array = np.load(self.path, mmap_mode="r")
+        return torch.from_numpy(np.array(self.array[self.rows[i]])), self.targets[i]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["array"] = None
+        return state
+
+
+def cached_loader(data_dir, batch_size=16, shuffle=True, num_workers=2, pin_memory=False, build_workers=0):
+    """
+    DataLoader over the tensor cache of data_dir (class subfolders, like ImageFolder).
+    Returns (loader, class_names); batches are uint8, convert them with to_float().
+    """
+    entries = load_manifest(data_dir)
+    class_names = sorted(d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d)))
+    cache = TensorCache()
+    added = cache.build(entries, num_workers=build_workers)
+    if added:
+        print(f"Tensor cache: {added} new images decoded")
+
+    loader = DataLoader(
+        cache.dataset(entries, class_names),
+        batch_size=batch_size,
+        shuffle=shuffle,
+        num_workers=num_workers,
+        persistent_workers=num_workers > 0,
+        pin_memory=pin_memory,
+    )
+    return loader, class_names
+
+
+# ------------------------------------------------------------
+# OLD VS NEW LOADER
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    import sys
+
+    from torchvision import datasets
+
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else "augmented_dataset"
+    batch_size = 16
+    workers = [0, 2, 4]
+
+    def images_per_second(loader, convert=None, epochs=1):
+        count = 0
+        start = time.perf_counter()
+        for _ in range(epochs):
+            for images, _ in loader:
+                if convert is not None:
+                    images = convert(images)
+                count += len(images)
+        return count / (time.perf_counter() - start)
+
+    old_transform = transforms.Compose([transforms.Resize((IMAGE_SIZE, IMAGE_SIZE)), transforms.ToTensor()])
+    old_dataset = datasets.ImageFolder(data_dir, transform=old_transform)
+    old_loader = DataLoader(old_dataset, batch_size=batch_size, shuffle=True)
+    print(f"{data_dir}: {len(old_dataset)} images")
+    print(f"ImageFolder, num_workers=0 : {images_per_second(old_loader):8.1f} images/s")
+
+    start = time.perf_counter()
+    loader, class_names = cached_loader(data_dir, batch_size=batch_size, num_workers=0)
+    print(f"Cache build / check        : {time.perf_counter() - start:8.1f} s")
+    assert class_names == old_dataset.classes
+
+    for n in workers:
+        loader, _ = cached_loader(data_dir, batch_size=batch_size, num_workers=n)
+        # Second epoch shows the persistent workers (no worker start-up)
+        rate = images_per_second(loader, to_float, epochs=2 if n else 1)
+        print(f"Tensor cache, num_workers={n}: {rate:8.1f} images/s")
+
+    # Same tensors as ImageFolder + ToTensor for the first images
+    entries = load_manifest(data_dir)
+    dataset = TensorCache().dataset(entries, class_names)
+    by_path = {path: i for i, (path, _) in enumerate(old_dataset.samples)}
+    checked = differing = 0
+    for i, entry in enumerate(entries[:32]):
+        if entry["path"] not in by_path:
+            continue
+        old_image, old_label = old_dataset[by_path[entry["path"]]]
+        new_image, new_label = dataset[i]
+        checked += 1
+        differing += not (torch.equal(old_image, to_float(new_image)) and old_label == new_label)
+    print(f"Identical to ImageFolder: {checked - differing}/{checked}")
@@ -2,6 +2,7 @@
 # test_model.py
 # ==========================================
 # - Kan één afbeelding of de volledige test_set testen
+# - Met plant_model.pth of met de k-NN-index van embedding_index.py (model_type)
 # - Toont voorspellingen per afbeelding
 # - Berekent nauwkeurigheid (accuracy)
 # - Schrijft misclassificaties naar CSV
@@ -10,103 +11,212 @@
 
 import os
 import csv
-import torch
-from torchvision import models, transforms
-from PIL import Image
-import matplotlib.pyplot as plt
-from sklearn.metrics import confusion_matrix
+import time
 import numpy as np
 
+from image_cache import load_manifest
+
+# torch/torchvision, PIL, matplotlib en sklearn worden pas geïmporteerd waar ze nodig zijn
+# (load_model, get_transform, save_confusion_matrix): het importeren van dit bestand blijft snel
+
 # ==========================================
 # Basisinstellingen
 # ==========================================
 
 model_path = "plant_model.pth"  # pad naar het getrainde model
+model_type = "fc"  # "fc": plant_model.pth, "knn": k-NN-index van embedding_index.py (ook ingeschreven soorten)
+knn_index_path = None  # alleen "knn": None = exported_model/knn_index.npz
 test_dir = "test_set"  # map met testafbeeldingen
 output_csv = "test_misclassifications.csv"  # bestand waarin fouten worden opgeslagen
 confusion_png = "confusion_matrix.png"  # uitvoerbestand voor de confusion matrix
 single_image_path = None  # voorbeeld: "test_set/plant_2/example.jpg" → test één afbeelding
+batch_size = 16  # afbeeldingen per forward pass (1 = zoals vroeger per afbeelding)
+num_workers = 2  # processen die afbeeldingen openen en transformeren (0 = in het hoofdproces)
 
 # ==========================================
-# Klassen en model laden
+# Klassen en model laden (bij het eerste gebruik)
 # ==========================================
 
-class_names = sorted([d for d in os.listdir(test_dir) if os.path.isdir(os.path.join(test_dir, d))])  # haalt de mappen/klassen op
-num_classes = len(class_names)  # aantal plantsoorten
-print(f"Gevonden plantklassen: {class_names}")
+class_names = None  # mappen/klassen van test_dir
+model = None  # ResNet18 met de getrainde gewichten (of KnnModel)
+transform = None
+
+
+def load_class_names():
+    global class_names
+    if class_names is None:
+        class_names = sorted([d for d in os.listdir(test_dir) if os.path.isdir(os.path.join(test_dir, d))])  # haalt de mappen/klassen op
+        print(f"Gevonden plantklassen: {class_names}")
+    return class_names
+
+
+class KnnModel:
+    """
+    k-NN-index (embedding_index.py) met dezelfde aanroep als het model: batch → scores per klasse
+    in de volgorde van class_names. Soorten uit de index zonder map in test_dir komen achteraan erbij.
+    """
+
+    def __init__(self, class_names):
+        from embedding_index import INDEX_PATH, KnnClassifier
+
+        self.knn = KnnClassifier(knn_index_path or INDEX_PATH)
+        for name in self.knn.class_names:
+            if name not in class_names:
+                class_names.append(name)
+        self.columns = [class_names.index(name) for name in self.knn.class_names]
+        self.num_classes = len(class_names)
 
-model = models.resnet18(weights=None)  # zelfde model als bij training
-model.fc = torch.nn.Linear(model.fc.in_features, num_classes)  # outputlaag aanpassen aan aantal klassen
-model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))  # modelgewichten laden
-model.eval()  # model in evaluatiemodus zetten
+    def __call__(self, images):
+        import torch
+
+        shares = self.knn.scores(images)  # aandeel van de stemmen per klasse van de index
+        scores = np.zeros((len(shares), self.num_classes), dtype=np.float32)
+        scores[:, self.columns] = shares
+        return torch.from_numpy(scores)
+
+
+def load_model():
+    global model
+    if model is None and model_type == "knn":
+        model = KnnModel(load_class_names())
+    if model is None:
+        import torch
+        from torchvision import models
+
+        num_classes = len(load_class_names())  # aantal plantsoorten
+        model = models.resnet18(weights=None)  # zelfde model als bij training
+        model.fc = torch.nn.Linear(model.fc.in_features, num_classes)  # outputlaag aanpassen aan aantal klassen
+        model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))  # modelgewichten laden
+        model.eval()  # model in evaluatiemodus zetten
+    return model
 
 # ==========================================
 # Transformaties
 # ==========================================
 
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),  # formaat consistent houden
-    transforms.ToTensor(),  # omzetten naar tensor
-])
+def get_transform():
+    global transform
+    if transform is None:
+        from torchvision import transforms
+
+        transform = transforms.Compose([
+            transforms.Resize((224, 224)),  # formaat consistent houden
+            transforms.ToTensor(),  # omzetten naar tensor
+        ])
+    return transform
 
 # ==========================================
 # Functie voor één afbeelding
 # ==========================================
 
 def predict_image(image_path):
+    import torch
+    from PIL import Image
+
     image = Image.open(image_path).convert("RGB")  # afbeelding openen en converteren naar RGB
-    img_t = transform(image).unsqueeze(0)  # transformaties toepassen en batchdimensie toevoegen
+    img_t = get_transform()(image).unsqueeze(0)  # transformaties toepassen en batchdimensie toevoegen
 
-    with torch.no_grad():  # geen gradienten nodig tijdens inferentie
-        outputs = model(img_t)  # modelvoorspelling
+    with torch.inference_mode():  # geen gradienten of versiebeheer van tensors nodig tijdens inferentie
+        outputs = load_model()(img_t)  # modelvoorspelling
         _, pred_idx = torch.max(outputs, 1)  # index met hoogste score nemen
 
-    predicted_label = class_names[pred_idx.item()]  # label opzoeken
+    predicted_label = load_class_names()[pred_idx.item()]  # label opzoeken
     print(f"📷 {os.path.basename(image_path)} → Herkend als: {predicted_label}")  # print resultaat
     return predicted_label, pred_idx.item()  # label + index teruggeven
 
 # ==========================================
-# Testmodus
+# Dataset voor de batches
 # ==========================================
 
-if single_image_path:  # test één afbeelding
-    label, _ = predict_image(single_image_path)  # voorspelling uitvoeren
-    print(f"\n✅ Voorspelling voltooid: {label}")  # resultaat tonen
+class TestImages:
+    """
+    (getransformeerde afbeelding, index in entries); None als de afbeelding niet te openen is.
+    Map-style dataset voor DataLoader (alleen __len__ en __getitem__ nodig, dus zonder torch-import).
+    """
 
-else:  # test volledige dataset
-    y_true, y_pred = [], []  # echte labels en voorspellingen
-    misclassified = []  # lijst voor fouten
-    total, correct = 0, 0  # counters
+    def __init__(self, entries):
+        self.entries = entries
 
-    for idx, class_name in enumerate(class_names):  # doorloop elke plantsoort
-        folder = os.path.join(test_dir, class_name)  # map van die soort
+    def __len__(self):
+        return len(self.entries)
 
-        for img_name in os.listdir(folder):  # alle afbeeldingen in de map
-            if not img_name.lower().endswith((".jpg", ".jpeg", ".png")):
-                continue  # skip niet-afbeeldingen
+    def __getitem__(self, i):
+        from PIL import Image
 
-            img_path = os.path.join(folder, img_name)  # volledig pad
-            try:
-                image = Image.open(img_path).convert("RGB")  # afbeelding openen
-            except Exception as e:
-                print(f"⚠️ Kan afbeelding niet openen: {img_path} ({e})")  # melding bij fout
-                continue
+        img_path = self.entries[i]["path"]
+        try:
+            image = Image.open(img_path).convert("RGB")  # afbeelding openen
+        except Exception as e:
+            print(f"⚠️ Kan afbeelding niet openen: {img_path} ({e})")  # melding bij fout
+            return None
+        return get_transform()(image), i
 
-            img_t = transform(image).unsqueeze(0)  # transformeren naar modelinput
-            with torch.no_grad():
-                outputs = model(img_t)  # model runnen
-                pred_idx = outputs.argmax(1).item()  # hoogste score pakken
 
-            y_true.append(idx)  # echt label opslaan
-            y_pred.append(pred_idx)  # voorspeld label opslaan
-            total += 1  # teller verhogen
+def collate_skip_missing(batch):
+    from torch.utils.data import default_collate
 
-            if pred_idx == idx:
-                correct += 1  # juist voorspeld
-            else:
-                misclassified.append((img_path, class_name, class_names[pred_idx]))  # fout toevoegen
+    # Onleesbare afbeeldingen (None) overslaan, de rest samenvoegen tot één batch
+    batch = [item for item in batch if item is not None]
+    return default_collate(batch) if batch else None
 
-            print(f"📸 {img_name}: verwacht '{class_name}' → voorspeld '{class_names[pred_idx]}'")  # resultaat tonen
+# ==========================================
+# Volledige test_set
+# ==========================================
+
+def test_dataset():
+    import torch
+    from torch.utils.data import DataLoader
+
+    class_names = load_class_names()
+    model = load_model()
+
+    # Afbeeldingen uit het manifest (image_cache.py): bestanden gesorteerd per klasse, alleen gewijzigde
+    # bestanden worden opnieuw gehasht. De pixels worden wel met PIL gelezen, net als bij de training
+    # (PIL draait niet volgens EXIF zoals cv2.imread, dus de cv2-beeldcache is hier niet bruikbaar).
+    entries = load_manifest(test_dir)  # alle afbeeldingen
+    labels = np.array([class_names.index(e["class_name"]) for e in entries])  # echte klasse-index per afbeelding
+
+    loader = DataLoader(
+        TestImages(entries),
+        batch_size=batch_size,
+        num_workers=num_workers,
+        collate_fn=collate_skip_missing,
+    )
+
+    tested, predictions = [], []  # indices van geteste afbeeldingen en hun voorspellingen
+    model_time = 0.0  # tijd in het model (zonder laden/transformeren)
+    start_time = time.perf_counter()
+
+    with torch.inference_mode():  # geen gradienten nodig tijdens inferentie
+        for batch in loader:
+            if batch is None:
+                continue  # hele batch onleesbaar
+            images, indices = batch
+            t0 = time.perf_counter()
+            outputs = model(images)  # model runnen op de hele batch
+            model_time += time.perf_counter() - t0
+            tested.append(indices.numpy())
+            predictions.append(outputs.argmax(1).numpy())  # hoogste score per afbeelding
+
+    total_time = time.perf_counter() - start_time
+    tested = np.concatenate(tested) if tested else np.array([], dtype=int)
+    y_true = labels[tested]  # echte labels
+    y_pred = np.concatenate(predictions) if predictions else np.array([], dtype=int)  # voorspelde labels
+
+    total = len(y_true)  # aantal geteste afbeeldingen
+    correct = int((y_true == y_pred).sum())  # juist voorspeld
+    misclassified = [
+        (entries[i]["path"], class_names[t], class_names[p])
+        for i, t, p in zip(tested, y_true, y_pred) if t != p
+    ]  # fouten
+
+    for i, t, p in zip(tested, y_true, y_pred):
+        print(f"📸 {os.path.basename(entries[i]['path'])}: verwacht '{class_names[t]}' → voorspeld '{class_names[p]}'")  # resultaat tonen
+
+    if total > 0:
+        print(f"\n⏱️ Batchgrootte {batch_size}, {num_workers} workers: "
+              f"{model_time / total * 1000:.1f} ms per afbeelding in het model, "
+              f"{total / total_time:.1f} afbeeldingen/s in totaal (incl. laden)")
 
     # ==========================================
     # Resultaten en CSV
@@ -123,39 +233,58 @@ else:  # test volledige dataset
             writer.writerow(row)  # elke fout opslaan
     print(f"📁 Misclassificaties opgeslagen in: {output_csv}")  # bevestiging
 
-    # ==========================================
-    # Confusion matrix
-    # ==========================================
-
     if total > 0:  # alleen als er iets getest is
-        cm = confusion_matrix(y_true, y_pred, labels=list(range(num_classes)))  # matrix berekenen
-        cm_norm = cm.astype("float") / cm.sum(axis=1)[:, np.newaxis]  # normaliseren per rij
-        cm_norm = np.nan_to_num(cm_norm)  # NaN vervangen door 0
-
-        fig, ax = plt.subplots(figsize=(8, 6))  # plot aanmaken
-        im = ax.imshow(cm_norm, interpolation='nearest', cmap="viridis")  # heatmap tekenen
-        ax.figure.colorbar(im, ax=ax)  # kleurenschaal toevoegen
-
-        ax.set(
-            xticks=np.arange(num_classes),
-            yticks=np.arange(num_classes),
-            xticklabels=class_names,
-            yticklabels=class_names,
-            ylabel="Echte klasse",
-            xlabel="Voorspelde klasse",
-            title="Genormaliseerde confusion matrix"
-        )
-
-        plt.setp(ax.get_xticklabels(), rotation=45, ha="right", rotation_mode="anchor")  # x-labels schuin zetten
-
-        thresh = cm_norm.max() / 2.  # drempel voor tekstkleur
-        for i in range(cm_norm.shape[0]):
-            for j in range(cm_norm.shape[1]):
-                text = f"{cm[i, j]}"  # absolute aantallen tonen
-                ax.text(j, i, text, ha="center", va="center",
-                        color="white" if cm_norm[i, j] > thresh else "black")  # tekstcontrast aanpassen
-
-        plt.tight_layout()  # layout optimaliseren
-        plt.savefig(confusion_png)  # figuur opslaan
-        plt.close()  # sluiten
-        print(f"🧩 Confusion matrix opgeslagen als: {confusion_png}")  # bevestiging
+        save_confusion_matrix(y_true, y_pred)
+
+# ==========================================
+# Confusion matrix
+# ==========================================
+
+def save_confusion_matrix(y_true, y_pred):
+    import matplotlib.pyplot as plt
+    from sklearn.metrics import confusion_matrix
+
+    class_names = load_class_names()
+    num_classes = len(class_names)
+    cm = confusion_matrix(y_true, y_pred, labels=list(range(num_classes)))  # matrix berekenen
+    cm_norm = cm.astype("float") / cm.sum(axis=1)[:, np.newaxis]  # normaliseren per rij
+    cm_norm = np.nan_to_num(cm_norm)  # NaN vervangen door 0
+
+    fig, ax = plt.subplots(figsize=(8, 6))  # plot aanmaken
+    im = ax.imshow(cm_norm, interpolation='nearest', cmap="viridis")  # heatmap tekenen
+    ax.figure.colorbar(im, ax=ax)  # kleurenschaal toevoegen
+
+    ax.set(
+        xticks=np.arange(num_classes),
+        yticks=np.arange(num_classes),
+        xticklabels=class_names,
+        yticklabels=class_names,
+        ylabel="Echte klasse",
+        xlabel="Voorspelde klasse",
+        title="Genormaliseerde confusion matrix"
+    )
+
+    plt.setp(ax.get_xticklabels(), rotation=45, ha="right", rotation_mode="anchor")  # x-labels schuin zetten
+
+    thresh = cm_norm.max() / 2.  # drempel voor tekstkleur
+    for i in range(cm_norm.shape[0]):
+        for j in range(cm_norm.shape[1]):
+            text = f"{cm[i, j]}"  # absolute aantallen tonen
+            ax.text(j, i, text, ha="center", va="center",
+                    color="white" if cm_norm[i, j] > thresh else "black")  # tekstcontrast aanpassen
+
+    plt.tight_layout()  # layout optimaliseren
+    plt.savefig(confusion_png)  # figuur opslaan
+    plt.close()  # sluiten
+    print(f"🧩 Confusion matrix opgeslagen als: {confusion_png}")  # bevestiging
+
+# ==========================================
+# Testmodus
+# ==========================================
+
+if __name__ == "__main__":
+    if single_image_path:  # test één afbeelding
+        label, _ = predict_image(single_image_path)  # voorspelling uitvoeren
+        print(f"\n✅ Voorspelling voltooid: {label}")  # resultaat tonen
+    else:  # test volledige dataset
+        test_dataset()
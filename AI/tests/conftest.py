@@ -0,0 +1,5 @@
+# The AI scripts import each other as top-level modules (python <script>.py from AI/)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+Image = pytest.importorskip("PIL.Image")
+
+from augment_dataset import AugmentedStream, augment_with_seed, is_test_photo, item_seed  # noqa: E402
+from image_cache import build_manifest  # noqa: E402
+
+
+@pytest.fixture
+def photos(tmp_path):
+    rng = np.random.default_rng(0)
+    for class_name in ("plant_1", "plant_2"):
+        (tmp_path / class_name).mkdir()
+        for i in range(2):
+            pixels = rng.integers(0, 256, (120, 160, 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(tmp_path / class_name / f"photo_{i}.png")
+    return build_manifest(str(tmp_path), prefix="plant_")
+
+
+def test_item_seed_is_deterministic_and_distinct():
+    assert item_seed(0, "abc", 3, epoch=1) == item_seed(0, "abc", 3, epoch=1)
+    seeds = {item_seed(base, h, i, e) for base in (0, 1) for h in ("abc", "abd") for i in range(3) for e in range(2)}
+    assert len(seeds) == 24
+    assert 0 <= item_seed(0, "abc", 0) < 2**63
+
+
+def test_test_photos_are_a_stable_fraction():
+    hashes = [f"{i:040x}" for i in range(2000)]
+    split = [is_test_photo(h) for h in hashes]
+    assert split == [is_test_photo(h, seed=0, test_split=0.2) for h in hashes]
+    assert 0.17 < np.mean(split) < 0.23
+    assert split != [is_test_photo(h, seed=1) for h in hashes]
+    assert not any(is_test_photo(h, test_split=0.0) for h in hashes)
+
+
+def test_augmentation_depends_only_on_the_seed():
+    image = Image.fromarray(np.random.default_rng(1).integers(0, 256, (120, 160, 3), dtype=np.uint8))
+    first = np.asarray(augment_with_seed(image, 42))
+    torch.rand(5)  # other use of the global RNG in between
+    second = np.asarray(augment_with_seed(image, 42))
+    np.testing.assert_array_equal(first, second)
+    assert not np.array_equal(first, np.asarray(augment_with_seed(image, 43)))
+
+
+def test_augmentation_leaves_the_global_rng_alone():
+    image = Image.fromarray(np.zeros((60, 80, 3), dtype=np.uint8))
+    state = torch.get_rng_state()
+    augment_with_seed(image, 7)
+    assert torch.equal(torch.get_rng_state(), state)
+
+
+def test_stream_samples_do_not_depend_on_order_or_worker(photos):
+    class_names = ["plant_1", "plant_2"]
+    forward = AugmentedStream(photos, class_names, num_augments=3)
+    backward = AugmentedStream(photos, class_names, num_augments=3)  # as a separate worker copy
+    assert len(forward) == 12
+    samples = [forward[i] for i in range(len(forward))]
+    for i in reversed(range(len(backward))):
+        image, label = backward[i]
+        assert torch.equal(image, samples[i][0]) and label == samples[i][1]
+    assert samples[0][1] == 0 and samples[-1][1] == 1
+
+    backward.set_epoch(1)
+    assert not torch.equal(backward[0][0], samples[0][0])  # new augmentations every epoch
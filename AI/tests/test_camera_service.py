@@ -0,0 +1,50 @@
+import sys
+import types
+
+import numpy as np
+
+from camera_service import PiCameraService
+
+
+class FakePicamera2:
+    """Picamera2 stand-in: the first instance fails every capture, later ones work."""
+
+    instances = []
+
+    def __init__(self):
+        self.broken = not FakePicamera2.instances
+        self.closed = False
+        FakePicamera2.instances.append(self)
+
+    def create_preview_configuration(self, **streams):
+        return streams
+
+    def configure(self, config):
+        self.config = config
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def capture_array(self, stream="main"):
+        if self.broken or self.closed:
+            raise RuntimeError("camera gone")
+        return np.zeros((4, 4, 3), np.uint8)
+
+
+def test_main_capture_recovers_after_reconnect(monkeypatch):
+    FakePicamera2.instances = []
+    monkeypatch.setitem(sys.modules, "picamera2", types.SimpleNamespace(Picamera2=FakePicamera2))
+
+    camera = PiCameraService(warmup=0, retries=1)
+    frame = camera.capture_frame()
+
+    assert frame.shape == (4, 4, 3)
+    assert camera.reconnects == 1
+    assert len(FakePicamera2.instances) == 2 and FakePicamera2.instances[0].closed
+    camera.close()
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from embedding_index import EmbeddingIndex, select_exemplars, normalize, source_photo
+
+
+def clusters(rng, centers, per_class, spread=0.03):
+    """Noisy 512-d points around each center; returns (features, class name per row)."""
+    features = np.vstack([center + spread * rng.standard_normal((per_class, center.size)) for center in centers])
+    names = np.repeat([f"plant_{i + 1}" for i in range(len(centers))], per_class)
+    return features.astype(np.float32), names
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    centers = normalize(rng.standard_normal((4, 512)))
+    train = clusters(rng, centers[:3], 60)
+    test = clusters(rng, centers[:3], 20)
+    new_class = clusters(rng, centers[3:], 25)
+    return train, test, new_class
+
+
+def test_build_and_search(data):
+    (train, train_names), (test, test_names), _ = data
+    index = EmbeddingIndex.build(train, train_names, exemplars_per_class=8)
+    assert index.class_names == ["plant_1", "plant_2", "plant_3"]
+    assert len(index) == 3 * 9 and index.prototypes.sum() == 3  # prototype + exemplars per class
+
+    predicted, confidence, similarity = index.search(test, k=5)
+    assert np.all(np.array(index.class_names)[predicted] == test_names)
+    assert np.all((confidence > 0.5) & (confidence <= 1.0)) and np.all(similarity > 0.5)
+
+    # One vector works like a batch of one
+    single, _, _ = index.search(test[0], k=5)
+    assert single.shape == (1,) and single[0] == predicted[0]
+
+
+def test_enroll_adds_and_replaces_a_class(data):
+    (train, train_names), _, (new, new_names) = data
+    index = EmbeddingIndex.build(train, train_names, exemplars_per_class=8)
+    assert index.enroll("plant_4", new[:5]) == 6  # prototype + the 5 photos
+    predicted, _, _ = index.search(new[5:], k=3)
+    assert set(np.array(index.class_names)[predicted]) == {"plant_4"}
+
+    rows_before = len(index)
+    index.enroll("plant_4", new[5:])  # replaces the rows of the class, keeps its label
+    assert index.class_names == ["plant_1", "plant_2", "plant_3", "plant_4"]
+    assert len(index) == rows_before - 6 + 9
+    assert np.sum(index.labels == 3) == 9
+
+
+def test_save_and_load(tmp_path, data):
+    (train, train_names), (test, _), _ = data
+    index = EmbeddingIndex.build(train, train_names, exemplars_per_class=8)
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    loaded = EmbeddingIndex.load(path)
+    assert loaded.class_names == index.class_names and loaded.exemplars_per_class == 8
+    assert loaded.vectors.dtype == np.float16
+    np.testing.assert_array_equal(loaded.search(test)[0], index.search(test)[0])
+
+
+def test_empty_index_raises():
+    with pytest.raises(ValueError, match="empty"):
+        EmbeddingIndex().search(np.ones(512))
+
+
+def test_exemplars_cover_the_class():
+    rng = np.random.default_rng(1)
+    # Two tight groups in one class: farthest-point sampling takes both
+    a, b = normalize(rng.standard_normal((2, 512)))
+    vectors = normalize(np.vstack([a + 0.002 * rng.standard_normal((50, 512)), b + 0.002 * rng.standard_normal((5, 512))]))
+    chosen = select_exemplars(vectors, 2)
+    assert chosen.shape == (2, 512)
+    assert max(chosen @ a) > 0.99 and max(chosen @ b) > 0.99
+
+
+def test_source_photo():
+    assert source_photo("augmented_dataset/plant_3/p3.1_aug_12.jpg") == "p3.1"
+    assert source_photo("plant_3/IMG_2_aug_x_aug_3.jpg") == "IMG_2_aug_x"
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("onnx")
+Image = pytest.importorskip("PIL.Image")
+
+from torchvision import models  # noqa: E402
+
+import export_model  # noqa: E402
+from image_cache import build_manifest  # noqa: E402
+from plant_classifier import OnnxBackend, TorchBackend, preprocess  # noqa: E402
+
+
+def cosine(a, b):
+    return (a * b).sum(1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+def test_exported_artifacts_match_the_fp32_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_model, "export_dir", str(tmp_path))
+    torch.manual_seed(0)
+    model = models.resnet18(weights=None)
+    model.fc = torch.nn.Linear(model.fc.in_features, 3)
+    model.eval()
+
+    # Smooth images (a gradient per channel), closer to photos than pixel noise
+    data = tmp_path / "data"
+    rng = np.random.default_rng(0)
+    ramp = np.linspace(0, 1, 160)
+    for class_name in ("plant_1", "plant_2"):
+        (data / class_name).mkdir(parents=True)
+        for i in range(4):
+            gains = rng.uniform(60, 255, 3)
+            pixels = np.stack([np.add.outer(ramp, ramp[::-1] * rng.uniform()) / 2 * g for g in gains], axis=-1)
+            Image.fromarray(pixels.astype(np.uint8)).save(data / class_name / f"{i}.jpg")
+    entries = build_manifest(str(data))
+    batch = np.stack([preprocess(Image.open(e["path"])) for e in entries])
+
+    with torch.inference_mode():
+        reference = model(torch.from_numpy(batch)).numpy()
+
+    example = torch.rand(1, 3, 224, 224)
+    torchscript = TorchBackend(export_model.export_torchscript(model, example))
+    np.testing.assert_allclose(torchscript(batch), reference, rtol=1e-3, atol=1e-3)
+
+    fp32_path = export_model.export_onnx(model, example)
+    np.testing.assert_allclose(OnnxBackend(fp32_path)(batch), reference, rtol=1e-3, atol=1e-3)
+
+    for int8_path in export_model.quantize_onnx(fp32_path, entries):
+        logits = OnnxBackend(int8_path)(batch)
+        assert logits.shape == reference.shape
+        assert cosine(logits, reference).min() > 0.99, int8_path
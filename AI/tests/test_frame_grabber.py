@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+
+from camera_service import SyntheticCameraService  # noqa: E402
+from frame_grabber import FrameGrabber  # noqa: E402
+
+
+def test_reading_before_start_raises():
+    grabber = FrameGrabber(SyntheticCameraService((64, 48)))
+    with pytest.raises(RuntimeError, match="not started"):
+        grabber.latest()
+    with pytest.raises(RuntimeError, match="not started"):
+        grabber.last(2)
+
+
+def test_latest_and_last_after_start():
+    with FrameGrabber(SyntheticCameraService((64, 48)), buffer_size=3) as grabber:
+        seq = grabber.wait_for_frame(grabber.latest_seq + 2, timeout=2.0)
+        assert seq >= 3
+        frame = grabber.latest()
+        assert frame.shape == (48, 64, 3) and frame.dtype == np.uint8
+        assert grabber.last(5).shape == (3, 48, 64, 3)
+        assert grabber.metrics()["frames"] >= 4
@@ -0,0 +1,37 @@
+import os
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+from image_cache import ImageCache  # noqa: E402
+
+
+def make_dataset(folder, seed):
+    rng = np.random.default_rng(seed)
+    (folder / "plant_1").mkdir(parents=True)
+    for i in range(2):
+        cv2.imwrite(str(folder / "plant_1" / f"{i}.png"), rng.integers(0, 256, (24, 32, 3), dtype=np.uint8))
+
+
+def test_prune_keeps_the_frames_of_other_datasets(tmp_path):
+    cache_dir = tmp_path / "cache"
+    make_dataset(tmp_path / "test_set", 0)
+    make_dataset(tmp_path / "augmented_dataset", 1)
+    test_cache = ImageCache(str(tmp_path / "test_set"), cache_dir=str(cache_dir))
+    train_cache = ImageCache(str(tmp_path / "augmented_dataset"), cache_dir=str(cache_dir))
+    assert test_cache.build() == 2 and train_cache.build() == 2
+    frames = sorted(os.listdir(test_cache.frame_dir))
+    assert len(frames) == 8  # bgr + hsv of four images
+
+    assert test_cache.prune() == 0
+    assert sorted(os.listdir(test_cache.frame_dir)) == frames
+
+    # A deleted image loses its frames once its folder's manifest is refreshed
+    os.remove(tmp_path / "test_set" / "plant_1" / "0.png")
+    test_cache.refresh()
+    assert train_cache.prune() == 2
+    assert len(os.listdir(test_cache.frame_dir)) == 6
+    image_bgr, hsv = train_cache.load(train_cache.paths()[0])
+    assert image_bgr.shape == (24, 32, 3) and hsv.shape == (24, 32, 3)
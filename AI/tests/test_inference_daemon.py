@@ -0,0 +1,79 @@
+import socket
+import threading
+
+import pytest
+
+from inference_daemon import claim_socket
+
+
+def test_stale_socket_is_removed(tmp_path):
+    path = str(tmp_path / "daemon.sock")
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()  # file stays, nobody listens: a crashed daemon
+
+    claim_socket(path)
+
+    assert not (tmp_path / "daemon.sock").exists()
+
+
+def test_live_daemon_is_not_hijacked(tmp_path):
+    path = str(tmp_path / "daemon.sock")
+    live = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    live.bind(path)
+    live.listen()
+    try:
+        with pytest.raises(RuntimeError, match="already running"):
+            claim_socket(path)
+        assert (tmp_path / "daemon.sock").exists()
+    finally:
+        live.close()
+
+
+def test_other_files_are_left_alone(tmp_path):
+    path = tmp_path / "daemon.sock"
+    path.write_text("not a socket")
+    with pytest.raises(RuntimeError, match="not a socket"):
+        claim_socket(str(path))
+    assert path.exists()
+
+
+def test_round_trip_over_socket_and_shared_memory(tmp_path):
+    pytest.importorskip("cv2")
+    from camera_service import SyntheticCameraService, to_lores
+    from inference_client import InferenceClient, InferenceError
+    from inference_daemon import InferenceEngine, InferenceServer
+
+    path = str(tmp_path / "daemon.sock")
+    engine = InferenceEngine(use_model=False)
+    engine.warm_up()
+    server = InferenceServer(path, engine)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        frame = SyntheticCameraService((320, 240), seed=1)._grab()
+        expected = engine.analyze(frame, "rgb888")
+        assert expected["green_ratio"] > 0 and expected["plant_height"] is not None
+
+        with InferenceClient(path) as client:
+            assert client.ping()["backend"] is None
+            result = client.analyze(frame)
+            with pytest.raises(InferenceError, match="unknown op"):
+                client.request({"op": "shutdown"})
+
+        with InferenceClient(path, shared_memory=True) as client:
+            shared = client.analyze(frame)
+            lores = client.analyze(to_lores(frame), "yuv420")
+            assert client.stats()["requests"] == 3
+
+        for reply in (result, shared):
+            assert reply["label"] is None  # no model loaded
+            for key in ("green_ratio", "top", "bottom", "plant_height", "scale"):
+                assert reply[key] == expected[key]
+        # Same frame through the ISP-style YUV conversion: close, not bit-identical
+        assert lores["scale"] == 0.5 and abs(lores["green_ratio"] - expected["green_ratio"]) < 2.0
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(timeout=2)
+    assert not (tmp_path / "daemon.sock").exists()
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+Image = pytest.importorskip("PIL.Image")
+
+from torchvision import models  # noqa: E402
+
+import feature_cache  # noqa: E402
+import testing_model  # noqa: E402
+from embedding_index import EmbeddingIndex  # noqa: E402
+from plant_classifier import KNN, KNN_INDEX, PlantClassifier, preprocess  # noqa: E402
+
+
+@pytest.fixture
+def export_dir(tmp_path, monkeypatch):
+    # The ImageNet weights may not be downloadable here: a seeded backbone gives the same code path
+    def load_backbone(device):
+        torch.manual_seed(0)
+        backbone = models.resnet18(weights=None)
+        backbone.fc = torch.nn.Identity()
+        return backbone.eval().to(device)
+
+    monkeypatch.setattr(feature_cache, "load_backbone", load_backbone)
+    return tmp_path
+
+
+def photos(seed, count, color):
+    rng = np.random.default_rng(seed)
+    base = np.zeros((96, 128, 3), np.uint8)
+    base[:] = color
+    return [Image.fromarray(np.clip(base + rng.integers(-20, 21, base.shape), 0, 255).astype(np.uint8))
+            for _ in range(count)]
+
+
+def test_knn_backend_classifies_an_enrolled_species(export_dir):
+    green, red, blue = photos(0, 4, (40, 160, 40)), photos(1, 4, (170, 40, 40)), photos(2, 4, (40, 40, 170))
+    backbone = feature_cache.load_backbone("cpu")
+    with torch.inference_mode():
+        embed = lambda images: backbone(torch.from_numpy(np.stack([preprocess(i) for i in images]))).numpy()  # noqa: E731
+        index = EmbeddingIndex.build(np.vstack([embed(green), embed(red)]), ["plant_1"] * 4 + ["plant_2"] * 4, 2)
+        index.enroll("plant_7", embed(blue))  # new species, no retraining
+    index.save(str(export_dir / KNN_INDEX))
+
+    classifier = PlantClassifier(str(export_dir), backend=KNN)
+    assert classifier.backend_name == KNN
+    assert classifier.class_names == ["plant_1", "plant_2", "plant_7"]
+    assert [classifier.predict(image)[0] for image in (green[0], red[1], blue[2])] == ["plant_1", "plant_2", "plant_7"]
+
+    # A softmax over the scores gives the vote shares back (inference_daemon.py confidence)
+    logits = classifier.logits(np.stack([preprocess(image) for image in blue]))
+    shares = np.exp(logits) / np.exp(logits).sum(axis=1, keepdims=True)
+    np.testing.assert_allclose(shares.sum(axis=1), 1.0, rtol=1e-5)
+    assert np.all(shares[:, 2] > 0.5)
+
+
+def test_testing_model_knn_adds_enrolled_classes(export_dir, monkeypatch):
+    index = EmbeddingIndex.build(np.eye(3, 512, dtype=np.float32), ["plant_1", "plant_3", "plant_9"], 1)
+    index.save(str(export_dir / KNN_INDEX))
+    monkeypatch.setattr(testing_model, "knn_index_path", str(export_dir / KNN_INDEX))
+
+    class_names = ["plant_1", "plant_2", "plant_3"]  # folders of test_dir
+    model = testing_model.KnnModel(class_names)
+    assert class_names == ["plant_1", "plant_2", "plant_3", "plant_9"]
+    scores = model(torch.from_numpy(np.stack([preprocess(image) for image in photos(0, 2, (40, 160, 40))])))
+    assert scores.shape == (2, 4)
+    assert torch.all(scores[:, 1] == 0)  # plant_2 is not in the index
+    np.testing.assert_allclose(scores.sum(dim=1).numpy(), 1.0, rtol=1e-5)
@@ -0,0 +1,19 @@
+import numpy as np
+
+from memmap_store import MemmapStore
+
+
+def test_rows_survive_growing_and_reopening(tmp_path):
+    path = str(tmp_path / "rows.npy")
+    store = MemmapStore(path, (4,), np.float32)
+    first = np.arange(8, dtype=np.float32).reshape(2, 4)
+    store.put(["a", "b"], first)
+    many = np.random.default_rng(0).random((100, 4), dtype=np.float32)
+    keys = [f"k{i}" for i in range(100)]
+    store.put(keys, many)  # beyond the initial 64 rows: the file is copied into a bigger one
+
+    reopened = MemmapStore(path, (4,), np.float32)
+    assert len(reopened) == 102
+    assert reopened.missing(["a", "new", "k5", "new"]) == ["new"]
+    np.testing.assert_array_equal(reopened.get(["b", "a"]), first[::-1])
+    np.testing.assert_array_equal(reopened.get(keys), many)
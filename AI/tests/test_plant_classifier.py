@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from torchvision import models  # noqa: E402
+
+from plant_classifier import ARTIFACTS, FALLBACK, PlantClassifier  # noqa: E402
+
+
+@pytest.fixture
+def export_dir(tmp_path):
+    model = models.resnet18(weights=None)
+    model.fc = torch.nn.Linear(model.fc.in_features, 2)
+    torch.save(model.state_dict(), tmp_path / "plant_model.pth")
+    for file_name in ARTIFACTS.values():
+        (tmp_path / file_name).write_bytes(b"")  # only their presence counts for the choice
+    return tmp_path
+
+
+def write_report(export_dir, **results):
+    report = {name: {"accuracy": accuracy, "latency_ms": latency} for name, (accuracy, latency) in results.items()}
+    (export_dir / "report.json").write_text(json.dumps(report))
+
+
+def choose(export_dir, max_accuracy_drop=1.0):
+    classifier = PlantClassifier(str(export_dir), str(export_dir / "plant_model.pth"), backend=FALLBACK,
+                                 class_names=["plant_1", "plant_2"])
+    return classifier.choose_backend(max_accuracy_drop)
+
+
+def test_fastest_acceptable_artifact_is_chosen(export_dir):
+    write_report(export_dir, pytorch=(90.0, 50.0), onnx_int8_static=(89.5, 10.0),
+                 onnx_int8_dynamic=(90.0, 280.0), onnx_fp32=(90.0, 33.0), torchscript=(90.0, 39.0))
+    assert choose(export_dir) == "onnx_int8_static"
+    assert choose(export_dir, max_accuracy_drop=0.1) == "onnx_fp32"
+
+
+def test_fp32_fallback_is_a_candidate(export_dir):
+    write_report(export_dir, pytorch=(90.0, 20.0), onnx_int8_static=(85.0, 10.0),
+                 onnx_int8_dynamic=(90.0, 280.0), onnx_fp32=(90.0, 33.0), torchscript=(90.0, 39.0))
+    assert choose(export_dir) == FALLBACK
+    # Loaded as the eager model from the state_dict
+    classifier = PlantClassifier(str(export_dir), str(export_dir / "plant_model.pth"), class_names=["plant_1", "plant_2"])
+    assert classifier.backend_name == FALLBACK
+
+
+def test_without_report_the_first_artifact_is_used(export_dir):
+    assert choose(export_dir) == "onnx_int8_static"
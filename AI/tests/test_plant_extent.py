@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+from plant_extent import find_plant_extent, find_plant_extent_reference  # noqa: E402
+
+
+def masks():
+    rng = np.random.default_rng(0)
+    yield np.zeros((480, 64), np.uint8)
+    yield np.full((480, 64), 255, np.uint8)
+    yield np.full((5, 64), 255, np.uint8)  # shorter than the vertical check
+    yield ((rng.random((480, 64)) < 0.5) * 255).astype(np.uint8)
+    line = np.zeros((480, 64), np.uint8)
+    line[100:300, 30] = 255  # one pixel wide: never dense enough
+    yield line
+    for _ in range(40):
+        mask = np.zeros((int(rng.integers(20, 700)), int(rng.integers(8, 160))), np.uint8)
+        for _ in range(int(rng.integers(1, 4))):
+            center = (int(rng.integers(0, mask.shape[1])), int(rng.integers(0, mask.shape[0])))
+            axes = (int(rng.integers(2, 40)), int(rng.integers(2, 200)))
+            cv2.ellipse(mask, center, axes, 0, 0, 360, 255, -1)
+        mask[rng.random(mask.shape) < 0.05] ^= 255  # speckles
+        yield mask
+
+
+@pytest.mark.parametrize("first_pixel_only", [False, True])
+def test_matches_the_reference_search(first_pixel_only):
+    for mask in masks():
+        expected = find_plant_extent_reference(mask, first_pixel_only=first_pixel_only)
+        for chunk_rows in (1, 7, 32):
+            assert find_plant_extent(mask, first_pixel_only=first_pixel_only, chunk_rows=chunk_rows) == expected
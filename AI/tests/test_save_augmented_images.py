@@ -0,0 +1,77 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("tqdm")
+Image = pytest.importorskip("PIL.Image")
+
+import save_augmented_images as export  # noqa: E402
+from image_cache import build_manifest  # noqa: E402
+
+
+@pytest.fixture
+def setup(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    for class_name in ("plant_1", "plant_2"):
+        (tmp_path / "source" / class_name).mkdir(parents=True)
+        for i in range(3):
+            pixels = rng.integers(0, 256, (90, 120, 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(tmp_path / "source" / class_name / f"photo_{i}.png")
+    monkeypatch.setattr(export, "augmented_dir", str(tmp_path / "train"))
+    monkeypatch.setattr(export, "test_dir", str(tmp_path / "test"))
+    monkeypatch.setattr(export, "num_augments", 3)
+    monkeypatch.setattr(export, "augments_per_task", 2)
+    monkeypatch.setattr(export, "test_split", 0.5)
+    return build_manifest(str(tmp_path / "source"), prefix="plant_")
+
+
+def output_paths(tasks):
+    return [out_path for _, items in tasks for _, out_path in items]
+
+
+def read_all(paths):
+    contents = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            contents[path] = f.read()
+    return contents
+
+
+def test_split_is_decided_per_photo(setup):
+    tasks, skipped = export.work_items(setup)
+    assert skipped == 0
+    assert len(output_paths(tasks)) == 6 * 3
+    sets = {}
+    for path in output_paths(tasks):
+        photo = (os.path.basename(os.path.dirname(path)), os.path.basename(path).rsplit("_aug_", 1)[0])
+        sets.setdefault(photo, set()).add(os.path.dirname(os.path.dirname(path)))
+    assert len(sets) == 6
+    assert all(len(folders) == 1 for folders in sets.values())  # every copy of a photo in the same set
+    # The split only depends on the seed and the photo
+    assert export.work_items(setup)[0] == tasks
+
+
+def test_export_is_deterministic_and_resumable(setup):
+    tasks, _ = export.work_items(setup)
+    for task in tasks:
+        export.augment_task(task)
+    paths = output_paths(tasks)
+    serial = read_all(paths)
+
+    # Parallel run from scratch: same bytes whichever process made a file
+    for path in paths:
+        os.remove(path)
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        assert sum(executor.map(export.augment_task, tasks)) == len(paths)
+    assert read_all(paths) == serial
+
+    # Resume after losing one file: only that file is made again, identical to before
+    os.remove(paths[4])
+    tasks, skipped = export.work_items(setup)
+    assert skipped == len(paths) - 1 and output_paths(tasks) == [paths[4]]
+    export.augment_task(tasks[0])
+    assert read_all(paths) == serial
+    assert not any(name.endswith(".tmp") for _, _, files in os.walk(os.path.dirname(paths[0])) for name in files)
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+Image = pytest.importorskip("PIL.Image")
+
+from torchvision import transforms  # noqa: E402
+
+from image_cache import build_manifest  # noqa: E402
+from tensor_cache import TensorCache, to_float  # noqa: E402
+
+
+def test_cached_rows_equal_imagefolder_tensors(tmp_path):
+    data = tmp_path / "data"
+    rng = np.random.default_rng(0)
+    for class_name in ("plant_1", "plant_2"):
+        (data / class_name).mkdir(parents=True)
+        for i in range(3):
+            Image.fromarray(rng.integers(0, 256, (90, 130, 3), dtype=np.uint8)).save(data / class_name / f"{i}.jpg")
+    entries = build_manifest(str(data))
+    cache = TensorCache(cache_dir=str(tmp_path / "cache"))
+
+    assert cache.build(entries) == 6
+    assert cache.build(entries) == 0  # decoded once
+    dataset = cache.dataset(entries, ["plant_1", "plant_2"])
+
+    reference = transforms.Compose([transforms.Resize((224, 224)), transforms.ToTensor()])
+    for i, entry in enumerate(entries):
+        image, label = dataset[i]
+        assert image.dtype == torch.uint8 and image.shape == (3, 224, 224)
+        assert torch.equal(to_float(image[None])[0], reference(Image.open(entry["path"]).convert("RGB")))
+        assert label == ["plant_1", "plant_2"].index(entry["class_name"])
@@ -0,0 +1,16 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from testing_model import collate_skip_missing  # noqa: E402
+
+
+def test_unreadable_images_are_skipped():
+    batch = [(torch.zeros(3, 2, 2), 0), None, (torch.ones(3, 2, 2), 2)]
+    images, indices = collate_skip_missing(batch)
+    assert images.shape == (2, 3, 2, 2)
+    assert indices.tolist() == [0, 2]
+
+
+def test_batch_of_only_unreadable_images():
+    assert collate_skip_missing([None, None]) is None
@@ -0,0 +1,303 @@
+# ============================================================
+# vision_bench.py
+# Benchmark suite for the vision pipeline with regression gates
+# ============================================================
+#
+# Runs every vision stage on synthetic frames (320x240, 640x480,
+# 1280x960, SyntheticCameraService) and on test_set images (640 px,
+# from image_cache.py) and records per-call latency percentiles and the
+# peak memory allocated during one call (tracemalloc: numpy arrays,
+# including the ones OpenCV returns, not OpenCV's internal buffers).
+#
+# No camera or Pi hardware is needed, it runs on any Linux box:
+#
+#     python vision_bench.py --update-baseline   # record bench_baseline.json
+#     python vision_bench.py                     # compare, exit code 1 on a regression
+#
+# A stage regresses when its median latency is more than --threshold
+# (relative) and more than --min-ms (absolute) above the baseline, or
+# its peak memory more than --memory-threshold above it. Baselines are
+# machine specific; record one per machine (bench_baseline.json next to
+# this script, ignored by git).
+# ============================================================
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+import green_camera
+from camera_service import SyntheticCameraService, to_lores
+from green_lut import GreenLUT
+from green_metrics import MetricsBuffers, compute_plant_metrics
+from image_cache import ImageCache
+from plant_extent import (
+    is_valid_pixel,
+    connected_vertically,
+    find_plant_extent,
+    find_plant_extent_reference,
+    center_strip,
+)
+from plant_segmentation import segment_plant
+
+# ------------------------------------------------------------
+# CONFIGURATION
+# ------------------------------------------------------------
+AI_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(AI_DIR, "bench_baseline.json")  # per machine, not in git
+SYNTHETIC_SIZES = [(320, 240), (640, 480), (1280, 960)]
+SYNTHETIC_FRAMES = 4     # different noise seeds per size
+TEST_SET_FOLDER = os.path.join(AI_DIR, "test_set")  # same set from any working directory
+TEST_SET_IMAGES = 24     # spread over the whole set
+TEST_SET_LONG_SIDE = 640
+REPEATS = 40             # timed calls per stage and dataset
+WARMUP = 3
+
+GREEN_LOWER = np.array([21, 26, 26])  # Green_plant_test.py values for the metrics stages
+GREEN_UPPER = np.array([95, 255, 255])
+DARK_GREEN_MAX_V = 100
+PIXEL_CALLS = 100        # is_valid_pixel / connected_vertically calls per timed run
+
+
+# ------------------------------------------------------------
+# STAGES
+# ------------------------------------------------------------
+# Every stage turns one frame (BGR / RGB888 layout) into a function without
+# arguments; preparation (masks, buffers, cameras) is not timed.
+# The second value is the number of calls one run makes (latency is per call).
+def green_mask(frame):
+    return cv2.inRange(cv2.cvtColor(frame, cv2.COLOR_BGR2HSV), GREEN_LOWER, GREEN_UPPER)
+
+
+def strip_pixels(frame):
+    """PIXEL_CALLS green (y, x) positions of the center strip, plus the strip itself."""
+    strip = center_strip(green_mask(frame))
+    ys, xs = np.nonzero(strip)
+    if len(ys) == 0:
+        ys, xs = np.array([strip.shape[0] // 2]), np.array([strip.shape[1] // 2])
+    pick = np.linspace(0, len(ys) - 1, PIXEL_CALLS).astype(int)
+    return strip, list(zip(ys[pick].tolist(), xs[pick].tolist()))
+
+
+def stage_capture_frame(frame):
+    h, w = frame.shape[:2]
+    camera = SyntheticCameraService((w, h))
+    camera.open()
+    return camera.capture_frame
+
+
+def stage_analyze_plant(frame):
+    return lambda: green_camera.analyze_plant(frame, mode="strip")
+
+
+def stage_analyze_plant_components(frame):
+    return lambda: green_camera.analyze_plant(frame, mode="components")
+
+
+def stage_analyze_plant_yuv(frame):
+    h, w = frame.shape[:2]
+    lores = to_lores(frame, (w // 2, h // 2))
+    return lambda: green_camera.analyze_plant_yuv(lores, scale=(w // 2) / 640)
+
+
+lut = None
+
+
+def stage_green_lut(frame):
+    global lut
+    if lut is None:
+        lut = GreenLUT(GREEN_LOWER, GREEN_UPPER, DARK_GREEN_MAX_V)
+    out = np.empty(frame.shape[:2], dtype=np.uint8)
+    return lambda: lut.classify(frame, out=out)
+
+
+def stage_plant_metrics(frame):
+    buffers = MetricsBuffers(frame.shape)
+    return lambda: compute_plant_metrics(frame, buffers, GREEN_LOWER, GREEN_UPPER, DARK_GREEN_MAX_V)
+
+
+def stage_find_plant_extent(frame):
+    strip = center_strip(green_mask(frame))
+    return lambda: find_plant_extent(strip)
+
+
+def stage_find_plant_extent_reference(frame):
+    strip = center_strip(green_mask(frame))
+    return lambda: find_plant_extent_reference(strip)
+
+
+def stage_is_valid_pixel(frame):
+    strip, pixels = strip_pixels(frame)
+
+    def run():
+        for y, x in pixels:
+            is_valid_pixel(y, x, strip)
+    return run
+
+
+def stage_connected_vertically(frame):
+    strip, pixels = strip_pixels(frame)
+
+    def run():
+        for y, x in pixels:
+            connected_vertically(y, x, strip, direction="up")
+    return run
+
+
+def stage_segment_plant(frame):
+    mask = green_mask(frame)
+    return lambda: segment_plant(mask)
+
+
+STAGES = {
+    "capture_frame": (stage_capture_frame, 1),
+    "analyze_plant": (stage_analyze_plant, 1),
+    "analyze_plant_components": (stage_analyze_plant_components, 1),
+    "analyze_plant_yuv": (stage_analyze_plant_yuv, 1),
+    "green_lut": (stage_green_lut, 1),
+    "plant_metrics": (stage_plant_metrics, 1),
+    "find_plant_extent": (stage_find_plant_extent, 1),
+    "find_plant_extent_reference": (stage_find_plant_extent_reference, 1),
+    "is_valid_pixel": (stage_is_valid_pixel, PIXEL_CALLS),
+    "connected_vertically": (stage_connected_vertically, PIXEL_CALLS),
+    "segment_plant": (stage_segment_plant, 1),
+}
+
+
+# ------------------------------------------------------------
+# DATASETS
+# ------------------------------------------------------------
+def load_datasets(names=None):
+    datasets = {}
+    for w, h in SYNTHETIC_SIZES:
+        name = f"synthetic_{w}x{h}"
+        if names is None or name in names:
+            datasets[name] = [SyntheticCameraService((w, h), seed=seed)._grab() for seed in range(SYNTHETIC_FRAMES)]
+
+    name = f"test_set_{TEST_SET_LONG_SIDE}"
+    if (names is None or name in names) and os.path.isdir(TEST_SET_FOLDER):
+        cache = ImageCache(TEST_SET_FOLDER, long_side=TEST_SET_LONG_SIDE, hsv=False)
+        paths = cache.paths()
+        pick = np.linspace(0, len(paths) - 1, min(TEST_SET_IMAGES, len(paths))).astype(int)
+        frames = [cache.load(paths[i]) for i in pick]
+        datasets[name] = [np.ascontiguousarray(f[0]) for f in frames if f is not None]
+    return datasets
+
+
+# ------------------------------------------------------------
+# MEASUREMENT
+# ------------------------------------------------------------
+def measure(factory, calls, frames, repeats=REPEATS, warmup=WARMUP):
+    """Latency percentiles (ms per call) and peak traced memory (kB) of a stage over the frames."""
+    runs = [factory(frame) for frame in frames]
+    for i in range(warmup):
+        runs[i % len(runs)]()
+
+    times = []
+    for i in range(repeats):
+        run = runs[i % len(runs)]
+        t0 = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - t0) / calls)
+
+    # Memory in separate runs, tracemalloc slows the calls down
+    peak = 0
+    for run in runs:
+        tracemalloc.start()
+        run()
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    times = np.array(times) * 1000
+    return {
+        "p50_ms": float(np.percentile(times, 50)),
+        "p90_ms": float(np.percentile(times, 90)),
+        "p99_ms": float(np.percentile(times, 99)),
+        "mean_ms": float(times.mean()),
+        "peak_kb": peak / 1024,
+        "calls": calls,
+    }
+
+
+def machine_info():
+    return {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+    }
+
+
+def compare(results, baseline, threshold, memory_threshold, min_ms):
+    """List of regression messages (empty when everything is within the thresholds)."""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        # The absolute floor applies to one run (PIXEL_CALLS calls for the per-pixel stages)
+        slower_ms = (result["p50_ms"] - base["p50_ms"]) * result["calls"]
+        if result["p50_ms"] > base["p50_ms"] * (1 + threshold) and slower_ms > min_ms:
+            regressions.append(f"{key}: p50 {base['p50_ms']:.3f} -> {result['p50_ms']:.3f} ms "
+                               f"(+{(result['p50_ms'] / base['p50_ms'] - 1) * 100:.0f}%)")
+        if result["peak_kb"] > base["peak_kb"] * (1 + memory_threshold) and result["peak_kb"] - base["peak_kb"] > 64:
+            regressions.append(f"{key}: peak {base['peak_kb']:.0f} -> {result['peak_kb']:.0f} kB")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vision pipeline benchmarks")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline JSON file")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative p50 slowdown")
+    parser.add_argument("--memory-threshold", type=float, default=0.25, help="allowed relative peak memory increase")
+    parser.add_argument("--min-ms", type=float, default=0.2, help="ignore slowdowns smaller than this per run (timer noise)")
+    parser.add_argument("--stages", nargs="*", help="stages to run (default: all)")
+    parser.add_argument("--datasets", nargs="*", help="datasets to run (default: all)")
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    args = parser.parse_args()
+
+    stages = {name: STAGES[name] for name in (args.stages or STAGES)}
+    datasets = load_datasets(args.datasets)
+
+    results = {}
+    print(f"{'stage @ dataset':52s} {'p50':>9s} {'p90':>9s} {'p99':>9s} {'peak':>10s}")
+    for dataset_name, frames in datasets.items():
+        for stage_name, (factory, calls) in stages.items():
+            key = f"{stage_name}@{dataset_name}"
+            results[key] = measure(factory, calls, frames, repeats=args.repeats)
+            r = results[key]
+            print(f"{key:52s} {r['p50_ms']:7.3f}ms {r['p90_ms']:7.3f}ms {r['p99_ms']:7.3f}ms {r['peak_kb']:8.0f}kB")
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"machine": machine_info(), "results": results}, f, indent=1)
+        print(f"\nBaseline saved to: {args.baseline}")
+        sys.exit(0)
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("machine") != machine_info():
+        print("\nWarning: baseline was recorded on a different machine / software versions")
+
+    regressions = compare(results, baseline["results"], args.threshold, args.memory_threshold, args.min_ms)
+    # Baseline results of the selected stages and datasets that did not run (e.g. no test_set here)
+    missing = {key.split("@")[1] for key in baseline["results"] if key not in results
+               and key.split("@")[0] in stages and (args.datasets is None or key.split("@")[1] in args.datasets)}
+    if missing:
+        print(f"\nWarning: not measured, so not checked: {', '.join(sorted(missing))}")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+        for message in regressions:
+            print(f"  {message}")
+        sys.exit(1)
+    print(f"\nNo regressions against {args.baseline} (threshold {args.threshold:.0%})")
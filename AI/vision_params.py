@@ -0,0 +1,48 @@
+# ============================================================
+# vision_params.py
+# Tuned HSV thresholds and extent-search parameters
+# ============================================================
+#
+# param_search.py writes the chosen parameters to vision_params.json,
+# one entry per runtime script, so tuning one script never replaces the
+# (different) defaults of another:
+#
+#     {"green_camera": {"green_lower": [h, s, v], "green_upper": [h, s, v],
+#                       "radius": 3, "threshold": 0.75,
+#                       "vertical_check_len": 10, "vertical_min_ratio": 0.6, ...},
+#      "Complete_code_including_AI": {...}}
+#
+# The runtime scripts read their own entry at import; without it they
+# keep their own defaults.
+#
+# Thresholds are for the HSV the runtime scripts compute: they treat the
+# Picamera2 RGB888 frame ([B, G, R] in memory) as RGB, so R and B are
+# swapped before BGR2HSV and a scene hue h lands at (120 - h) mod 180.
+# param_search.py tunes in that same colour pipeline (runtime_hsv()).
+#
+# Pixel lengths (radius, vertical_check_len) are for a 640 px frame.
+# ============================================================
+
+import json
+import os
+
+VISION_PARAMS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vision_params.json")
+
+
+def load_vision_params(script, path=VISION_PARAMS_FILE):
+    """Parameters of script (e.g. "green_camera") as a dict, {} when the file or entry does not exist."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get(script, {})
+
+
+def save_vision_params(params, script, path=VISION_PARAMS_FILE):
+    """Store params as the entry of script, keeping the entries of the other scripts."""
+    data = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    data[script] = params
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
@@ -1,22 +1,23 @@
 #Final beast
-state = 0  # global statemachine variable
+state = None  # global statemachine variable: name of the current state (STATES)
 speed = 80  # global motor speed setting
 wateringTime = 2  # defining start value wateringTime
 humidity = 0  # define start value humidity
 
 # Import files
-import RPi.GPIO as GPIO
+import argparse
 import time
 from time import *
-from adafruit_servokit import ServoKit
 import sys
 import time
 import os
-    # On Pi 5, this clears the lgpio chip handle
-GPIO.setmode(GPIO.BCM)
+
+import hal
+from distance_filter import DistanceFilter, ThresholdDetector
+from ranging import RangingService
 
 # ==============================================================================
-# PIN layout and initial setup
+# PIN layout
 # Motor 1
 IN1_M1 = 23  # 17
 IN2_M1 = 22  # 18
@@ -27,17 +28,7 @@ IN1_M2 = 27  # 22
 IN2_M2 = 18  # 27
 EN_M2 = 17   # PWM voor motor 2
 
-# Setup pins
 motor_pins = [IN1_M1, IN2_M1, EN_M1, IN1_M2, IN2_M2, EN_M2]
-for p in motor_pins:
-    GPIO.setup(p, GPIO.OUT)
-
-# PWM op beide motoren
-pwm1 = GPIO.PWM(EN_M1, 1000)
-pwm2 = GPIO.PWM(EN_M2, 1000)
-
-# Initialising statement stating that we will have access to 16 PWM channels of the HAT and to summon them we will use | kit |
-kit = ServoKit(channels=16)
 
 # HC-SR04 pins (sonar sensor)
 TRIG1 = 5
@@ -46,144 +37,208 @@ ECHO1 = 6
 TRIG2 = 12
 ECHO2 = 13
 
-# Ultrasone sensor pins
-GPIO.setup(TRIG1, GPIO.OUT)
-GPIO.setup(ECHO1, GPIO.IN)
-
-GPIO.setup(TRIG2, GPIO.OUT)
-GPIO.setup(ECHO2, GPIO.IN)
-
 # relais pin / Solenoid valve
 RELAY_PIN = 19
 START_BUTTON_PIN = 16
 STOP_BUTTON_PIN = 21
 
-# Setup the pin in the setup section
-GPIO.setup(RELAY_PIN, GPIO.OUT)
-GPIO.setup(START_BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.setup(STOP_BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-
-# =====================================================================================
+# Wiring the simulated robot needs to interpret the pins (hal.SimWorld)
+WIRING = {
+    "motors": [(IN1_M1, IN2_M1, EN_M1), (IN1_M2, IN2_M2, EN_M2)],
+    "start_button": START_BUTTON_PIN,
+    "stop_button": STOP_BUTTON_PIN,
+}
+
+# Hardware handles, all from the hal.py backend (the Pi or the simulation). The Pi
+# libraries are only imported (and the pins claimed) by setup_hardware(), so importing
+# this file, --help and --dry-run stay fast
+backend = None  # hal.PiBackend / hal.SimBackend, opened by main() or setup_hardware()
+clock = hal.REAL_CLOCK  # every sleep goes through the backend's clock (simulation: faster than real time)
+GPIO = None
+pwm1 = None
+pwm2 = None
+kit = None
+valve = None  # hal.Relay on RELAY_PIN
+sensor1 = None  # ultrasonic sensor on TRIG1/ECHO1 (plant)
+sensor2 = None  # ultrasonic sensor on TRIG2/ECHO2 (table edge)
+sonar = None  # ranging.RangingService: pings both sensors in the background
+sonar_trace = None  # open file when started with --record-trace
+
+# Stop / end-of-table decisions (distance_filter.py): filtered distance predicted
+# STOP_LEAD_S ahead (half a ping interval + motor latency), only when its sigma is small enough
+PLANT_STOP_CM = 10
+TABLE_END_CM = 80
+STOP_LEAD_S = 0.08
+# "edges": echo timestamps from GPIO callbacks, no CPU while waiting, but callback latency
+# is distance error (0.1 ms = 1.7 cm). "poll": the old loop's accuracy with timeouts, at
+# ~2-25 ms of CPU per ping (ranging.py)
+SONAR_TIMING = "edges"
+# The table end is a step, the filter follows it only after ~190 ms: at 20 cm/s that plus
+# the braking distance used most of the ~10 cm the edge sensor looks ahead. Two agreeing
+# readings past TABLE_END_CM stop the robot at once; the filter then has END_CONFIRM_S to
+# agree, otherwise they were spikes and the robot drives on
+END_JUMP_READINGS = 2
+END_CONFIRM_S = 0.5
+
+def setup_hardware():
+    global backend, clock, GPIO, pwm1, pwm2, kit, valve, sensor1, sensor2, sonar
+    if GPIO is not None:
+        return  # already set up
+    if backend is None:
+        backend = hal.open_backend(wiring=WIRING)  # LEAFY_BACKEND, default the Pi
+    clock = backend.clock
+    gpio = backend.gpio
 
-def initialize():
-    global current_extend_angle, current_rotate_angle
-    # initialize the system
-    # initializing the start speed of the DC motors
-    pwm1.start(0)
-    pwm2.start(0)
-
-    # Deciding the initial angle that the servos will be
-    sleep(0.5)
-    #current_extend_angle = 0
-    #sleep(2)
-    #current_rotate_angle = 90
-    kit.servo[1].angle = 0   # extend servo
-    sleep(0.5)
-    kit.servo[0].angle = 90   # rotate servo
-
-    current_extend_angle = 0  # keep software in sync
-    current_rotate_angle = 90  # keep software in sync
-
-#emergency_triggered = False
+    # On Pi 5, this clears the lgpio chip handle
+    gpio.setmode(gpio.BCM)
 
-def eStop(channel=None):
-    global state, emergency_triggered
-    print("\n!!! EMERGENCY STOP TRIGGERED !!!")
-    
-    # Set the flag so the main loop knows to stop
-    #emergency_triggered = True
-    
-    # Physical stop actions
-    #stopDriving()
-    #sleep(2)
-    #extendArm(0)
-    #sleep(2)
-    #rotateArm(90)
-    
-    # OPTION A: Kill the program entirely (Safest)
-    #print("Shutting down program for safety...")
-    #os._exit(0)
-
-#GPIO.add_event_detect(
-#        STOP_BUTTON_PIN,
-#        GPIO.FALLING,
-#        callback=eStop,
-#        bouncetime=200
-#    )
+    # Setup pins
+    for p in motor_pins:
+        gpio.setup(p, gpio.OUT)
 
-def measuringDistance1():
-    # Distance sensor initialization - sensor measuring that a plant is nearby
-    # Trigger pulse
-    GPIO.output(TRIG1, True)
-    time.sleep(0.00001)
-    GPIO.output(TRIG1, False)
+    # PWM op beide motoren
+    pwm1 = backend.pwm(EN_M1, 1000)
+    pwm2 = backend.pwm(EN_M2, 1000)
 
-    # Waiting on echo start
-    start_time = time.time()
-    while GPIO.input(ECHO1) == 0:
-        start_time = time.time()
+    # Initialising statement stating that we will have access to 16 PWM channels of the HAT and to summon them we will use | kit |
+    kit = backend.servo_kit(channels=16)
 
-    # Waiting on echo end
-    stop_time = time.time()
-    while GPIO.input(ECHO1) == 1:
-        stop_time = time.time()
+    # Ultrasone sensoren: echo-flanken via edge events met tijdstempel (of begrensd pollen, SONAR_TIMING)
+    sensor1 = backend.sonar(TRIG1, ECHO1, name="plant", timing=SONAR_TIMING)
+    sensor2 = backend.sonar(TRIG2, ECHO2, name="edge", timing=SONAR_TIMING)
+    sonar = RangingService({"plant": sensor1, "edge": sensor2}, trace=sonar_trace, clock=clock)
 
-    # Time difference
-    time_elapsed = stop_time - start_time
+    # Setup the pin in the setup section
+    valve = backend.relay(RELAY_PIN)
+    gpio.setup(START_BUTTON_PIN, gpio.IN, pull_up_down=gpio.PUD_UP)
+    gpio.setup(STOP_BUTTON_PIN, gpio.IN, pull_up_down=gpio.PUD_UP)
+    GPIO = gpio
 
-    # Speed of sound: 34300 cm/s
-    distance1 = (time_elapsed * 34300) / 2
+# =====================================================================================
+# STATE MACHINE TIMING (seconds of clock time)
+# The per-plant cycle waits for what the robot is doing (arm moves, watering) instead of
+# fixed sleep(3)'s.
+PLANT_OFFSET_S = 1.0      # drive on after a plant is detected: sensor -> arm position
+STOP_SETTLE_S = 0.5       # robot at rest after stopDriving() (was sleep(3))
+ROTATE_DEG_S = 10         # arm rotation speed (the old step loop: 1 degree per 0.1 s)
+EXTEND_DEG_S = 1000       # arm extension speed (1 degree per 1 ms)
+SERVO_SETTLE_S = 0.3      # servo reaches the last commanded step (was sleep(3) after every move)
+SERVO_STEP_S = 0.02       # shortest time between two servo steps (fast moves take bigger steps)
+DRIP_S = 0.5              # after closing the valve, before the arm moves (was sleep(1) before and after)
+EXTEND_FIRST = 70         # arm position of the first watering
+EXTEND_SECOND = 70        # arm position of the second watering
+SENSE_INTERVAL_S = 0.03   # sensing task: collect new sonar readings (sonar pings every ~67 ms)
+ESTOP_POLL_S = 0.02       # E-stop task: stop button poll interval
+TELEMETRY_INTERVAL_S = 1.0
+# False: the arm is rotated back in before the robot drives on, as it always was.
+# True: it rotates back while the robot drives to the next plant (saves the ~9 s rotation
+# per plant), with the arm sticking out sideways at the start of the drive: only for a
+# table where nothing stands within the arm's reach between the plants
+ROTATE_BACK_WHILE_DRIVING = False
+
+asyncio = None  # imported by main() (~50 ms), like the Pi libraries in setup_hardware()
+
+cycles = []  # seconds per plant: start driving -> arm retracted
+cycle_start = None
+
+async def wait(seconds):
+    # asyncio.sleep in clock time (the simulation runs faster than real time)
+    await asyncio.sleep(clock.real_seconds(seconds))
 
-    return distance1
+def measuringDistance1():
+    # Distance sensor 1 - sensor measuring that a plant is nearby
+    # Newest reading of the ranging service in cm (no ping, returns instantly),
+    # NaN when the echo was missed or the reading is stale
+    return sonar.distance("plant")
 
 def measuringDistance2():
-    # Distance sensor initialization - sensor measuring that a plant is nearby
-    # Trigger pulse
-    GPIO.output(TRIG2, True)
-    time.sleep(0.00001)
-    GPIO.output(TRIG2, False)
-
-    # Waiting on echo start
-    start_time = time.time()
-    while GPIO.input(ECHO2) == 0:
-        start_time = time.time()
+    # Distance sensor 2 - sensor measuring the table edge
+    # Newest reading of the ranging service in cm (no ping, returns instantly),
+    # NaN when the echo was missed or the reading is stale
+    return sonar.distance("edge")
 
-    # Waiting on echo end
-    stop_time = time.time()
-    while GPIO.input(ECHO2) == 1:
-        stop_time = time.time()
-
-    # Time difference
-    time_elapsed = stop_time - start_time
-
-    # Speed of sound: 34300 cm/s
-    distance2 = (time_elapsed * 34300) / 2
+class Sensing:
+    """
+    Sensing task: feeds every new sonar reading into the filters (distance_filter.py) and
+    sets the plant / end-of-table events, whatever state the robot is in.
+    """
 
-    return distance2
+    def __init__(self):
+        # Decide on filtered readings: one spurious echo neither stops the robot nor ends the run
+        self.filters = {"plant": DistanceFilter(), "edge": DistanceFilter()}
+        self.plant_stop = ThresholdDetector(below=PLANT_STOP_CM, lead_s=STOP_LEAD_S)
+        self.table_end = ThresholdDetector(above=TABLE_END_CM)
+        self.table_end_jump = ThresholdDetector(above=TABLE_END_CM, jump_confirm=END_JUMP_READINGS)
+        self.plant = asyncio.Event()
+        self.end = asyncio.Event()  # filtered: the table has ended
+        self.end_suspect = asyncio.Event()  # the table may have ended: brake first
+        self.seq = {"plant": -1, "edge": -1}
+
+    def estimate(self, name):
+        return self.filters[name].estimate(clock.now())
+
+    def update(self):
+        for name, distance_filter in self.filters.items():
+            reading = sonar.latest(name)
+            if reading.seq > self.seq[name]:
+                self.seq[name] = reading.seq
+                distance_filter.update(reading.distance_cm, reading.timestamp)
+        now = clock.now()
+        if self.plant_stop.check(self.filters["plant"], now):
+            self.plant.set()
+        if self.table_end.check(self.filters["edge"], now):
+            self.end.set()
+            self.end_suspect.set()
+        elif self.table_end_jump.check(self.filters["edge"], now):
+            self.end_suspect.set()
+
+    async def run(self):
+        while True:
+            if sonar.running:
+                self.update()
+            await wait(SENSE_INTERVAL_S)
+
+class ArmServo:
+    """
+    One arm servo, moved in steps at deg_per_s without blocking the other tasks.
+    A new move takes over from wherever the previous one got to.
+    """
 
-def plantFound():
-    global state
-    while True:
-        distance1 = measuringDistance1()
-        distance2 = measuringDistance2()
-        
-        print(f"Dist 1: {distance1:.1f} cm | Dist 2: {distance2:.1f} cm")
-
-        # Specific check for Sensor 1
-        if distance1 < 10:
-            print("!!! PLANT DETECTED — STOPPING !!!")
-            sleep(1)
-            stopDriving()
-            break
-        
-        # Specific check for Sensor 2
-        elif distance2 > 80:
-            print("!!! END OF TABLE DETECTED — STOP !!!")
-            stopDriving()
-            os._exit(0)
-            break
+    def __init__(self, channel, angle, deg_per_s):
+        self.channel = channel
+        self.angle = angle  # last commanded angle (keeps the software in sync)
+        self.deg_per_s = deg_per_s
+        self.task = None
+
+    async def _steps(self, target):
+        step = max(1, round(self.deg_per_s * SERVO_STEP_S))  # degrees per step
+        while self.angle != target:
+            delta = max(-step, min(step, target - self.angle))
+            self.angle += delta
+            kit.servo[self.channel].angle = self.angle
+            await wait(abs(delta) / self.deg_per_s)
+
+    def start(self, target):
+        # Start moving to target in the background; returns the task
+        if self.task is not None:
+            self.task.cancel()
+        self.task = asyncio.ensure_future(self._steps(int(target)))
+        return self.task
+
+    async def move(self, target):
+        # Move to target and wait until the servo is there
+        await self.start(target)
+        await wait(SERVO_SETTLE_S)
+
+rotate_servo = None  # ArmServo on servo[0], 90 = arm in, 0 = rotated outward to the left
+extend_servo = None  # ArmServo on servo[1], 0 = retracted
+sensing = None  # Sensing, created by run()
 
-        time.sleep(0.1)
+def eStop(channel=None):
+    # Physical stop actions; the E-stop task then ends the state machine
+    print("\n!!! EMERGENCY STOP TRIGGERED !!!")
+    stopDriving()
+    solenoidValveClosed()
 
 def startDrivingF():
     GPIO.output(IN1_M1, GPIO.HIGH)
@@ -214,135 +269,292 @@ def stopDriving():
     GPIO.output(IN1_M2, GPIO.LOW)
     GPIO.output(IN2_M2, GPIO.LOW)
 
-def rotateArm(target_angle, step=1, delay=0.1):
-    """
-    Slowly extend/retract the arm on servo[1].
-    Moves from current_extend_angle to target_angle in small steps.
-    step  = degrees per step (smaller = smoother/slower)
-    delay = seconds between steps (larger = slower)
-    """
-    global current_rotate_angle
-
-    start = int(current_rotate_angle)
-    end = int(target_angle)
-
-    if end > start:
-        angle_range = range(start, end + 1, step)
-    else:
-        angle_range = range(start, end - 1, -step)
-
-    for angle in angle_range:
-        kit.servo[0].angle = angle
-        time.sleep(delay)
-
-    current_rotate_angle = target_angle
-
-    # control servo to move arm to pos (instant move)
-    #kit.servo[0].angle = pos
-
-def extendArm(target_angle, step=1, delay=0.001):
-    """
-    Slowly extend/retract the arm on servo[1].
-    Moves from current_extend_angle to target_angle in small steps.
-    step  = degrees per step (smaller = smoother/slower)
-    delay = seconds between steps (larger = slower)
-    """
-    global current_extend_angle
-
-    start = int(current_extend_angle)
-    end = int(target_angle)
-
-    if end > start:
-        angle_range = range(start, end + 1, step)
-    else:
-        angle_range = range(start, end - 1, -step)
-
-    for angle in angle_range:
-        kit.servo[1].angle = angle
-        time.sleep(delay)
-
-    current_extend_angle = target_angle
-
-def retractArm(pos):
-    kit.servo[1].angle = pos
-
 def solenoidValveOpen():
-    # If your relay is 'Active Low', use GPIO.LOW to turn it on
-    GPIO.output(RELAY_PIN, GPIO.HIGH)
+    # If your relay is 'Active Low', use backend.relay(RELAY_PIN, active_high=False)
+    valve.on()
     print("Valve is Open")
 
 def solenoidValveClosed():
-    # Use GPIO.HIGH to turn it off
-    GPIO.output(RELAY_PIN, GPIO.LOW)
+    valve.off()
     print("Valve is Closed")
 
-def wateringPlant():
-    sleep(1)
+async def wateringPlant():
     solenoidValveOpen()
-    sleep(wateringTime)  # wateringTime
+    await wait(wateringTime)  # wateringTime
     print(f"Watering time: {wateringTime}")
     solenoidValveClosed()
-    sleep(1)
+    await wait(DRIP_S)
 
 # =========================================================================================
-# LOOP
-while True:
-    # if GPIO.input(STOP_BUTTON_PIN) == GPIO.LOW:  # Button pressed
-    #     print("Emergency STOP button was pressed!")
-    #     eStop()
-
-    match state:
-        case 0:
-            initialize()
-            sleep(1)
-            state = 10
-
-        case 10:  # Standby, wait for start command
-            print("Waiting for initialization")
-            if GPIO.input(START_BUTTON_PIN) == GPIO.LOW:  # Button pressed
-                print("Programme is initiated!")
-                state = 20
-
-        case 20:  # Start driving until reached a plant
+# STATES
+# Every state is a coroutine that returns the name of the next state.
+
+async def state_init():
+    global rotate_servo, extend_servo
+    # initializing the start speed of the DC motors
+    pwm1.start(0)
+    pwm2.start(0)
+
+    # Deciding the initial angle that the servos will be
+    await wait(0.5)
+    kit.servo[1].angle = 0   # extend servo
+    await wait(0.5)
+    kit.servo[0].angle = 90   # rotate servo
+    extend_servo = ArmServo(1, 0, EXTEND_DEG_S)
+    rotate_servo = ArmServo(0, 90, ROTATE_DEG_S)
+
+    sonar.start()  # sensors are pinged in turn from now on, the sensing task only reads
+    return "standby"
+
+async def state_standby():
+    # Standby, wait for start command
+    print("Waiting for initialization")
+    while GPIO.input(START_BUTTON_PIN) != GPIO.LOW:  # Button pressed
+        await wait(0.05)
+    print("Programme is initiated!")
+    return "drive"
+
+async def table_end():
+    # Returns when the end of the table is confirmed. The robot stops on the first sign of it
+    # and drives on when the filter does not confirm it within END_CONFIRM_S
+    while True:
+        await sensing.end_suspect.wait()
+        stopDriving()
+        try:
+            await asyncio.wait_for(sensing.end.wait(), clock.real_seconds(END_CONFIRM_S))
+            return
+        except asyncio.TimeoutError:
+            print("!!! Far edge readings were not the table end — driving on !!!")
+            sensing.end_suspect.clear()
             startDrivingB()
-            state = 30
-
-        case 30:  # Driving stops because plant is reached
-            print("looking for plants!")
-            plantFound()
-            sleep(3)
-            state = 40
-
-        case 40:  # Arm is rotated outward to Left
-            rotateArm(0)
-            sleep(3)
-            state = 50
-
-        case 50:
-            extendArm(70)# Arm is extended to first position (slowly)
-            sleep(3)
-            state = 60
-
-        case 60:
-            wateringPlant()  # Solenoid valve opens and water goes to plant
-            state = 51
-
-        case 51:
-            extendArm(70) # Arm is extended further (slowly)
-            sleep(3)
-            state = 71
-
-        case 71:
-            wateringPlant()  # Solenoid valve opens and water goes to plant
-            state = 80
-
-        case 80:
-            retractArm(0)  # Arm retract (slowly)
-            state = 90
-
-        case 90:
-            rotateArm(90)
-            state = 10
-
-        case 999:
-            exit()
+
+async def state_drive():
+    # Drive until a plant (or the end of the table) is reached
+    global cycle_start
+    cycle_start = clock.now()
+    sensing.plant.clear()
+    sensing.end.clear()
+    sensing.end_suspect.clear()
+    startDrivingB()
+    print("looking for plants!")
+    plant = asyncio.ensure_future(sensing.plant.wait())
+    end = asyncio.ensure_future(table_end())
+    await asyncio.wait([plant, end], return_when=asyncio.FIRST_COMPLETED)
+    plant.cancel()
+    end.cancel()
+    if end.done() and not end.cancelled():
+        print("!!! END OF TABLE DETECTED — STOP !!!")
+        stopDriving()
+        return "end"
+    print("!!! PLANT DETECTED — STOPPING !!!")
+    print(f"Sonar: {sonar.metrics()} | filter: {sensing.filters['plant'].metrics()}")
+    return "stop_at_plant"
+
+async def state_stop_at_plant():
+    # Drive on until the arm is at the plant, unless the table ends first
+    startDrivingB()  # the plant can show up while the robot is stopped to confirm the table end
+    try:
+        await asyncio.wait_for(table_end(), clock.real_seconds(PLANT_OFFSET_S))
+        print("!!! END OF TABLE DETECTED — STOP !!!")
+        stopDriving()
+        return "end"
+    except asyncio.TimeoutError:
+        pass
+    stopDriving()
+    await wait(STOP_SETTLE_S)
+    return "rotate_out"
+
+async def state_rotate_out():
+    # Arm is rotated outward to Left (takes over from a rotation back that is still going)
+    await rotate_servo.move(0)
+    return "extend_first"
+
+async def state_extend_first():
+    await extend_servo.move(EXTEND_FIRST)  # Arm is extended to first position (slowly)
+    return "water_first"
+
+async def state_water_first():
+    await wateringPlant()  # Solenoid valve opens and water goes to plant
+    return "extend_second"
+
+async def state_extend_second():
+    await extend_servo.move(EXTEND_SECOND)  # Arm is extended further (slowly)
+    return "water_second"
+
+async def state_water_second():
+    await wateringPlant()  # Solenoid valve opens and water goes to plant
+    return "retract"
+
+async def state_retract():
+    await extend_servo.move(0)  # Arm retract
+    if ROTATE_BACK_WHILE_DRIVING:
+        rotate_servo.start(90)
+    else:
+        await rotate_servo.move(90)  # Arm is rotated back in before driving
+    cycles.append(clock.now() - cycle_start)
+    print(f"Plant {len(cycles)} done, cycle time {cycles[-1]:.1f} s")
+    return "standby"
+
+# name: (coroutine, timeout in s or None to wait as long as it takes). When a state
+# times out the robot stops, the valve closes and the run ends.
+STATES = {
+    "init": (state_init, 10),
+    "standby": (state_standby, None),
+    "drive": (state_drive, 120),
+    "stop_at_plant": (state_stop_at_plant, 5),
+    "rotate_out": (state_rotate_out, 90 / ROTATE_DEG_S + 5),
+    "extend_first": (state_extend_first, 5),
+    "water_first": (state_water_first, 30),
+    "extend_second": (state_extend_second, 5),
+    "water_second": (state_water_second, 30),
+    "retract": (state_retract, 90 / ROTATE_DEG_S + 5),
+}
+
+async def state_machine():
+    global state
+    state = "init"
+    while state != "end":
+        coroutine, timeout = STATES[state]
+        try:
+            next_state = await asyncio.wait_for(coroutine(), None if timeout is None else clock.real_seconds(timeout))
+        except asyncio.TimeoutError:
+            print(f"!!! STATE {state} TOOK LONGER THAN {timeout:.0f} s — STOPPING !!!")
+            stopDriving()
+            solenoidValveClosed()
+            next_state = "end"
+        print(f"[{clock.now():7.1f} s] {state} -> {next_state}")
+        state = next_state
+
+# =========================================================================================
+# CONCURRENT TASKS
+
+async def estop_monitor(machine):
+    while GPIO.input(STOP_BUTTON_PIN) != GPIO.LOW:  # Button pressed
+        await wait(ESTOP_POLL_S)
+    eStop(STOP_BUTTON_PIN)
+    machine.cancel()
+
+async def telemetry():
+    while True:
+        await wait(TELEMETRY_INTERVAL_S)
+        plant, edge = sensing.estimate("plant"), sensing.estimate("edge")
+        rates = " / ".join(f"{m['rate_hz']:.0f}" for m in sonar.metrics().values())
+        print(f"[{clock.now():7.1f} s] {state:13s} | Dist 1: {plant.distance_cm:5.1f} cm | "
+              f"Dist 2: {edge.distance_cm:5.1f} cm | sonar {rates} Hz | valve {'open' if valve.is_on else 'closed'}")
+
+async def run():
+    global sensing
+    setup_hardware()
+    sensing = Sensing()
+    pass_start, pass_start_real = clock.now(), time.perf_counter()
+
+    machine = asyncio.ensure_future(state_machine())
+    tasks = [
+        asyncio.ensure_future(sensing.run()),
+        asyncio.ensure_future(estop_monitor(machine)),
+        asyncio.ensure_future(telemetry()),
+    ]
+    try:
+        await machine
+    except asyncio.CancelledError:
+        print("State machine stopped by the E-stop")
+    finally:
+        for task in tasks:
+            task.cancel()
+        stopDriving()
+        valve.off()
+        sonar.stop()
+
+    elapsed = clock.now() - pass_start
+    print(f"Table pass: {len(cycles)} plants in {elapsed:.1f} s "
+          f"({elapsed / max(time.perf_counter() - pass_start_real, 1e-9):.0f}x real time)")
+    if cycles:
+        print(f"Cycle time per plant: mean {sum(cycles) / len(cycles):.1f} s, "
+              f"min {min(cycles):.1f} s, max {max(cycles):.1f} s")
+
+# =========================================================================================
+# MAIN
+def reset_run():
+    # Forget the hardware handles and results of the previous table pass (--runs)
+    global backend, clock, GPIO, pwm1, pwm2, kit, valve, sensor1, sensor2, sonar
+    global state, cycles, cycle_start, rotate_servo, extend_servo, sensing
+    backend, clock = None, hal.REAL_CLOCK
+    GPIO = pwm1 = pwm2 = kit = valve = sensor1 = sensor2 = sonar = None
+    state, cycles, cycle_start = None, [], None
+    rotate_servo = extend_servo = sensing = None
+
+def pass_summary(world):
+    # One line per simulated pass: plants watered, arm offset at the valve, where the robot ended
+    offsets = [abs(offset) for _, offset, _, _ in world.waterings]
+    watered = len({plant for plant, *_ in world.waterings})
+    offset = f"{max(offsets):4.1f} cm" if offsets else "   -   "
+    return (f"{watered}/{len(world.plants_cm)} plants watered, max arm offset {offset}, "
+            f"stopped at {world.x:5.1f} cm of {world.table_length_cm} cm")
+
+def main():
+    global sonar_trace, backend, asyncio
+    parser = argparse.ArgumentParser(description="Leafy watering robot: drive along the table and water every plant")
+    parser.add_argument("--dry-run", action="store_true", help="print the pin layout and settings without touching the hardware")
+    parser.add_argument("--record-trace", metavar="CSV", help="append every sonar reading to CSV (replay: distance_filter.py --trace)")
+    parser.add_argument("--backend", choices=["pi", "sim"], help="hardware backend (hal.py), default LEAFY_BACKEND or pi")
+    parser.add_argument("--speedup", type=float,
+                        help="sim backend: pace the simulation this many times faster than real time "
+                             "(default: virtual time, as fast as possible and reproducible)")
+    parser.add_argument("--seed", type=int, default=0, help="sim backend: seed of the sensor noise, spikes and lost echoes")
+    parser.add_argument("--runs", type=int, default=1, help="sim backend: passes with seeds seed, seed+1, ... and a summary")
+    parser.add_argument("--estop-at", type=float, help="sim backend: press the stop button at this many seconds")
+    args = parser.parse_args()
+    if args.dry_run:
+        print(f"Motors: M1 IN {IN1_M1}/{IN2_M1} EN {EN_M1}, M2 IN {IN1_M2}/{IN2_M2} EN {EN_M2}, speed {speed}")
+        print(f"Sonar: TRIG1/ECHO1 {TRIG1}/{ECHO1}, TRIG2/ECHO2 {TRIG2}/{ECHO2}, "
+              f"plant stop < {PLANT_STOP_CM} cm, table end > {TABLE_END_CM} cm")
+        print(f"Relay {RELAY_PIN}, start button {START_BUTTON_PIN}, stop button {STOP_BUTTON_PIN}, watering time {wateringTime} s")
+        print("States: " + ", ".join(f"{name} ({'-' if t is None else f'{t:.0f} s'})" for name, (_, t) in STATES.items()))
+        return
+    if args.runs > 1 and (args.backend or os.environ.get("LEAFY_BACKEND")) != "sim":
+        parser.error("--runs needs the sim backend")
+    if args.record_trace:
+        sonar_trace = open(args.record_trace, "a", buffering=1)  # line-buffered, nothing lost on a crash
+
+    import asyncio  # binds the module-level handle (see above)
+    import contextlib
+    import io
+
+    failed, summaries = 0, []
+    for seed in range(args.seed, args.seed + args.runs):
+        reset_run()
+        backend = hal.open_backend(args.backend, speedup=args.speedup, wiring=WIRING, estop_at_s=args.estop_at, seed=seed)
+        # A sweep prints one line per pass instead of the whole log
+        log = contextlib.redirect_stdout(io.StringIO()) if args.runs > 1 else contextlib.nullcontext()
+        with log:
+            try:
+                backend.clock.run(run())
+            finally:
+                backend.close()
+        problems = backend.problems()
+        failed += bool(problems)
+        if args.runs > 1:
+            summaries.append((backend.world, list(cycles)))
+            print(f"seed {seed:3d}: {pass_summary(backend.world)}"
+                  f"{'' if not problems else ' — FAILED: ' + '; '.join(problems)}")
+        elif problems:
+            sys.exit("Simulated pass failed: " + "; ".join(problems))
+
+    if summaries:
+        worlds = [world for world, _ in summaries]
+        all_cycles = [c for _, pass_cycles in summaries for c in pass_cycles]
+        offsets = sorted(abs(offset) for world in worlds for _, offset, _, _ in world.waterings)
+        margins = [world.table_length_cm - world.x for world in worlds]
+        print(f"\n{len(worlds)} passes: {failed} failed, {sum(w.fell_off for w in worlds)} fell off the table, "
+              f"{sum(len({plant for plant, *_ in w.waterings}) for w in worlds)} of {sum(len(w.plants_cm) for w in worlds)} plants watered")
+        if offsets:
+            print(f"arm offset at the valve: median {offsets[len(offsets) // 2]:.1f} cm, max {offsets[-1]:.1f} cm")
+        print(f"distance to the table end when stopped: min {min(margins):.1f} cm, max {max(margins):.1f} cm")
+        if all_cycles:
+            print(f"cycle time per plant: mean {sum(all_cycles) / len(all_cycles):.1f} s, max {max(all_cycles):.1f} s")
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,18 @@
 # ============================================================
 
 import os
+import sys
+import csv
+import time
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
 from glob import glob
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# De gedeelde analysecode staat in de AI-map
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "AI"))
+from green_metrics import MetricsBuffers, compute_plant_metrics
+from image_cache import ImageCache
 
 # ------------------------------------------------------------
 # CONFIGURATIE
@@ -16,6 +24,12 @@ show_visuals = True              # Visualisatie aan/uit
 save_results = False             # Resultaten opslaan in CSV
 output_csv = "green_analysis_results.csv"  # Naam CSV-bestand
 
+batch_mode = False               # Headless batch: afbeeldingen verdelen over meerdere processen
+num_workers = None               # Aantal processen (None = alle CPU-cores)
+batch_chunksize = 4              # Aantal afbeeldingen per taak voor een worker
+
+use_cache = False                # Gedecodeerde beelden + HSV uit image_cache/ lezen (schrijft ca. 3 GB voor test_set!)
+
 # ------------------------------------------------------------
 # KLEURDEFINITIES (HSV)
 # ------------------------------------------------------------
@@ -23,138 +37,79 @@ GREEN_LOWER = np.array([21, 26, 26])  # Minimum HSV-waarden voor groen
 GREEN_UPPER = np.array([95, 255, 255])  # Maximum HSV-waarden voor groen
 DARK_GREEN_MAX_V = 100                # Maximale brightness voor donkergroen
 
-# ------------------------------------------------------------
-# RESULTATEN OPSLAG
-# ------------------------------------------------------------
-results = []  # Hier slaan we de resultaten per afbeelding op
+CSV_HEADER = [
+    "file_name",
+    "class_name",
+    "green_ratio",
+    "dark_green_ratio",
+    "mean_green_saturation",
+    "top_pixel",
+    "bottom_pixel",
+    "plant_height",
+]
 
 # ------------------------------------------------------------
 # FUNCTIES
 # ------------------------------------------------------------
-def is_valid_pixel(y, x, mask, radius=3, threshold=0.75):
-    """
-    Controleer of een pixel 'groen genoeg' is door een vierkante patch rond de pixel te bekijken.
-    radius: grootte van de patch (in pixels)
-    threshold: minimaal percentage pixels dat groen moet zijn
-    """
-    h, w = mask.shape
-    y0 = max(0, y - radius)
-    y1 = min(h, y + radius + 1)
-    x0 = max(0, x - radius)
-    x1 = min(w, x + radius + 1)
-    patch = mask[y0:y1, x0:x1]
-    return (np.count_nonzero(patch) / patch.size) >= threshold  # True als genoeg pixels groen zijn
+def list_images(folder):
+    """Alle JPG/JPEG-afbeeldingen in submappen van folder."""
+    return glob(os.path.join(folder, "*/*.jpg")) + \
+           glob(os.path.join(folder, "*/*.jpeg")) + \
+           glob(os.path.join(folder, "*/*.JPG")) + \
+           glob(os.path.join(folder, "*/*.JPEG"))
 
 
-def connected_vertically(y, x, mask, direction='up', length=10, min_ratio=0.5):
-    """
-    Controleer of een pixel verticaal verbonden is met andere groene pixels.
-    direction: 'up' of 'down'
-    length: aantal pixels verticaal dat gecontroleerd wordt
-    min_ratio: minimaal percentage pixels dat groen moet zijn om geldig te zijn
-    """
-    h, w = mask.shape
-    connected_rows = 0
+buffers = None  # Voorgealloceerde buffers (MetricsBuffers), hergebruikt zolang de beeldgrootte gelijk blijft
+image_cache = None  # ImageCache van image_folder, per proces geopend bij het eerste gebruik
 
-    if direction == 'up':
-        for dy in range(1, length + 1):
-            if y - dy < 0:
-                break
-            if mask[y - dy, x] > 0:
-                connected_rows += 1
-    else:  # down
-        for dy in range(1, length + 1):
-            if y + dy >= h:
-                break
-            if mask[y + dy, x] > 0:
-                connected_rows += 1
 
-    return (connected_rows / length) >= min_ratio  # True als voldoende pixels verbonden zijn
+def load_image(img_path):
+    """(image_bgr, hsv) uit de cache, of (image_bgr, None) direct gedecodeerd. None als onleesbaar."""
+    global image_cache
+    if not use_cache:
+        image_bgr = cv2.imread(img_path)
+        return (image_bgr, None) if image_bgr is not None else None
+    if image_cache is None:
+        image_cache = ImageCache(image_folder)
+    return image_cache.load(img_path)
 
 
-# ------------------------------------------------------------
-# AFBEELDINGEN VERWERKEN
-# ------------------------------------------------------------
-# Alle JPG/JPEG-afbeeldingen in submappen van image_folder
-image_paths = glob(os.path.join(image_folder, "*/*.jpg")) + \
-              glob(os.path.join(image_folder, "*/*.jpeg")) + \
-              glob(os.path.join(image_folder, "*/*.JPG")) + \
-              glob(os.path.join(image_folder, "*/*.JPEG"))
-
-for img_path in image_paths:
-    image_bgr = cv2.imread(img_path)  # Lees afbeelding in BGR
-    if image_bgr is None:
-        continue
+def analyze_image(img_path):
+    """
+    Analyseer een afbeelding.
+    Geeft (resultaatrij, image_bgr) terug, of None als de afbeelding niet leesbaar is.
+    Het groene masker van deze afbeelding staat daarna in buffers.green.
+    """
+    global buffers
+    loaded = load_image(img_path)  # Lees afbeelding in BGR (en HSV uit de cache)
+    if loaded is None:
+        return None
+    image_bgr, hsv = loaded
 
-    image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)  # Converteer naar RGB
-    hsv = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2HSV)        # Converteer naar HSV
+    if buffers is None or not buffers.fits(image_bgr):
+        buffers = MetricsBuffers(image_bgr.shape)
 
     # --------------------------------------------------------
-    # GROENE PIXELS DETECTEREN
+    # GROENE PIXELS, PLANT HOOGTE EN METRIEKEN
     # --------------------------------------------------------
-    green_mask = cv2.inRange(hsv, GREEN_LOWER, GREEN_UPPER)  # Masker voor alle groene pixels
-    dark_green_mask = green_mask.copy()
-    dark_green_mask[hsv[:, :, 2] > DARK_GREEN_MAX_V] = 0     # Alleen donkergroen
-
-    # --------------------------------------------------------
-    # PLANT HOOGTE SCHATTEN
-    # --------------------------------------------------------
-    h, w = green_mask.shape
-    center_strip = green_mask[:, w // 2 - w // 20: w // 2 + w // 20]  # Centrale verticale strook
-
-    top_pixel = bottom_pixel = None
+    # HSV, groen masker, top/bottom in de centrale strook en de metrieken binnen
+    # de rijen [top, bottom], zonder kopieen van de maskers (zie green_metrics.py)
     vertical_check_len = 10        # Aantal pixels verticaal om connectie te checken
     vertical_min_ratio = 0.6       # Percentage verbonden pixels dat groen moet zijn
 
-    # Zoek bottom pixel
-    for y in reversed(range(center_strip.shape[0])):
-        xs = np.where(center_strip[y, :] > 0)[0]
-        for x in xs:
-            if (
-                is_valid_pixel(y, x, center_strip, radius=3, threshold=0.75)
-                and connected_vertically(y, x, center_strip, direction='up', length=vertical_check_len, min_ratio=vertical_min_ratio)
-            ):
-                bottom_pixel = y
-                break
-        if bottom_pixel is not None:
-            break
-
-    # Zoek top pixel
-    for y in range(center_strip.shape[0]):
-        xs = np.where(center_strip[y, :] > 0)[0]
-        for x in xs:
-            if (
-                is_valid_pixel(y, x, center_strip, radius=3, threshold=0.75)
-                and connected_vertically(y, x, center_strip, direction='down', length=vertical_check_len, min_ratio=vertical_min_ratio)
-            ):
-                top_pixel = y
-                break
-        if top_pixel is not None:
-            break
-
-    plant_height = (bottom_pixel - top_pixel) if top_pixel is not None and bottom_pixel is not None else None
-
-    # --------------------------------------------------------
-    # BEPERK GROENE PIXELS TOT PLANTGEBIED
-    # --------------------------------------------------------
-    restricted_green_mask = green_mask.copy()
-    if top_pixel is not None and bottom_pixel is not None:
-        restricted_green_mask[:top_pixel, :] = 0
-        restricted_green_mask[bottom_pixel + 1:, :] = 0
-
-    restricted_dark_green_mask = dark_green_mask.copy()
-    restricted_dark_green_mask[restricted_green_mask == 0] = 0
-
-    # --------------------------------------------------------
-    # METRIEKEN BEREKENEN
-    # --------------------------------------------------------
-    total_pixels = image_rgb.shape[0] * image_rgb.shape[1]  # Totaal aantal pixels in afbeelding
-    green_pixels = np.count_nonzero(restricted_green_mask)  # Aantal groene pixels
-    dark_green_pixels = np.count_nonzero(restricted_dark_green_mask)
-
-    green_ratio = (green_pixels / total_pixels) * 100      # % groene pixels
-    dark_green_ratio = (dark_green_pixels / total_pixels) * 100
-    mean_green_saturation = np.mean(hsv[:, :, 1][restricted_green_mask > 0]) if green_pixels > 0 else 0
+    green_ratio, dark_green_ratio, mean_green_saturation, top_pixel, bottom_pixel, plant_height = \
+        compute_plant_metrics(
+            image_bgr,
+            buffers,
+            GREEN_LOWER,
+            GREEN_UPPER,
+            DARK_GREEN_MAX_V,
+            radius=3,
+            threshold=0.75,
+            vertical_check_len=vertical_check_len,
+            vertical_min_ratio=vertical_min_ratio,
+            hsv=hsv,
+        )
 
     # --------------------------------------------------------
     # RESULTATEN OPSLAAN
@@ -162,57 +117,79 @@ for img_path in image_paths:
     class_name = os.path.basename(os.path.dirname(img_path))  # Naam van de klasse/submap
     file_name = os.path.basename(img_path)                    # Bestandsnaam
 
-    results.append([
+    row = [
         file_name,
         class_name,
-        green_ratio,
-        dark_green_ratio,
-        mean_green_saturation,
+        float(green_ratio),
+        float(dark_green_ratio),
+        float(mean_green_saturation),
         top_pixel,
         bottom_pixel,
         plant_height
-    ])
+    ]
+    return row, image_bgr
 
-    # --------------------------------------------------------
-    # VISUALISATIE
-    # --------------------------------------------------------
-    if show_visuals:
-        overlay = image_rgb.copy()
-        overlay[restricted_green_mask > 0] = [0, 255, 0]  # Groen overlay
-        overlay = cv2.addWeighted(image_rgb, 0.7, overlay, 0.3, 0)
 
-        line_start_x = int(0.15 * w)
-        line_end_x = int(0.85 * w)
+def analyze_chunk(img_paths):
+    """Worker-taak voor batch mode: alleen de resultaatrijen, geen beelden terugsturen."""
+    rows = []
+    for img_path in img_paths:
+        result = analyze_image(img_path)
+        if result is not None:
+            rows.append(result[0])
+    return rows
 
-        if top_pixel is not None:
-            cv2.line(overlay, (line_start_x, top_pixel), (line_end_x, top_pixel), (255, 0, 0), 2)
-        if bottom_pixel is not None:
-            cv2.line(overlay, (line_start_x, bottom_pixel), (line_end_x, bottom_pixel), (255, 0, 0), 2)
 
-        plt.figure(figsize=(12, 4))
-        plt.suptitle(file_name)
+def show_result(row, image_bgr, green_mask):
+    """Toon origineel, masker en overlay met top/bottom lijnen."""
+    import matplotlib.pyplot as plt
 
-        plt.subplot(1, 3, 1)
-        plt.title("Original")
-        plt.imshow(image_rgb)
-        plt.axis("off")
+    file_name, top_pixel, bottom_pixel = row[0], row[5], row[6]
+    image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)  # Converteer naar RGB
+    w = image_rgb.shape[1]
 
-        plt.subplot(1, 3, 2)
-        plt.title("Restricted green mask")
-        plt.imshow(restricted_green_mask, cmap="gray")
-        plt.axis("off")
+    # Groene pixels beperkt tot het plantgebied (alleen nodig voor de visualisatie)
+    restricted_green_mask = green_mask.copy()
+    if top_pixel is not None and bottom_pixel is not None:
+        restricted_green_mask[:top_pixel, :] = 0
+        restricted_green_mask[bottom_pixel + 1:, :] = 0
 
-        plt.subplot(1, 3, 3)
-        plt.title("Green overlay + top/bottom")
-        plt.imshow(overlay)
-        plt.axis("off")
+    overlay = image_rgb.copy()
+    overlay[restricted_green_mask > 0] = [0, 255, 0]  # Groen overlay
+    overlay = cv2.addWeighted(image_rgb, 0.7, overlay, 0.3, 0)
 
-        plt.tight_layout()
-        plt.show()
+    line_start_x = int(0.15 * w)
+    line_end_x = int(0.85 * w)
 
-    # --------------------------------------------------------
-    # CONSOLE OUTPUT
-    # --------------------------------------------------------
+    if top_pixel is not None:
+        cv2.line(overlay, (line_start_x, top_pixel), (line_end_x, top_pixel), (255, 0, 0), 2)
+    if bottom_pixel is not None:
+        cv2.line(overlay, (line_start_x, bottom_pixel), (line_end_x, bottom_pixel), (255, 0, 0), 2)
+
+    plt.figure(figsize=(12, 4))
+    plt.suptitle(file_name)
+
+    plt.subplot(1, 3, 1)
+    plt.title("Original")
+    plt.imshow(image_rgb)
+    plt.axis("off")
+
+    plt.subplot(1, 3, 2)
+    plt.title("Restricted green mask")
+    plt.imshow(restricted_green_mask, cmap="gray")
+    plt.axis("off")
+
+    plt.subplot(1, 3, 3)
+    plt.title("Green overlay + top/bottom")
+    plt.imshow(overlay)
+    plt.axis("off")
+
+    plt.tight_layout()
+    plt.show()
+
+
+def print_result(row):
+    file_name, class_name, green_ratio, dark_green_ratio, mean_green_saturation, top_pixel, bottom_pixel, plant_height = row
     print(f"\nAfbeelding: {file_name} ({class_name})")
     print(f"Percentage groene pixels (plant-only): {green_ratio:.2f}%")
     print(f"Percentage donkergroene pixels: {dark_green_ratio:.2f}%")
@@ -221,13 +198,90 @@ for img_path in image_paths:
     print(f"Bottom pixel: {bottom_pixel}")
     print(f"Geschatte plant hoogte (pixels): {plant_height}")
 
-# =============================================================
-# STATISTIEKEN OVER ALLE AFBEELDINGEN
-# =============================================================
-green_ratios = [r[2] for r in results if r[2] is not None]
-heights = [r[7] for r in results if r[7] is not None]
 
-if green_ratios and heights:
-    print("\n--- STATISTIEKEN OVER ALLE AFBEELDINGEN ---")
-    print(f"Green leaf % - Gemiddeld: {np.mean(green_ratios):.2f}, Min: {np.min(green_ratios):.2f}, Max: {np.max(green_ratios):.2f}")
-    print(f"Plant height - Gemiddeld: {np.mean(heights):.2f}, Min: {np.min(heights):.2f}, Max: {np.max(heights):.2f}")
+def print_statistics(results):
+    green_ratios = [r[2] for r in results if r[2] is not None]
+    heights = [r[7] for r in results if r[7] is not None]
+
+    if green_ratios and heights:
+        print("\n--- STATISTIEKEN OVER ALLE AFBEELDINGEN ---")
+        print(f"Green leaf % - Gemiddeld: {np.mean(green_ratios):.2f}, Min: {np.min(green_ratios):.2f}, Max: {np.max(green_ratios):.2f}")
+        print(f"Plant height - Gemiddeld: {np.mean(heights):.2f}, Min: {np.min(heights):.2f}, Max: {np.max(heights):.2f}")
+
+
+def run_serial(image_paths):
+    results = []  # Hier slaan we de resultaten per afbeelding op
+
+    for img_path in image_paths:
+        result = analyze_image(img_path)
+        if result is None:
+            continue
+
+        row, image_bgr = result
+        results.append(row)
+
+        if show_visuals:
+            show_result(row, image_bgr, buffers.green)
+        print_result(row)
+
+    if save_results:
+        with open(output_csv, "w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(CSV_HEADER)
+            writer.writerows(results)
+        print(f"\nResultaten opgeslagen in: {output_csv}")
+
+    return results
+
+
+def run_batch(image_paths, workers=None, chunksize=4):
+    """
+    Headless batch: verdeel de afbeeldingen in chunks over een ProcessPoolExecutor.
+    Rijen worden direct naar output_csv geschreven in de volgorde waarin ze klaar zijn.
+    """
+    results = []
+    chunks = [image_paths[i:i + chunksize] for i in range(0, len(image_paths), chunksize)]
+    start = time.perf_counter()
+
+    with open(output_csv, "w", newline="", encoding="utf-8") as csvfile, \
+            ProcessPoolExecutor(max_workers=workers) as executor:
+        writer = csv.writer(csvfile)
+        writer.writerow(CSV_HEADER)
+
+        futures = [executor.submit(analyze_chunk, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            rows = future.result()
+            writer.writerows(rows)
+            csvfile.flush()
+            results.extend(rows)
+
+    elapsed = time.perf_counter() - start
+    used_workers = workers or os.cpu_count()
+    print(f"\n{len(results)} afbeeldingen in {elapsed:.2f} s "
+          f"({len(results) / elapsed:.2f} afbeeldingen/s, {used_workers} workers, chunks van {chunksize})")
+    print(f"Resultaten opgeslagen in: {output_csv}")
+    return results
+
+
+# ------------------------------------------------------------
+# AFBEELDINGEN VERWERKEN
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    if not os.path.isdir(image_folder):
+        sys.exit(f"Map met testafbeeldingen niet gevonden: {os.path.abspath(image_folder)} "
+                 f"(pas image_folder aan of start het script vanuit de map waarin '{image_folder}' staat)")
+    if use_cache:
+        image_cache = ImageCache(image_folder)  # manifest: alleen gewijzigde bestanden opnieuw hashen
+        image_paths = image_cache.paths()
+    else:
+        image_paths = list_images(image_folder)
+
+    if batch_mode:
+        results = run_batch(image_paths, workers=num_workers, chunksize=batch_chunksize)
+    else:
+        results = run_serial(image_paths)
+
+    # =============================================================
+    # STATISTIEKEN OVER ALLE AFBEELDINGEN
+    # =============================================================
+    print_statistics(results)
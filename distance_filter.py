@@ -0,0 +1,389 @@
+# ============================================================
+# distance_filter.py
+# Streaming outlier-rejecting filter for the ultrasonic distances
+# ============================================================
+#
+# plantFound() used to act on single raw readings: one short spurious
+# echo below 10 cm stopped the robot next to nothing, one long echo
+# above 80 cm ended the run. DistanceFilter turns the stream of
+# readings of one sensor into a distance + velocity estimate, O(1) per
+# sample:
+#
+#   1. misses (NaN) are counted and skipped, the estimate coasts
+#   2. rolling median of the last 3 readings: a single spike never gets
+#      through; the median keeps the timestamp of the reading it came
+#      from, so a steady approach is not delayed by the window
+#   3. constant-velocity Kalman filter (distance, closing velocity) with
+#      an innovation gate: medians more than gate_sigma standard
+#      deviations away are rejected; when reset_after raw readings in a
+#      row are rejected and agree with each other, the target really
+#      changed (a plant came into view, the table ended) and the filter
+#      restarts at the new distance. The first readings are confirmed
+#      the same way, so a spike is never the starting point
+#
+# ThresholdDetector makes the decisions: distance predicted lead_s
+# ahead (the velocity covers the sensing and motor latency) below /
+# above a threshold, and only when the predicted standard deviation is
+# below max_sigma_cm. A step has no velocity to predict with, and the
+# filter only follows it after the median and the restart (three
+# readings, ~190 ms at 15 Hz); for the table end that is driving
+# distance the robot does not have. With jump_confirm the detector also
+# fires on that many raw readings in a row past the threshold that agree
+# with each other: the floor behind the table end is one distance,
+# random spikes almost never agree.
+#
+# Validation on simulated approach / table-end traces (noise, spikes,
+# lost echoes) at several driving speeds, raw rule vs filter:
+#     python distance_filter.py [--runs 200]
+# Replay a trace recorded on the robot (FinalBEAST42.py --record-trace):
+#     python distance_filter.py --trace trace.csv
+# ============================================================
+
+import bisect
+import math
+from collections import deque, namedtuple
+
+# distance_cm / velocity_cm_s: NaN before the first reading; velocity < 0 = closing in
+Estimate = namedtuple("Estimate", ["distance_cm", "velocity_cm_s", "sigma_cm", "timestamp"])
+
+
+class RollingMedian:
+    """Median of the last window readings, O(window) per push with window a small constant."""
+
+    def __init__(self, window=3):
+        self.window = window
+        self.values = deque()      # (value, timestamp) in arrival order
+        self.sorted_values = []    # the same tuples sorted by value
+
+    def push(self, value, timestamp):
+        """Add a reading; returns (median, timestamp of the reading that is the median)."""
+        self.values.append((value, timestamp))
+        bisect.insort(self.sorted_values, (value, timestamp))
+        if len(self.values) > self.window:
+            self.sorted_values.remove(self.values.popleft())
+        return self.sorted_values[len(self.sorted_values) // 2]
+
+    def clear(self):
+        self.values.clear()
+        self.sorted_values = []
+
+
+class ConstantVelocityKalman:
+    """
+    State: distance (cm) and velocity (cm/s), 2x2 covariance in plain floats.
+    accel_sigma: random acceleration of the robot / target (cm/s^2)
+    meas_sigma_cm: noise of one (median) reading
+    velocity_sigma0: uncertainty of the velocity after a (re)start
+    gate_sigma: readings further than this many standard deviations are rejected
+    reset_after: (re)start at the reading after this many rejections in a row that agree
+        with each other (a new target; random spikes do not agree); the first readings
+        go the same way, so a spike cannot be the starting point either
+    """
+
+    def __init__(self, accel_sigma=50.0, meas_sigma_cm=0.5, velocity_sigma0=50.0, gate_sigma=4.0, reset_after=2):
+        self.q = accel_sigma ** 2
+        self.r = meas_sigma_cm ** 2
+        self.velocity_var0 = velocity_sigma0 ** 2
+        self.gate_sigma = gate_sigma
+        self.reset_after = reset_after
+        self.initialized = False
+        self.d = self.v = math.nan
+        self.p00 = self.p01 = self.p11 = math.inf
+        self.timestamp = None
+        self.rejected_in_row = 0
+        self.last_rejected = (math.nan, None)  # (reading, timestamp) of the last rejection
+        self.rejected = 0
+        self.resets = 0
+
+    def reset(self, z, timestamp):
+        self.d, self.v = z, 0.0
+        self.p00, self.p01, self.p11 = self.r, 0.0, self.velocity_var0
+        self.timestamp = timestamp
+        self.rejected_in_row = 0
+        self.last_rejected = (math.nan, None)
+        if self.initialized:
+            self.resets += 1
+        self.initialized = True
+
+    def predicted(self, timestamp):
+        """(distance, velocity, distance variance) at timestamp, without changing the state."""
+        if not self.initialized:
+            return math.nan, math.nan, math.inf
+        dt = timestamp - self.timestamp
+        var = self.p00 + dt * (2 * self.p01 + dt * self.p11) + self.q * dt ** 4 / 4
+        return self.d + self.v * dt, self.v, var
+
+    def _predict(self, timestamp):
+        dt = timestamp - self.timestamp
+        if dt <= 0:
+            return
+        p00, p01, p11 = self.p00, self.p01, self.p11
+        self.d += self.v * dt
+        self.p00 = p00 + dt * (2 * p01 + dt * p11) + self.q * dt ** 4 / 4
+        self.p01 = p01 + dt * p11 + self.q * dt ** 3 / 2
+        self.p11 = p11 + self.q * dt ** 2
+        self.timestamp = timestamp
+
+    def update(self, z, timestamp, raw=None):
+        """
+        Fuse one reading; returns False when it was rejected by the gate (or is not confirmed yet).
+        raw: (reading, timestamp) of the newest raw reading when z is a median; rejections are
+        confirmed on the raw readings, which are all different samples.
+        """
+        reading, reading_time = raw if raw is not None else (z, timestamp)
+        if self.initialized:
+            if timestamp < self.timestamp:
+                # The median can be a reading one sample older than the last one: move it to now
+                z += self.v * (self.timestamp - timestamp)
+                timestamp = self.timestamp
+            self._predict(timestamp)
+            s = self.p00 + self.r
+            y = z - self.d
+        if not self.initialized or y * y > self.gate_sigma ** 2 * s:
+            if self.initialized:
+                self.rejected += 1
+            self._confirm(reading, reading_time)
+            return False
+        self.rejected_in_row = 0
+        self.last_rejected = (math.nan, None)
+        k0, k1 = self.p00 / s, self.p01 / s
+        p00, p01, p11 = self.p00, self.p01, self.p11
+        self.d += k0 * y
+        self.v += k1 * y
+        self.p00 = (1 - k0) * p00
+        self.p01 = (1 - k0) * p01
+        self.p11 = p11 - k1 * p01
+        return True
+
+    def _confirm(self, reading, reading_time):
+        # Count rejected readings that agree with the previous one: same target, moving
+        # at most 2 velocity_sigma0; restart there after reset_after of them
+        last_reading, last_time = self.last_rejected
+        tolerance = self.gate_sigma * math.sqrt(2 * self.r)
+        if last_time is not None:
+            tolerance += 2 * math.sqrt(self.velocity_var0) * abs(reading_time - last_time)
+        if abs(reading - last_reading) <= tolerance:
+            self.rejected_in_row += 1
+        else:
+            self.rejected_in_row = 1
+        self.last_rejected = (reading, reading_time)
+        if self.rejected_in_row >= self.reset_after:
+            self.reset(reading, reading_time)
+
+
+class DistanceFilter:
+    """Rolling median + constant-velocity Kalman for the readings of one sensor (see the top of the file)."""
+
+    def __init__(self, median_window=3, **kalman_kwargs):
+        self.median = RollingMedian(median_window)
+        self.kalman = ConstantVelocityKalman(**kalman_kwargs)
+        self.raw = deque(maxlen=4)  # newest (reading, timestamp) pairs, misses left out
+        self.samples = 0
+        self.misses = 0
+
+    def update(self, distance_cm, timestamp):
+        """Add one reading (NaN = miss); returns the estimate at timestamp."""
+        self.samples += 1
+        if math.isnan(distance_cm):
+            self.misses += 1
+        else:
+            self.raw.append((distance_cm, timestamp))
+            z, t = self.median.push(distance_cm, timestamp)
+            accepted = self.kalman.update(z, t, raw=(distance_cm, timestamp))
+            if not accepted and self.kalman.rejected_in_row == 0:
+                self.median.clear()  # restarted on a new target: forget the old readings
+                self.median.push(distance_cm, timestamp)
+        return self.estimate(timestamp)
+
+    def estimate(self, timestamp):
+        """Estimate at any time (past the last reading = prediction)."""
+        d, v, var = self.kalman.predicted(timestamp)
+        return Estimate(d, v, math.sqrt(var), timestamp)
+
+    def recent(self, n):
+        """The newest n raw readings (misses left out), oldest first; fewer before n arrived."""
+        return [z for z, _ in list(self.raw)[-n:]]
+
+    def metrics(self):
+        return {
+            "samples": self.samples,
+            "misses": self.misses,
+            "rejected": self.kalman.rejected,
+            "resets": self.kalman.resets,
+        }
+
+
+class ThresholdDetector:
+    """
+    Fires when the distance predicted lead_s ahead is below `below` (or above `above`)
+    and its standard deviation is at most max_sigma_cm.
+    jump_confirm: also fire when this many raw readings in a row are past the threshold
+        and lie within jump_agree_cm of each other (a step, before the filter follows it)
+    """
+
+    def __init__(self, below=None, above=None, lead_s=0.0, max_sigma_cm=2.0, jump_confirm=None, jump_agree_cm=5.0):
+        self.below = below
+        self.above = above
+        self.lead_s = lead_s
+        self.max_sigma_cm = max_sigma_cm
+        self.jump_confirm = jump_confirm
+        self.jump_agree_cm = jump_agree_cm
+
+    def past(self, distance_cm):
+        if self.below is not None and distance_cm < self.below:
+            return True
+        return self.above is not None and distance_cm > self.above
+
+    def check(self, distance_filter, now):
+        if self.jump_confirm:
+            recent = distance_filter.recent(self.jump_confirm)
+            if (len(recent) == self.jump_confirm and all(self.past(z) for z in recent)
+                    and max(recent) - min(recent) <= self.jump_agree_cm):
+                return True
+        estimate = distance_filter.estimate(now + self.lead_s)
+        if not estimate.sigma_cm <= self.max_sigma_cm:  # also False for NaN / inf
+            return False
+        return self.past(estimate.distance_cm)
+
+
+# ------------------------------------------------------------
+# VALIDATION
+# ------------------------------------------------------------
+def simulate_trace(true_distance, duration_s, rng, period_s=0.0666, jitter_s=0.002,
+                   noise_cm=0.5, spike_rate=0.05, miss_rate=0.05):
+    """
+    Readings of a simulated sensor: list of (timestamp, reading, true distance).
+    true_distance(t) -> cm; spikes are uniform 3-200 cm, misses are NaN.
+    """
+    trace = []
+    t = 0.0
+    while t < duration_s:
+        d = true_distance(t)
+        u = rng.random()
+        if u < miss_rate:
+            z = math.nan
+        elif u < miss_rate + spike_rate:
+            z = rng.uniform(3, 200)
+        else:
+            z = d + rng.normal(0, noise_cm)
+        trace.append((t, z, d))
+        t += period_s + rng.uniform(-jitter_s, jitter_s)
+    return trace
+
+
+def first_decision(trace, rule):
+    """Timestamp of the first reading where rule(timestamp, reading) is True, or None."""
+    for t, z, _ in trace:
+        if rule(t, z):
+            return t
+    return None
+
+
+def filter_rule(detector, **filter_kwargs):
+    distance_filter = DistanceFilter(**filter_kwargs)
+
+    def rule(t, z):
+        distance_filter.update(z, t)
+        return detector.check(distance_filter, t)
+    return rule
+
+
+def read_trace(path):
+    """{sensor name: [(timestamp, distance_cm), ...]} from a RangingService trace (name,timestamp,distance_cm)."""
+    import csv
+
+    traces = {}
+    with open(path, newline="") as f:
+        for name, timestamp, distance in csv.reader(f):
+            traces.setdefault(name, []).append((float(timestamp), float(distance)))
+    return traces
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    import numpy as np
+
+    parser = argparse.ArgumentParser(description="Raw threshold vs filtered decisions on simulated or recorded traces")
+    parser.add_argument("--runs", type=int, default=200, help="simulated runs per speed")
+    parser.add_argument("--speeds", type=float, nargs="*", default=[5, 10, 20, 40, 60], help="cm/s")
+    parser.add_argument("--latency", type=float, default=0.05, help="decision -> motors stopped (s)")
+    parser.add_argument("--trace", help="replay a recorded trace CSV instead of simulating")
+    args = parser.parse_args()
+
+    PLANT_CM, EDGE_CM, PERIOD_S = 10.0, 80.0, 0.0666
+    # Predict to the middle of the next sample period plus the motor latency
+    lead_s = args.latency + PERIOD_S / 2
+
+    if args.trace:
+        for name, rows in read_trace(args.trace).items():
+            threshold = dict(below=PLANT_CM) if name == "plant" else dict(above=EDGE_CM)
+            raw = next((t for t, z in rows if (z < PLANT_CM if name == "plant" else z > EDGE_CM)), None)
+            distance_filter = DistanceFilter()
+            detector = ThresholdDetector(lead_s=lead_s, **threshold)
+            filtered = None
+            for t, z in rows:
+                distance_filter.update(z, t)
+                if filtered is None and detector.check(distance_filter, t):
+                    filtered = t
+            start = rows[0][0]
+            fmt = lambda t: "never" if t is None else f"{t - start:.3f} s"
+            print(f"{name:6s} {len(rows)} readings | raw rule fires at {fmt(raw)} | filter at {fmt(filtered)} | "
+                  f"{distance_filter.metrics()}")
+        raise SystemExit
+
+    rng = np.random.default_rng(0)
+
+    print(f"Plant approach from 60 cm, stop at {PLANT_CM:.0f} cm, {args.latency * 1000:.0f} ms motor latency, "
+          f"{args.runs} runs per speed (error = true distance when stopped - {PLANT_CM:.0f} cm)")
+    print(f"{'speed':>6s} {'rule':8s} {'false stop':>10s} {'missed':>7s} {'mean err':>9s} {'p95 |err|':>10s}")
+    update_times = []
+    for speed in args.speeds:
+        results = {"raw": [], "filter": []}
+        for _ in range(args.runs):
+            true_distance = lambda t: 60.0 - speed * t
+            trace = simulate_trace(true_distance, 60.0 / speed + 0.5, rng, period_s=PERIOD_S)
+            rules = {
+                "raw": lambda t, z: z < PLANT_CM,
+                "filter": filter_rule(ThresholdDetector(below=PLANT_CM, lead_s=lead_s)),
+            }
+            for name, rule in rules.items():
+                decided = first_decision(trace, rule)
+                results[name].append(math.nan if decided is None else true_distance(decided + args.latency) - PLANT_CM)
+        for name, errors in results.items():
+            errors = np.array(errors)
+            false_stop = errors > 5.0  # stopped more than 5 cm before the plant
+            missed = np.isnan(errors)
+            ok = errors[~false_stop & ~missed]
+            print(f"{speed:6.0f} {name:8s} {false_stop.mean() * 100:9.1f}% {missed.mean() * 100:6.1f}% "
+                  f"{ok.mean():9.2f} {np.percentile(np.abs(ok), 95) if len(ok) else math.nan:10.2f}")
+
+    print(f"\nTable end after 3 s at 40 cm (sensor 2), then {EDGE_CM + 20:.0f} cm, {args.runs} runs")
+    print(f"{'rule':8s} {'false exit':>10s} {'missed':>7s} {'delay ms':>9s} {'p99 ms':>7s}")
+    edges = {"raw": [], "filter": [], "jump": []}
+    for _ in range(args.runs):
+        true_distance = lambda t: 40.0 if t < 3.0 else EDGE_CM + 20
+        trace = simulate_trace(true_distance, 4.0, rng, period_s=PERIOD_S)
+        rules = {
+            "raw": lambda t, z: z > EDGE_CM,
+            "filter": filter_rule(ThresholdDetector(above=EDGE_CM)),
+            "jump": filter_rule(ThresholdDetector(above=EDGE_CM, jump_confirm=2)),
+        }
+        for name, rule in rules.items():
+            decided = first_decision(trace, rule)
+            edges[name].append(math.nan if decided is None else decided - 3.0)
+    for name, delays in edges.items():
+        delays = np.array(delays)
+        false_exit = delays < 0
+        missed = np.isnan(delays)
+        ok = delays[~false_exit & ~missed]
+        print(f"{name:8s} {false_exit.mean() * 100:9.1f}% {missed.mean() * 100:6.1f}% {ok.mean() * 1000:9.0f} "
+              f"{np.percentile(ok, 99) * 1000:7.0f}")
+
+    distance_filter = DistanceFilter()
+    readings = rng.normal(30, 0.5, 20000)
+    start = time.perf_counter()
+    for i, z in enumerate(readings):
+        distance_filter.update(z, i * PERIOD_S)
+    print(f"\nupdate(): {(time.perf_counter() - start) / len(readings) * 1e6:.1f} us per reading")
@@ -0,0 +1,724 @@
+# ============================================================
+# hal.py
+# Hardware abstraction layer: the Pi, or a simulated robot on a table
+# ============================================================
+#
+# The robot scripts talk to the hardware through a backend instead of
+# importing RPi.GPIO, ServoKit, pyrf24 and picamera2 themselves:
+#
+#   backend.gpio              RPi.GPIO interface (pins, buttons)
+#   backend.pwm(pin, freq)    PWM channel (start / ChangeDutyCycle / stop)
+#   backend.servo_kit()       ServoKit interface (kit.servo[i].angle)
+#   backend.sonar(trig, echo) ultrasonic sensor (ranging.UltrasonicSensor interface)
+#   backend.relay(pin)        relay / solenoid valve (on / off)
+#   backend.radio(ce, csn)    nRF24L01 (pyrf24.RF24 interface)
+#   backend.camera()          camera service (AI/camera_service.py interface)
+#   backend.clock             now() / sleep() / real_seconds(): every wait goes through it,
+#                             threads are made with clock.thread() and the asyncio loop
+#                             runs with clock.run()
+#
+# PiBackend is the real robot; its libraries are imported when the
+# backend is created, so importing this file stays fast.
+#
+# SimBackend is a robot on a table with a physical timing model: the
+# motors accelerate with a time constant towards a speed proportional to
+# the duty cycle, servos slew at a limited rate, the sonar readings come
+# from the robot's position (plants beside the table, the floor past its
+# end) with noise, spikes, lost echoes and the echo's travel time, and
+# the valve delivers the volume of the fitted valve_open_time_ml()
+# formula (Complete_code_excluding_AI.py). It runs on a VirtualClock:
+# discrete-event time that jumps from one wake-up to the next, with the
+# threads taking turns, so a whole table pass takes about a second and
+# the same seed gives the same pass on any machine. With `speedup` it
+# runs on a ScaledClock instead, paced that many times faster than real
+# time (to watch a pass; the thread scheduling then affects the physics).
+#
+# open_backend() picks the backend, by default from the LEAFY_BACKEND
+# environment variable: "pi" (default) or "sim".
+#
+# Simulated table pass with the cycle-time report, and a sweep over seeds:
+#     python FinalBEAST42.py --backend sim [--seed 0] [--speedup 50]
+#     python FinalBEAST42.py --backend sim --runs 20
+# ============================================================
+
+import heapq
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from ranging import ECHO_START_TIMEOUT_S, MAX_RANGE_CM, UltrasonicSensor, echo_seconds
+
+
+# ------------------------------------------------------------
+# CLOCKS
+# ------------------------------------------------------------
+class RealClock:
+    speedup = 1.0
+
+    def now(self):
+        return time.perf_counter()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def real_seconds(self, seconds):
+        """Event-loop time that seconds of clock time take (for asyncio.sleep / wait_for)."""
+        return seconds
+
+    def thread(self, target, name=None):
+        """Daemon thread running target that sleeps on this clock (not started yet)."""
+        return threading.Thread(target=target, name=name, daemon=True)
+
+    def join(self, thread, timeout=None):
+        thread.join(timeout)
+
+    def run(self, main):
+        """Run the coroutine main in an asyncio event loop on this clock."""
+        import asyncio
+
+        return asyncio.run(main)
+
+
+class ScaledClock(RealClock):
+    """Simulated time, running speedup times faster than real time (starts at 0)."""
+
+    def __init__(self, speedup=20.0):
+        self.speedup = speedup
+        self.start = time.perf_counter()
+
+    def now(self):
+        return (time.perf_counter() - self.start) * self.speedup
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds / self.speedup)
+
+    def real_seconds(self, seconds):
+        return seconds / self.speedup
+
+
+class VirtualClock:
+    """
+    Discrete-event simulated time (starts at 0). The threads of the clock, the one that
+    created it and those made with thread(), take turns: only the thread that has the
+    turn runs, and its sleep() hands the turn to the thread with the earliest wake-up
+    time and jumps the clock to that time. A simulation runs as fast as the code allows
+    and the same seed gives the same run, whatever the machine's thread scheduling.
+    Waits that do not go through the clock (time.sleep, Event.wait) do not advance it.
+    run() drives an asyncio event loop whose time is this clock.
+    """
+
+    speedup = math.inf
+
+    def __init__(self):
+        self.t = 0.0
+        self.condition = threading.Condition()
+        self.wakeups = []  # heap of (time, order, thread) waiting for the turn
+        self.order = 0     # tie-break: threads due at the same time run in scheduling order
+        self.turn = threading.current_thread()
+
+    def now(self):
+        return self.t
+
+    def real_seconds(self, seconds):
+        return seconds  # the event loop of run() counts in clock time
+
+    def _schedule(self, thread, t):
+        heapq.heappush(self.wakeups, (t, self.order, thread))
+        self.order += 1
+
+    def _pass_turn(self):
+        if self.wakeups:
+            t, _, self.turn = heapq.heappop(self.wakeups)
+            self.t = max(self.t, t)
+        else:
+            self.turn = None
+        self.condition.notify_all()
+
+    def _wait_turn(self, thread):
+        if self.turn is None:
+            self._pass_turn()
+        self.condition.wait_for(lambda: self.turn is thread)
+
+    def sleep(self, seconds):
+        me = threading.current_thread()
+        with self.condition:
+            if self.turn is not me:
+                raise RuntimeError(f"{me.name} sleeps on a VirtualClock without having the turn "
+                                   "(start threads with clock.thread())")
+            self._schedule(me, self.t + max(seconds, 0.0))
+            self._pass_turn()
+            self._wait_turn(me)
+
+    def thread(self, target, name=None):
+        return VirtualClockThread(self, target, name)
+
+    def join(self, thread, timeout=None):
+        """Wait (timeout in real seconds) until thread ends; the clock's other threads run meanwhile."""
+        me = threading.current_thread()
+        with self.condition:
+            self._pass_turn()
+        thread.join(timeout)
+        with self.condition:
+            self._schedule(me, self.t)
+            self._wait_turn(me)
+
+    def run(self, main):
+        import asyncio
+        import selectors
+
+        clock = self
+
+        class Selector(selectors.DefaultSelector):
+            # File descriptors are only polled; the loop's wait for its next timer is a sleep on the clock
+            def select(self, timeout=None):
+                ready = super().select(0)
+                if ready or timeout == 0:
+                    return ready
+                if timeout is None:
+                    raise RuntimeError("Event loop waits for nothing on a VirtualClock: the simulation would never continue")
+                clock.sleep(timeout)
+                return super().select(0)
+
+        def new_loop():
+            loop = asyncio.SelectorEventLoop(Selector())
+            loop.time = self.now
+            return loop
+
+        with asyncio.Runner(loop_factory=new_loop) as runner:
+            return runner.run(main)
+
+
+class VirtualClockThread(threading.Thread):
+    """Daemon thread that takes turns on a VirtualClock; its first turn is at the time start() is called."""
+
+    def __init__(self, clock, target, name=None):
+        super().__init__(name=name, daemon=True)
+        self.clock = clock
+        self.target = target
+
+    def start(self):
+        with self.clock.condition:
+            self.clock._schedule(self, self.clock.t)
+        super().start()
+
+    def run(self):
+        with self.clock.condition:
+            self.clock._wait_turn(self)
+        try:
+            self.target()
+        finally:
+            with self.clock.condition:
+                self.clock._pass_turn()
+
+
+REAL_CLOCK = RealClock()
+
+
+# ------------------------------------------------------------
+# COMMON PARTS
+# ------------------------------------------------------------
+class Relay:
+    """Relay on a GPIO pin; active_high=False for modules that switch on a LOW input."""
+
+    def __init__(self, gpio, pin, active_high=True):
+        self.gpio = gpio
+        self.pin = pin
+        self.active_high = active_high
+        self.is_on = False
+        gpio.setup(pin, gpio.OUT)
+        self.off()
+
+    def on(self):
+        self.gpio.output(self.pin, self.gpio.HIGH if self.active_high else self.gpio.LOW)
+        self.is_on = True
+
+    def off(self):
+        self.gpio.output(self.pin, self.gpio.LOW if self.active_high else self.gpio.HIGH)
+        self.is_on = False
+
+
+class Backend:
+    """Common interface, see the top of the file."""
+
+    name = None
+
+    def __init__(self, gpio, clock):
+        self.gpio = gpio
+        self.clock = clock
+
+    def pwm(self, pin, frequency):
+        return self.gpio.PWM(pin, frequency)
+
+    def servo_kit(self, channels=16):
+        raise NotImplementedError
+
+    def sonar(self, trig, echo, name=None, max_range_cm=MAX_RANGE_CM, timing="edges"):
+        """
+        Ultrasonic sensor, set up and ready to measure(); name tells the simulation what it looks at,
+        timing is ranging.UltrasonicSensor's "edges" / "poll".
+        """
+        raise NotImplementedError
+
+    def relay(self, pin, active_high=True):
+        return Relay(self.gpio, pin, active_high)
+
+    def radio(self, ce_pin, csn):
+        raise NotImplementedError
+
+    def camera(self, **kwargs):
+        raise NotImplementedError
+
+    def close(self):
+        self.gpio.cleanup()
+
+    def problems(self):
+        """What went wrong physically during the run (the simulation knows, the real robot cannot tell)."""
+        return []
+
+
+# ------------------------------------------------------------
+# REAL ROBOT
+# ------------------------------------------------------------
+class PiBackend(Backend):
+    name = "pi"
+
+    def __init__(self, **kwargs):
+        import RPi.GPIO as gpio  # only available on the Pi
+
+        super().__init__(gpio, REAL_CLOCK)
+
+    def servo_kit(self, channels=16):
+        from adafruit_servokit import ServoKit
+
+        return ServoKit(channels=channels)
+
+    def sonar(self, trig, echo, name=None, max_range_cm=MAX_RANGE_CM, timing="edges"):
+        sensor = UltrasonicSensor(self.gpio, trig, echo, max_range_cm, timing)
+        sensor.setup()
+        return sensor
+
+    def radio(self, ce_pin, csn):
+        from pyrf24 import RF24
+
+        return RF24(ce_pin, csn)
+
+    def camera(self, **kwargs):
+        from AI.camera_service import open_camera
+
+        return open_camera("pi", **kwargs)
+
+
+# ------------------------------------------------------------
+# SIMULATED ROBOT
+# ------------------------------------------------------------
+def valve_volume_ml(open_s):
+    """Water delivered by the valve in open_s seconds: the inverse of valve_open_time_ml()."""
+    if open_s <= 0:
+        return 0.0
+    return 0.11455309 * open_s ** 2 + 36.75567689 * open_s + 19.817595
+
+
+class SimWorld:
+    """
+    Robot on a table, positions in cm along the table from the start.
+    wiring: {"motors": [(in1, in2, en), ...], "start_button": pin, "stop_button": pin}
+    plants_cm: plant positions beside the table; the plant sensor looks sideways and sees
+        a plant (plant_side_cm away) within plant_radius_cm of its position
+    arm_offset_cm: arm position relative to the plant sensor (behind it: negative)
+    table_direction: motor direction (+1 IN1 high, -1 IN2 high) that moves along the table
+    max_speed_cm_s / motor_tau_s: speed at 100% duty, time constant of the motors
+    servo_slew_deg_s: servo speed; valve_delay_s: solenoid opening time
+    estop_at_s: press the stop button at this clock time (None: never)
+    """
+
+    def __init__(self, clock, wiring, plants_cm=(80, 180, 280), table_length_cm=360, plant_radius_cm=6,
+                 plant_side_cm=7, background_cm=150, table_cm=40, floor_cm=100, edge_lookahead_cm=10,
+                 arm_offset_cm=-20, table_direction=-1, max_speed_cm_s=25.0, motor_tau_s=0.2,
+                 servo_slew_deg_s=400.0, valve_delay_s=0.05, noise_cm=0.3, spike_rate=0.02,
+                 miss_rate=0.02, auto_start=True, estop_at_s=None, seed=0):
+        import numpy as np  # only the simulation needs it
+
+        self.clock = clock
+        self.lock = threading.RLock()
+        self.rng = np.random.default_rng(seed)
+        self.motor_pins = {en: (in1, in2) for in1, in2, en in wiring.get("motors", [])}
+        self.start_button = wiring.get("start_button")
+        self.stop_button = wiring.get("stop_button")
+        self.auto_start = auto_start
+        self.estop_at_s = estop_at_s
+
+        self.plants_cm = list(plants_cm)
+        self.table_length_cm = table_length_cm
+        self.plant_radius_cm = plant_radius_cm
+        self.plant_side_cm = plant_side_cm
+        self.background_cm = background_cm
+        self.table_cm = table_cm
+        self.floor_cm = floor_cm
+        self.edge_lookahead_cm = edge_lookahead_cm
+        self.arm_offset_cm = arm_offset_cm
+        self.table_direction = table_direction
+        self.max_speed_cm_s = max_speed_cm_s
+        self.motor_tau_s = motor_tau_s
+        self.servo_slew_deg_s = servo_slew_deg_s
+        self.valve_delay_s = valve_delay_s
+        self.noise_cm = noise_cm
+        self.spike_rate = spike_rate
+        self.miss_rate = miss_rate
+
+        self.levels = {}
+        self.duty = {en: 0.0 for en in self.motor_pins}
+        self.x = 0.0          # position along the table
+        self.v = 0.0          # speed along the table
+        self.t = clock.now()
+        self.fell_off = False
+        self.servos = {}      # channel: (start angle, start time, target angle)
+        self.valve_pin = None
+        self.valve_active_high = True
+        self.valve_opened = None
+        self.waterings = []   # (plant index, distance arm - plant, arm settled, ml)
+
+    # --------------------------------------------------------
+    # MOTION
+    # --------------------------------------------------------
+    def commanded_speed(self):
+        speeds = []
+        for en, (in1, in2) in self.motor_pins.items():
+            direction = self.levels.get(in1, 0) - self.levels.get(in2, 0)  # +1, -1 or 0 (brake)
+            speeds.append(direction * self.duty[en] / 100 * self.max_speed_cm_s)
+        return self.table_direction * sum(speeds) / len(speeds) if speeds else 0.0
+
+    def advance(self):
+        """Move the robot up to now: first-order motor response, exact for a constant command."""
+        with self.lock:
+            now = self.clock.now()
+            dt = now - self.t
+            if dt <= 0:
+                return
+            target = self.commanded_speed()
+            decay = math.exp(-dt / self.motor_tau_s)
+            self.x += target * dt + (self.v - target) * self.motor_tau_s * (1 - decay)
+            self.v = target + (self.v - target) * decay
+            self.t = now
+            if self.x > self.table_length_cm:
+                self.fell_off = True
+
+    def set_level(self, pin, value):
+        with self.lock:
+            self.advance()
+            self.levels[pin] = int(bool(value))
+            if pin == self.valve_pin:
+                self._valve(bool(value) == self.valve_active_high)
+
+    def set_duty(self, pin, duty):
+        with self.lock:
+            self.advance()
+            if pin in self.duty:
+                self.duty[pin] = float(duty)
+
+    # --------------------------------------------------------
+    # SERVOS
+    # --------------------------------------------------------
+    def servo_angle(self, channel, t=None):
+        start, start_t, target = self.servos.get(channel, (None, 0.0, None))
+        if target is None:
+            return None
+        if start is None:
+            return target
+        t = self.clock.now() if t is None else t
+        travelled = self.servo_slew_deg_s * (t - start_t)
+        return target if travelled >= abs(target - start) else start + math.copysign(travelled, target - start)
+
+    def set_servo(self, channel, angle):
+        with self.lock:
+            now = self.clock.now()
+            self.servos[channel] = (self.servo_angle(channel, now), now, angle)
+
+    def servos_settled(self):
+        return all(self.servo_angle(ch) == target for ch, (_, _, target) in self.servos.items())
+
+    # --------------------------------------------------------
+    # VALVE
+    # --------------------------------------------------------
+    def _valve(self, is_open):
+        now = self.clock.now()
+        if is_open and self.valve_opened is None:
+            arm = self.x + self.arm_offset_cm
+            plant = min(range(len(self.plants_cm)), key=lambda i: abs(self.plants_cm[i] - arm), default=None)
+            offset = arm - self.plants_cm[plant] if plant is not None else math.nan
+            self.valve_opened = (now, plant, offset, self.servos_settled())
+        elif not is_open and self.valve_opened is not None:
+            opened, plant, offset, settled = self.valve_opened
+            self.waterings.append((plant, offset, settled, valve_volume_ml(now - opened - self.valve_delay_s)))
+            self.valve_opened = None
+
+    # --------------------------------------------------------
+    # SENSORS
+    # --------------------------------------------------------
+    def true_distance(self, name):
+        with self.lock:
+            self.advance()
+            if name == "edge":
+                return self.floor_cm if self.x + self.edge_lookahead_cm > self.table_length_cm else self.table_cm
+            if any(abs(self.x - p) <= self.plant_radius_cm for p in self.plants_cm):
+                return self.plant_side_cm
+            return self.background_cm
+
+    def reading(self, name):
+        """Noisy sensor reading; None = lost echo."""
+        d = self.true_distance(name)
+        u = self.rng.random()
+        if u < self.miss_rate:
+            return None
+        if u < self.miss_rate + self.spike_rate:
+            return float(self.rng.uniform(3, 200))
+        return max(2.0, d + float(self.rng.normal(0, self.noise_cm)))
+
+    def button(self, pin):
+        if pin == self.start_button:
+            return 0 if self.auto_start else 1  # pulled up: LOW = pressed
+        if pin == self.stop_button:
+            return 0 if self.estop_at_s is not None and self.clock.now() >= self.estop_at_s else 1
+        return self.levels.get(pin, 0)
+
+    # --------------------------------------------------------
+    # REPORT
+    # --------------------------------------------------------
+    def report(self):
+        self.advance()
+        lines = [f"Simulated table: {len(self.plants_cm)} plants at {self.plants_cm} cm, "
+                 f"robot at {self.x:.1f} cm of {self.table_length_cm} cm"
+                 f"{' — FELL OFF THE TABLE' if self.fell_off else ''}"]
+        for plant, offset, settled, ml in self.waterings:
+            lines.append(f"  watering plant {plant}: {ml:6.1f} ml, arm {offset:+5.1f} cm from the plant"
+                         f"{'' if settled else ', ARM STILL MOVING when the valve opened'}")
+        if self.valve_opened is not None:
+            lines.append("  VALVE STILL OPEN")
+        watered = {plant for plant, *_ in self.waterings}
+        missed = [i for i in range(len(self.plants_cm)) if i not in watered]
+        if missed:
+            lines.append(f"  plants never watered: {missed}")
+        return "\n".join(lines)
+
+    def problems(self):
+        problems = []
+        if self.fell_off:
+            problems.append(f"fell off the table ({self.x - self.table_length_cm:.1f} cm past the end)")
+        if self.valve_opened is not None:
+            problems.append("valve still open")
+        return problems
+
+
+class SimGPIO:
+    """The RPi.GPIO functions the robot scripts use, on top of SimWorld."""
+
+    BCM = "BCM"
+    OUT, IN = "out", "in"
+    LOW, HIGH = 0, 1
+    RISING, FALLING, BOTH = "rising", "falling", "both"
+    PUD_UP, PUD_DOWN = "up", "down"
+
+    def __init__(self, world):
+        self.world = world
+        self.callbacks = {}
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        if initial is not None:
+            self.world.set_level(pin, initial)
+
+    def output(self, pin, value):
+        self.world.set_level(pin, value)
+
+    def input(self, pin):
+        return self.world.button(pin)
+
+    def PWM(self, pin, frequency):
+        return SimPWM(self.world, pin, frequency)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self.callbacks[pin] = (edge, callback)
+
+    def remove_event_detect(self, pin):
+        self.callbacks.pop(pin, None)
+
+    def cleanup(self):
+        self.callbacks.clear()
+
+
+class SimPWM:
+    def __init__(self, world, pin, frequency):
+        self.world = world
+        self.pin = pin
+        self.frequency = frequency
+
+    def start(self, duty):
+        self.world.set_duty(self.pin, duty)
+
+    def ChangeDutyCycle(self, duty):
+        self.world.set_duty(self.pin, duty)
+
+    def ChangeFrequency(self, frequency):
+        self.frequency = frequency
+
+    def stop(self):
+        self.world.set_duty(self.pin, 0)
+
+
+class SimServo:
+    def __init__(self, world, channel):
+        self.world = world
+        self.channel = channel
+        self._angle = None
+
+    @property
+    def angle(self):
+        return self._angle  # like ServoKit: the last commanded angle, not the physical one
+
+    @angle.setter
+    def angle(self, value):
+        self._angle = value
+        self.world.set_servo(self.channel, value)
+
+
+class SimServoKit:
+    def __init__(self, world, channels=16):
+        self.servo = [SimServo(world, ch) for ch in range(channels)]
+
+
+class SimSonar:
+    """UltrasonicSensor interface: readings from SimWorld, taking the echo's travel time."""
+
+    def __init__(self, world, name, max_range_cm=MAX_RANGE_CM, echo_delay_s=0.0005):
+        self.world = world
+        self.name = name
+        self.max_range_cm = max_range_cm
+        self.echo_delay_s = echo_delay_s
+        self.pings = 0
+        self.misses = 0
+
+    def setup(self):
+        pass
+
+    def close(self):
+        pass
+
+    def measure(self):
+        self.pings += 1
+        distance = self.world.reading(self.name)
+        if distance is None or distance > self.max_range_cm:
+            self.world.clock.sleep(ECHO_START_TIMEOUT_S + echo_seconds(self.max_range_cm))
+            self.misses += 1
+            return math.nan
+        self.world.clock.sleep(self.echo_delay_s + echo_seconds(distance))
+        return distance
+
+
+class SimRadio:
+    """The pyrf24.RF24 calls of the scripts; inject() queues a payload as if it was received."""
+
+    def __init__(self):
+        self.received = deque()
+        self.sent = []
+        self.listening = False
+
+    def begin(self):
+        return True
+
+    def setDataRate(self, rate):
+        pass
+
+    def setPALevel(self, level):
+        pass
+
+    def openReadingPipe(self, pipe, address):
+        pass
+
+    def openWritingPipe(self, address):
+        pass
+
+    def startListening(self):
+        self.listening = True
+
+    def stopListening(self):
+        self.listening = False
+
+    def printDetails(self):
+        print("SimRadio: simulated nRF24L01")
+
+    def available(self):
+        return bool(self.received)
+
+    def read(self, length=32):
+        return self.received.popleft()[:length]
+
+    def write(self, payload):
+        self.sent.append(bytes(payload))
+        return True
+
+    def inject(self, payload):
+        self.received.append(bytes(payload).ljust(32, b"\x00"))
+
+
+class SimBackend(Backend):
+    """
+    speedup: None = VirtualClock, else a ScaledClock this many times faster than real time
+    world_kwargs: SimWorld settings (wiring, plants_cm, table_length_cm, seed, ...)
+    """
+
+    name = "sim"
+
+    def __init__(self, speedup=None, **world_kwargs):
+        clock = VirtualClock() if speedup is None else ScaledClock(speedup)
+        self.world = SimWorld(clock, world_kwargs.pop("wiring", {}), **world_kwargs)
+        super().__init__(SimGPIO(self.world), clock)
+
+    def servo_kit(self, channels=16):
+        return SimServoKit(self.world, channels)
+
+    def sonar(self, trig, echo, name=None, max_range_cm=MAX_RANGE_CM, timing="edges"):
+        return SimSonar(self.world, name, max_range_cm)  # readings come from the world, not from edges
+
+    def relay(self, pin, active_high=True):
+        self.world.valve_pin = pin
+        self.world.valve_active_high = active_high
+        return Relay(self.gpio, pin, active_high)
+
+    def radio(self, ce_pin, csn):
+        return SimRadio()
+
+    def camera(self, **kwargs):
+        from AI.camera_service import SyntheticCameraService
+
+        return SyntheticCameraService(**kwargs)
+
+    def close(self):
+        super().close()
+        print(self.world.report())
+
+    def problems(self):
+        return self.world.problems()
+
+
+# ------------------------------------------------------------
+# FACTORY
+# ------------------------------------------------------------
+def open_backend(source=None, **kwargs):
+    """
+    Create the backend for source ("pi" or "sim").
+    Without source the LEAFY_BACKEND environment variable is used (default "pi").
+    kwargs go to SimBackend (speedup, wiring, SimWorld settings); the Pi ignores them.
+    """
+    source = source or os.environ.get("LEAFY_BACKEND", "pi")
+    if source == "pi":
+        return PiBackend(**kwargs)
+    if source == "sim":
+        return SimBackend(**kwargs)
+    raise ValueError(f"Unknown backend {source!r} (use 'pi' or 'sim')")
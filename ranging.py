@@ -0,0 +1,542 @@
+# ============================================================
+# ranging.py
+# HC-SR04 ranging with edge timestamps instead of busy-wait loops
+# ============================================================
+#
+# The old measuringDistance1/2() in FinalBEAST42.py poll
+# GPIO.input(ECHO) in a tight loop with time.time(): a full core busy
+# per ping, and when an echo edge is missed the loop never ends and the
+# robot hangs.
+#
+# UltrasonicSensor registers one callback for both edges of the ECHO
+# pin. The callback only stores perf_counter_ns() (first edge after the
+# trigger = rising, second = falling); measure() sleeps on an Event
+# until the falling edge arrives or the max-range timeout expires, and
+# returns the distance in cm or NaN on a miss (no echo, or an echo
+# longer than max_range_cm). NaN compares False with everything, so
+# "distance < 10" never stops on a miss.
+#
+# RangingService pings all sensors from one background thread, one
+# sensor per time slot (round robin), and keeps the newest timestamped
+# reading of every sensor behind a lock. A slot is as long as the echo
+# of a target at max range takes to come back, so a ping never hears the
+# echo of the previous sensor's burst (crosstalk), and no sensor is
+# pinged more often than MIN_PING_INTERVAL_S. Consumers (plantFound)
+# read the latest value instantly instead of pinging themselves.
+#
+# Metrics per sensor: achieved sample rate, pings, misses and the age of
+# the newest reading.
+#
+# Accuracy cost of the edge events: the timestamp is taken when the
+# callback runs, so the callback thread's wake-up latency is distance
+# error (0.1 ms = 1.7 cm), and RPi.GPIO / rpi-lgpio do not pass the
+# kernel's edge timestamp on. In the benchmark the simulated edges come
+# from a thread that wakes with a timed wait; on a loaded or single-core
+# machine a few percent of those wake-ups are ms late (p99 ~2 ms on a
+# 1-CPU VM), and that lateness explains the whole error tail of the edge
+# path: std and p99 of tens of cm, against ~1 cm for polling, which takes
+# its timestamps in the thread that watches the pin. The downstream
+# filter (distance_filter.py) rejects single outliers, but more of them
+# cost reaction time. timing="poll" keeps the timeouts of the edge path
+# and polls the ECHO level instead: the accuracy of the old loop, at
+# ~2 ms of CPU per ping (the echo time) and the GIL held meanwhile.
+#
+# SimulatedEchoGPIO stands in for RPi.GPIO on any Linux machine: a
+# trigger pulse schedules the echo edges of a distance source, delivered
+# from a separate thread like RPi.GPIO's callback thread.
+#
+# Jitter / CPU benchmark against the old busy-wait loop, then the
+# service with two sensors against the old sequential plantFound() loop:
+#     python ranging.py [--pings 200] [--distance 30] [--service 3]
+# ============================================================
+
+import heapq
+import math
+import threading
+import time
+from collections import deque, namedtuple
+
+SPEED_OF_SOUND_CM_S = 34300
+MAX_RANGE_CM = 400          # HC-SR04 datasheet range
+ECHO_START_TIMEOUT_S = 0.01  # trigger -> rising edge takes ~0.5 ms on a working sensor
+MIN_PING_INTERVAL_S = 0.06   # datasheet: >= 60 ms between pings so old echoes die out
+
+
+def echo_seconds(distance_cm):
+    """Echo pulse width of a target at distance_cm."""
+    return 2 * distance_cm / SPEED_OF_SOUND_CM_S
+
+
+class UltrasonicSensor:
+    """
+    gpio: RPi.GPIO (or SimulatedEchoGPIO), already in BCM mode
+    trig / echo: BCM pin numbers
+    max_range_cm: echoes longer than this count as a miss
+    timing: "edges" (callback timestamps, no CPU while waiting) or "poll" (bounded
+        busy-wait on the ECHO level, more accurate under load; see the top of the file)
+    """
+
+    def __init__(self, gpio, trig, echo, max_range_cm=MAX_RANGE_CM, timing="edges"):
+        if timing not in ("edges", "poll"):
+            raise ValueError(f"Unknown timing {timing!r} (use 'edges' or 'poll')")
+        self.gpio = gpio
+        self.trig = trig
+        self.echo = echo
+        self.max_range_cm = max_range_cm
+        self.timing = timing
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.armed = False
+        self.edges = []  # perf_counter_ns of the edges since the trigger
+        self.pings = 0
+        self.misses = 0
+
+    def setup(self):
+        self.gpio.setup(self.trig, self.gpio.OUT)
+        self.gpio.setup(self.echo, self.gpio.IN)
+        self.gpio.output(self.trig, False)
+        if self.timing == "edges":
+            self.gpio.add_event_detect(self.echo, self.gpio.BOTH, callback=self._edge)
+
+    def close(self):
+        if self.timing == "edges":
+            self.gpio.remove_event_detect(self.echo)
+
+    def _edge(self, channel):
+        now = time.perf_counter_ns()  # first thing: the callback latency is the only timing error
+        with self.lock:
+            if not self.armed:
+                return  # tail of an earlier (out-of-range) echo
+            self.edges.append(now)
+            if len(self.edges) == 2:
+                self.armed = False
+                self.done.set()
+
+    def measure(self):
+        """Distance in cm, or NaN when there is no (or no in-range) echo. Blocks at most ~35 ms."""
+        self.pings += 1
+        if self.gpio.input(self.echo):
+            # Still high from a previous echo: a new trigger would be ignored by the sensor
+            self.misses += 1
+            return math.nan
+
+        with self.lock:
+            self.edges = []
+            self.done.clear()
+            self.armed = self.timing == "edges"
+        self.gpio.output(self.trig, True)
+        time.sleep(0.00001)  # 10 us trigger pulse
+        self.gpio.output(self.trig, False)
+
+        max_echo_s = echo_seconds(self.max_range_cm)
+        if self.timing == "poll":
+            edges = self._poll(max_echo_s)
+        else:
+            self.done.wait(ECHO_START_TIMEOUT_S + max_echo_s)
+            with self.lock:
+                self.armed = False
+                edges = list(self.edges)
+
+        if len(edges) < 2 or (edges[1] - edges[0]) / 1e9 > max_echo_s:
+            self.misses += 1
+            return math.nan
+        return (edges[1] - edges[0]) / 1e9 * SPEED_OF_SOUND_CM_S / 2
+
+    def _poll(self, max_echo_s):
+        # The old loop with the same timeouts as the edge path: last time seen low, last time seen high
+        gpio, echo = self.gpio, self.echo
+        deadline = time.perf_counter_ns() + ECHO_START_TIMEOUT_S * 1e9
+        rise = time.perf_counter_ns()
+        while not gpio.input(echo):
+            rise = time.perf_counter_ns()
+            if rise > deadline:
+                return []
+        deadline = rise + max_echo_s * 1e9
+        fall = rise
+        while gpio.input(echo):
+            fall = time.perf_counter_ns()
+            if fall > deadline:
+                return []
+        return [rise, fall]
+
+
+# ------------------------------------------------------------
+# BACKGROUND RANGING SERVICE
+# ------------------------------------------------------------
+# distance_cm: NaN on a miss; timestamp: clock time (perf_counter) of the trigger; seq: reading number of this sensor
+Reading = namedtuple("Reading", ["distance_cm", "timestamp", "seq"])
+
+
+class RangingService:
+    """
+    sensors: {name: UltrasonicSensor}, pinged in this order
+    slot_s: time reserved per ping; default: the echo timeout of the longest-range sensor
+    rate_window: number of recent readings used for the sample rate
+    trace: open text file; every reading is appended as "name,timestamp,distance_cm"
+        (replay with distance_filter.py --trace)
+    clock: object with now() / sleep() for the timestamps and the pacing, thread() / join()
+        for the ping thread (hal.py; the simulation does not run in real time);
+        default: time.perf_counter / time.sleep and a plain thread
+    """
+
+    def __init__(self, sensors, slot_s=None, rate_window=30, trace=None, clock=None):
+        self.sensors = dict(sensors)
+        if slot_s is None:
+            slot_s = ECHO_START_TIMEOUT_S + max(echo_seconds(s.max_range_cm) for s in self.sensors.values())
+        self.slot_s = slot_s
+        # Per sensor: a full round of slots, but never faster than the sensor allows
+        self.interval_s = max(MIN_PING_INTERVAL_S, slot_s * len(self.sensors))
+
+        self.lock = threading.Lock()
+        self.new_reading = threading.Condition(self.lock)
+        self.thread = None
+        self.running = False
+
+        self.readings = {name: Reading(math.nan, 0.0, -1) for name in self.sensors}
+        self.timestamps = {name: deque(maxlen=rate_window) for name in self.sensors}
+        self.errors = 0
+        self.trace = trace
+        self.clock = clock
+        self.now = clock.now if clock is not None else time.perf_counter
+        self.sleep = clock.sleep if clock is not None else time.sleep
+
+    # --------------------------------------------------------
+    # START / STOP
+    # --------------------------------------------------------
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        if self.clock is not None:
+            self.thread = self.clock.thread(self._run, name="RangingService")
+        else:
+            self.thread = threading.Thread(target=self._run, name="RangingService", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            if self.clock is not None:
+                self.clock.join(self.thread, timeout=2)
+            else:
+                self.thread.join(timeout=2)
+            self.thread = None
+        if self.trace is not None:
+            self.trace.flush()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    # --------------------------------------------------------
+    # PING THREAD
+    # --------------------------------------------------------
+    def _run(self):
+        names = list(self.sensors)
+        last_ping = {name: -math.inf for name in names}
+        slot_end = self.now()
+        i = 0
+        while self.running:
+            name = names[i]
+            i = (i + 1) % len(names)
+            # Next slot, and not before this sensor's own minimum interval
+            delay = max(slot_end, last_ping[name] + MIN_PING_INTERVAL_S) - self.now()
+            if delay > 0:
+                self.sleep(delay)
+            start = self.now()
+            try:
+                distance = self.sensors[name].measure()
+            except Exception as e:
+                self.errors += 1
+                print(f"RangingService: {name} failed ({e})")
+                distance = math.nan
+            slot_end = start + self.slot_s
+            last_ping[name] = start
+            self._store(name, distance, start)
+            if self.trace is not None:
+                self.trace.write(f"{name},{start:.6f},{distance}\n")
+
+    def _store(self, name, distance, timestamp):
+        with self.lock:
+            self.readings[name] = Reading(distance, timestamp, self.readings[name].seq + 1)
+            self.timestamps[name].append(timestamp)
+            self.new_reading.notify_all()
+
+    # --------------------------------------------------------
+    # READING
+    # --------------------------------------------------------
+    def latest(self, name):
+        """Newest Reading of a sensor (seq -1 before the first ping). Does not ping."""
+        with self.lock:
+            return self.readings[name]
+
+    def distance(self, name, max_age_s=0.5):
+        """Newest distance in cm, NaN when it is a miss or older than max_age_s (service stalled)."""
+        reading = self.latest(name)
+        if self.now() - reading.timestamp > max_age_s:
+            return math.nan
+        return reading.distance_cm
+
+    def wait_for_reading(self, name, after_seq, timeout=1.0):
+        """Block until sensor name has a reading newer than after_seq; returns the newest Reading."""
+        with self.new_reading:
+            self.new_reading.wait_for(lambda: self.readings[name].seq > after_seq, timeout=timeout)
+            return self.readings[name]
+
+    def rate(self, name):
+        """Achieved sample rate of one sensor in Hz."""
+        with self.lock:
+            timestamps = self.timestamps[name]
+            if len(timestamps) < 2:
+                return 0.0
+            return (len(timestamps) - 1) / (timestamps[-1] - timestamps[0])
+
+    def metrics(self):
+        now = self.now()
+        return {
+            name: {
+                "rate_hz": round(self.rate(name), 1),
+                "pings": sensor.pings,
+                "misses": sensor.misses,
+                "age_ms": round((now - self.latest(name).timestamp) * 1000, 1),
+            }
+            for name, sensor in self.sensors.items()
+        }
+
+
+# ------------------------------------------------------------
+# SIMULATED ECHO SOURCE
+# ------------------------------------------------------------
+class SimulatedEchoGPIO:
+    """
+    Enough of the RPi.GPIO interface for UltrasonicSensor and the old busy-wait code.
+    sensors: {trig pin: (echo pin, distance source)}; the source is called per ping and
+    returns the distance in cm, or None for a lost echo (no edges at all).
+    echo_delay_s: trigger -> rising edge (the sensor's 8-cycle burst)
+    spin_s: the delivery thread spins (instead of sleeping) this long before an edge
+    """
+
+    BCM = "BCM"
+    OUT, IN = "out", "in"
+    LOW, HIGH = 0, 1
+    RISING, FALLING, BOTH = "rising", "falling", "both"
+    PUD_UP, PUD_DOWN = "up", "down"
+
+    def __init__(self, sensors, echo_delay_s=0.0005, spin_s=0.0003):
+        self.sensors = sensors
+        self.echo_delay_s = echo_delay_s
+        self.spin_s = spin_s
+        self.levels = {}
+        self.callbacks = {}
+        self.events = []  # heap of (perf_counter time, pin, level)
+        self.true_edges = {}  # echo pin -> scheduled (rise, fall) times of every ping
+        self.lateness = []  # (pin, level, seconds the callback ran after the scheduled edge)
+        self.condition = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self._deliver, daemon=True)
+        self.thread.start()
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        self.levels.setdefault(pin, self.HIGH if pull_up_down == self.PUD_UP else self.LOW)
+
+    def input(self, pin):
+        if self.true_edges.get(pin):
+            # ECHO level follows the scheduled pulse in real time, not the delivery thread,
+            # so a polling loop that hogs the GIL still sees the pulse
+            rise, fall = self.true_edges[pin][-1]
+            return self.HIGH if rise <= time.perf_counter() < fall else self.LOW
+        return self.levels.get(pin, self.LOW)
+
+    def output(self, pin, value):
+        previous = self.levels.get(pin, self.LOW)
+        self.levels[pin] = int(bool(value))
+        if pin in self.sensors and previous and not value:  # falling edge of TRIG starts the ping
+            echo, source = self.sensors[pin]
+            distance = source()
+            if distance is None:
+                return  # lost echo: ECHO never goes high
+            rise = time.perf_counter() + self.echo_delay_s
+            fall = rise + echo_seconds(distance)
+            self.true_edges.setdefault(echo, []).append((rise, fall))
+            with self.condition:
+                heapq.heappush(self.events, (rise, echo, self.HIGH))
+                heapq.heappush(self.events, (fall, echo, self.LOW))
+                self.condition.notify()
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self.callbacks[pin] = (edge, callback)
+
+    def remove_event_detect(self, pin):
+        self.callbacks.pop(pin, None)
+
+    def cleanup(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+    def _deliver(self):
+        # Callback thread: sleeps until the next scheduled edge and calls back, with real thread latency
+        with self.condition:
+            while self.running:
+                if not self.events:
+                    self.condition.wait()
+                    continue
+                due = self.events[0][0]
+                delay = due - time.perf_counter()
+                if delay > self.spin_s:
+                    self.condition.wait(delay - self.spin_s)
+                    continue
+                if delay > 0:
+                    # Last stretch: spin, a timed wait overshoots by ~0.1 ms and that would
+                    # show up as sensor jitter in the benchmark
+                    self.condition.release()
+                    try:
+                        while time.perf_counter() < due:
+                            pass
+                    finally:
+                        self.condition.acquire()
+                    continue
+                due, pin, level = heapq.heappop(self.events)
+                edge, callback = self.callbacks.get(pin, (None, None))
+                if callback is not None and edge in (self.BOTH, self.RISING if level else self.FALLING):
+                    self.lateness.append((pin, level, time.perf_counter() - due))
+                    self.condition.release()
+                    try:
+                        callback(pin)
+                    finally:
+                        self.condition.acquire()
+
+
+# ------------------------------------------------------------
+# JITTER / CPU BENCHMARK
+# ------------------------------------------------------------
+def busy_wait_distance(gpio, trig, echo, give_up_s=1.0):
+    """
+    The old measuringDistance1() loop, for comparison. The original has no limit and hangs
+    when it misses an edge; here it gives up after give_up_s and returns NaN.
+    """
+    gpio.output(trig, True)
+    time.sleep(0.00001)
+    gpio.output(trig, False)
+    deadline = time.time() + give_up_s
+    start_time = time.time()
+    while gpio.input(echo) == 0:
+        start_time = time.time()
+        if start_time > deadline:
+            return math.nan
+    stop_time = time.time()
+    while gpio.input(echo) == 1:
+        stop_time = time.time()
+    return ((stop_time - start_time) * 34300) / 2
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import numpy as np
+
+    parser = argparse.ArgumentParser(description="Edge-timestamped ranging vs the busy-wait loop (simulated sensor)")
+    parser.add_argument("--pings", type=int, default=200)
+    parser.add_argument("--distance", type=float, default=30.0, help="simulated target distance in cm")
+    parser.add_argument("--interval", type=float, default=MIN_PING_INTERVAL_S, help="seconds between pings")
+    parser.add_argument("--service", type=float, default=3.0, help="seconds to run the two-sensor RangingService")
+    args = parser.parse_args()
+
+    TRIG, ECHO = 5, 6
+    distance = {"cm": args.distance}
+    gpio = SimulatedEchoGPIO({TRIG: (ECHO, lambda: distance["cm"])})
+    gpio.setmode(gpio.BCM)
+    sensor = UltrasonicSensor(gpio, TRIG, ECHO)
+    sensor.setup()
+
+    def run(measure):
+        # Error against the simulated edges, CPU time of the calling thread and wall time per ping;
+        # late: the error the callback thread's lateness alone causes (edge events only)
+        errors, late, cpu, wall = [], [], [], []
+        gpio.true_edges.clear()
+        for _ in range(args.pings):
+            gpio.lateness.clear()
+            c0, w0 = time.thread_time(), time.perf_counter()
+            value = measure()
+            cpu.append(time.thread_time() - c0)
+            wall.append(time.perf_counter() - w0)
+            rise, fall = gpio.true_edges[ECHO][-1]
+            errors.append(value - (fall - rise) * SPEED_OF_SOUND_CM_S / 2)  # NaN = hung / missed
+            lateness = {level: seconds for pin, level, seconds in gpio.lateness if pin == ECHO}
+            late.append((lateness.get(0, math.nan) - lateness.get(1, math.nan)) * SPEED_OF_SOUND_CM_S / 2)
+            time.sleep(args.interval)
+        errors, late = np.array(errors), np.array(late)
+        ok = ~np.isnan(errors)
+        return errors[ok], (~ok).sum(), np.array(cpu) * 1000, np.array(wall) * 1000, late[ok]
+
+    print(f"{args.pings} pings at {args.distance:.0f} cm (echo {echo_seconds(args.distance) * 1e6:.0f} us), "
+          f"error in cm, times in ms per ping")
+    print(f"{'method':12s} {'mean err':>9s} {'std':>7s} {'p99 |err|':>10s} {'cpu':>7s} {'wall':>7s} {'missed':>7s}")
+    sensor.gpio.remove_event_detect(ECHO)  # the busy-wait loops poll the level themselves
+    old = run(lambda: busy_wait_distance(gpio, TRIG, ECHO))
+    sensor.timing = "poll"
+    poll = run(sensor.measure)
+    sensor.timing = "edges"
+    sensor.gpio.add_event_detect(ECHO, gpio.BOTH, callback=sensor._edge)
+    new = run(sensor.measure)
+    for name, (errors, missed, cpu, wall, _) in (("busy-wait", old), ("poll", poll), ("edge events", new)):
+        print(f"{name:12s} {errors.mean():9.3f} {errors.std():7.3f} {np.percentile(np.abs(errors), 99):10.3f} "
+              f"{cpu.mean():7.3f} {wall.mean():7.3f} {missed:7d}")
+    errors, late = new[0], new[4]
+    print(f"edge events: error caused by the callback thread's lateness p99 {np.percentile(np.abs(late), 99):.3f} cm, "
+          f"error without it p99 {np.percentile(np.abs(errors - late), 99):.3f} cm")
+
+    # Lost echo and out-of-range target: the busy-wait loop would hang on the first
+    sensor.misses = 0
+    for label, value in (("lost echo", None), ("beyond max range", MAX_RANGE_CM * 1.5)):
+        distance["cm"] = value
+        start = time.perf_counter()
+        result = sensor.measure()
+        print(f"{label:17s}: {result} after {(time.perf_counter() - start) * 1000:.1f} ms")
+        time.sleep(echo_seconds(MAX_RANGE_CM * 1.5) + args.interval)
+    gpio.cleanup()
+
+    # Two sensors: the old plantFound() loop (ping 1, ping 2, sleep 0.1) against the service
+    TRIG2, ECHO2 = 12, 13
+    gpio = SimulatedEchoGPIO({TRIG: (ECHO, lambda: args.distance), TRIG2: (ECHO2, lambda: 60.0)})
+    gpio.setmode(gpio.BCM)
+    sensors = {"plant": UltrasonicSensor(gpio, TRIG, ECHO), "edge": UltrasonicSensor(gpio, TRIG2, ECHO2)}
+    for s in sensors.values():
+        s.setup()
+
+    periods = []
+    end = time.perf_counter() + args.service
+    previous = time.perf_counter()
+    while time.perf_counter() < end:
+        sensors["plant"].measure()
+        sensors["edge"].measure()
+        time.sleep(0.1)
+        now = time.perf_counter()
+        periods.append(now - previous)
+        previous = now
+    print(f"\nold plantFound loop : one decision per {np.mean(periods) * 1000:.1f} ms "
+          f"({1 / np.mean(periods):.1f} Hz per sensor)")
+
+    with RangingService(sensors) as service:
+        reads, seq = [], -1
+        end = time.perf_counter() + args.service
+        while time.perf_counter() < end:
+            seq = service.wait_for_reading("plant", seq).seq
+            t0 = time.perf_counter()
+            service.distance("plant"), service.distance("edge")
+            reads.append(time.perf_counter() - t0)
+        print(f"RangingService      : slot {service.slot_s * 1000:.1f} ms, "
+              f"interval per sensor {service.interval_s * 1000:.1f} ms, "
+              f"reading both sensors takes {np.median(reads) * 1e6:.1f} us")
+        for name, m in service.metrics().items():
+            print(f"  {name:6s} {m}")
+    gpio.cleanup()
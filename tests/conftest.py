@@ -0,0 +1,5 @@
+# The robot modules (ranging.py, distance_filter.py, hal.py, FinalBEAST42.py) live in the repo root
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,85 @@
+import math
+
+import numpy as np
+import pytest
+
+from distance_filter import DistanceFilter, ThresholdDetector, filter_rule, first_decision, simulate_trace
+
+PLANT_CM, EDGE_CM, PERIOD_S, LATENCY_S = 10.0, 80.0, 0.0666, 0.05
+LEAD_S = LATENCY_S + PERIOD_S / 2  # as in the validation in distance_filter.py and FinalBEAST42.py
+
+
+def plant_stop():
+    return filter_rule(ThresholdDetector(below=PLANT_CM, lead_s=LEAD_S))
+
+
+def test_single_spike_below_the_threshold_does_not_stop():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        trace = simulate_trace(lambda t: 40.0, 5.0, rng, period_s=PERIOD_S, spike_rate=0.0)
+        t, _, d = trace[len(trace) // 2]
+        trace[len(trace) // 2] = (t, 4.0, d)  # one short spurious echo next to nothing
+        assert first_decision(trace, lambda t, z: z < PLANT_CM) == t  # the old raw rule stops here
+        assert first_decision(trace, plant_stop()) is None
+
+
+def test_random_spikes_and_misses_do_not_stop():
+    rng = np.random.default_rng(1)
+    spikes = 0
+    for _ in range(40):
+        trace = simulate_trace(lambda t: 40.0, 10.0, rng, period_s=PERIOD_S)
+        spikes += sum(z < PLANT_CM for _, z, _ in trace)
+        assert first_decision(trace, plant_stop()) is None
+    assert spikes > 0  # the seed does put spikes below the threshold in the traces
+
+
+@pytest.mark.parametrize("speed", [5.0, 10.0, 20.0, 40.0])  # the robot drives at most 25 cm/s (hal.py)
+def test_steady_approach_stops_within_the_lead(speed):
+    rng = np.random.default_rng(2)
+    for _ in range(20):
+        true_distance = lambda t: 60.0 - speed * t  # noqa: E731
+        trace = simulate_trace(true_distance, 60.0 / speed + 0.5, rng, period_s=PERIOD_S)
+        decided = first_decision(trace, plant_stop())
+        assert decided is not None
+        # Fired at most the lead distance ahead of the plant, and at the latest one reading late
+        ahead = true_distance(decided) - PLANT_CM
+        assert -speed * PERIOD_S - 2.0 <= ahead <= speed * LEAD_S + 2.0
+        # Motors stopped (after the latency) at the plant
+        assert true_distance(decided + LATENCY_S) - PLANT_CM == pytest.approx(0.0, abs=5.0)
+
+
+def test_table_end_step_fires_through_jump_confirm():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        trace = simulate_trace(lambda t: 40.0 if t < 3.0 else EDGE_CM + 20, 4.0, rng, period_s=PERIOD_S)
+        step = next(i for i, (t, _, _) in enumerate(trace) if t >= 3.0)
+        before, after = trace[:step], trace[step:]
+
+        distance_filter = DistanceFilter()
+        jump = ThresholdDetector(above=EDGE_CM, jump_confirm=2)
+        filtered = ThresholdDetector(above=EDGE_CM)
+        for t, z, _ in before:
+            distance_filter.update(z, t)
+            assert not jump.check(distance_filter, t)  # no false exit on the table
+            assert not filtered.check(distance_filter, t)
+
+        fired = {}
+        for t, z, _ in after:
+            distance_filter.update(z, t)
+            for name, detector in (("jump", jump), ("filter", filtered)):
+                if name not in fired and detector.check(distance_filter, t):
+                    fired[name] = t
+        # Two agreeing raw readings past the threshold: fires before the filter has followed the step
+        readings_to_jump = sum(1 for t, z, _ in after if t <= fired["jump"] and not math.isnan(z))
+        assert readings_to_jump >= 2
+        assert fired["jump"] <= fired.get("filter", math.inf)
+        assert fired["jump"] - 3.0 < 0.5
+
+
+def test_disagreeing_readings_past_the_threshold_do_not_confirm_a_jump():
+    distance_filter = DistanceFilter()
+    jump = ThresholdDetector(above=EDGE_CM, jump_confirm=2)
+    readings = [40.0] * 10 + [150.0, 95.0]  # two spikes past the edge, 55 cm apart
+    for i, z in enumerate(readings):
+        distance_filter.update(z, i * PERIOD_S)
+        assert not jump.check(distance_filter, i * PERIOD_S)
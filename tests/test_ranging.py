@@ -0,0 +1,65 @@
+import math
+import statistics
+import time
+
+import pytest
+
+from ranging import ECHO_START_TIMEOUT_S, MAX_RANGE_CM, SimulatedEchoGPIO, UltrasonicSensor, echo_seconds
+
+TRIG, ECHO = 5, 6
+# measure() gives up after the echo start timeout plus the echo of a target at max range (~33 ms)
+TIMEOUT_S = ECHO_START_TIMEOUT_S + echo_seconds(MAX_RANGE_CM)
+
+
+@pytest.fixture
+def target():
+    # Distance source of the simulated sensor: cm, or None for a lost echo
+    return {"cm": 30.0}
+
+
+@pytest.fixture
+def gpio(target):
+    gpio = SimulatedEchoGPIO({TRIG: (ECHO, lambda: target["cm"])})
+    gpio.setmode(gpio.BCM)
+    yield gpio
+    gpio.cleanup()
+
+
+def make_sensor(gpio, timing):
+    sensor = UltrasonicSensor(gpio, TRIG, ECHO, timing=timing)
+    sensor.setup()
+    return sensor
+
+
+@pytest.mark.parametrize("distance", [12.0, 30.0, 150.0])
+def test_poll_measures_an_in_range_target(gpio, target, distance):
+    target["cm"] = distance
+    sensor = make_sensor(gpio, "poll")
+    readings = []
+    for _ in range(9):
+        readings.append(sensor.measure())
+        time.sleep(0.005)
+    # Median: a single ping can be off when the test machine preempts the polling thread
+    assert statistics.median(readings) == pytest.approx(distance, abs=2.0)
+    assert sensor.pings == 9 and sensor.misses <= 1
+
+
+@pytest.mark.parametrize("timing", ["poll", "edges"])
+@pytest.mark.parametrize("distance", [None, MAX_RANGE_CM * 1.5], ids=["lost echo", "beyond max range"])
+def test_miss_is_nan_and_counted_without_hanging(gpio, target, timing, distance):
+    sensor = make_sensor(gpio, timing)
+    target["cm"] = distance
+    start = time.perf_counter()
+    result = sensor.measure()
+    elapsed = time.perf_counter() - start
+    assert math.isnan(result)
+    assert not result < 10  # a miss never reads as an obstacle
+    assert (sensor.pings, sensor.misses) == (1, 1)
+    assert elapsed < TIMEOUT_S + 0.015  # ~35 ms, where the old busy-wait loop hangs
+
+    # The sensor recovers once the target is back in range (edge timing is not exact on a loaded machine)
+    time.sleep(echo_seconds(MAX_RANGE_CM * 1.5) + 0.01)
+    target["cm"] = 40.0
+    assert not math.isnan(sensor.measure())
+    assert (sensor.pings, sensor.misses) == (2, 1)
+    sensor.close()
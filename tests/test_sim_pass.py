@@ -0,0 +1,36 @@
+import sys
+
+import pytest
+
+pytest.importorskip("numpy")  # SimWorld
+
+import FinalBEAST42  # noqa: E402
+
+
+def simulate(monkeypatch, *args):
+    """One table pass through FinalBEAST42.main() on the sim backend (virtual time); returns the backend."""
+    monkeypatch.setattr(sys, "argv", ["FinalBEAST42.py", "--backend", "sim", *args])
+    FinalBEAST42.main()  # exits on a failed pass (fell off, valve left open)
+    return FinalBEAST42.backend
+
+
+@pytest.mark.parametrize("seed", [0, 3])
+def test_pass_waters_every_plant(monkeypatch, seed):
+    world = simulate(monkeypatch, "--seed", str(seed)).world
+    assert {plant for plant, *_ in world.waterings} == set(range(len(world.plants_cm)))
+    assert all(abs(offset) < world.plant_radius_cm + 2 and settled for _, offset, settled, _ in world.waterings)
+    assert not world.fell_off and world.x < world.table_length_cm
+    assert world.valve_opened is None
+    assert len(FinalBEAST42.cycles) == len(world.plants_cm)
+
+
+@pytest.mark.parametrize("estop_at_s", [3.0, 17.5], ids=["driving", "watering"])
+def test_estop_stops_the_pass_with_the_valve_closed(monkeypatch, capsys, estop_at_s):
+    backend = simulate(monkeypatch, "--estop-at", str(estop_at_s))
+    world = backend.world
+    assert "EMERGENCY STOP" in capsys.readouterr().out
+    assert backend.clock.now() < estop_at_s + 1.0  # the pass ended at the button, not at the table end
+    assert world.valve_opened is None
+    assert not world.fell_off
+    assert len({plant for plant, *_ in world.waterings}) < len(world.plants_cm)
+    assert world.commanded_speed() == 0  # motors off; the robot only coasts out